@@ -1,8 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, has_request_context, stream_with_context
 from flask_cors import CORS
+from utils.cpu_tuning import configure_thread_env, apply_tf_threading
+
+# Size thread pools before TensorFlow/NumPy start theirs
+THREAD_PLAN = configure_thread_env()
+
 try:
     import tensorflow as tf
     TENSORFLOW_AVAILABLE = True
+    apply_tf_threading(tf, THREAD_PLAN)
 except ImportError:
     TENSORFLOW_AVAILABLE = False
     print("⚠️  TensorFlow not installed. Running in demo mode.")
@@ -14,14 +20,125 @@ import json
 import sqlite3
 from datetime import datetime
 import os
+import hashlib
+import concurrent.futures
+import threading
+import functools
+import glob
+import re
+import hmac
+import random
+import csv
+import time
+import tarfile
+import zipfile
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
+from utils.tiling import generate_tiles, aggregate_tiles
+from utils.admission import AdmissionController, QueueFull, DeadlineExceeded, PRIORITIES
+from utils.profiling import RequestProfiler
+from utils.memprof import MemoryMonitor, WorkerRecycler, current_rss
+from utils.rollup import LatencyRollup, DIMENSIONS as ROLLUP_DIMENSIONS, STAGES as ROLLUP_STAGES
+from utils.cascade import cascade_predict
+from utils.tiers import choose_tier, parse_tier
+from utils.model_cache import ModelCache
+from utils.embedding_index import EmbeddingIndex
+from utils.batcher import MicroBatcher
+from utils.capture import TrafficCapture
+from utils.synthetic import SyntheticBackend, load_profile
+from utils.precision import PRECISIONS, dequantize, float16_model, quantize
+from utils.frames import (FRAMES_MIMETYPE, FrameSkipper, FrameStreamError, frame_hash,
+                          iter_length_prefixed, iter_multipart)
+from utils.explain import ArrayLRU, DiskCache, gradcam, overlay_png, split_feature_model
+from utils.jobs import JobStore, JobExecutor
+from utils.log_shards import attach_shards, id_range, merge_shards, reserve_id_range, shard_path
+from utils.tensor_format import (TENSOR_MIMETYPE, TensorFormatError, decode_tensor,
+                                 is_tensor_payload, split_tensors)
 
 app = Flask(__name__)
 CORS(app)
+# Optional overrides from AGRIVISION_* environment variables
+app.config.from_prefixed_env('AGRIVISION')
+
+# Bounded queue in front of the model: sheds load instead of timing out
+admission = AdmissionController(
+    concurrency=app.config.get('INFERENCE_CONCURRENCY', 1),
+    max_queue=app.config.get('INFERENCE_QUEUE_MAX', 16),
+    metrics=metrics)
+
+# Per-worker memory instrumentation and graceful recycling
+memory_monitor = MemoryMonitor(
+    interval=app.config.get('MEMORY_SAMPLE_INTERVAL', 60),
+    tracemalloc_frames=app.config.get('MEMORY_TRACEMALLOC_FRAMES', 0))
+max_requests = app.config.get('MAX_REQUESTS', 0)
+if max_requests:
+    # Jitter keeps workers started together from recycling together
+    max_requests += random.randint(0, app.config.get('MAX_REQUESTS_JITTER', 0))
+recycler = WorkerRecycler(max_rss_mb=app.config.get('MAX_RSS_MB', 0), max_requests=max_requests)
+
+# Opt-in per-request profiling (see utils/profiling.py)
+profiler = RequestProfiler(
+    directory=app.config.get('PROFILE_DIR', 'profiles'),
+    sample_rate=app.config.get('PROFILE_SAMPLE_RATE', 0.0),
+    slow_ms=app.config.get('PROFILE_SLOW_MS', 0),
+    allow_header=app.config.get('PROFILE_HEADER', True),
+    max_dumps=app.config.get('PROFILE_MAX_DUMPS', 50))
+
+# Opt-in sampled recording of /predict traffic for replay.py
+traffic_capture = TrafficCapture(
+    app.config['CAPTURE_DIR'],
+    sample_rate=app.config.get('CAPTURE_SAMPLE_RATE', 0.01),
+    max_bytes=app.config.get('CAPTURE_MAX_MB', 1024) * 1024 * 1024) if app.config.get('CAPTURE_DIR') else None
+
+# Per-crop specialist models, loaded on first use and evicted least-recently-used
+specialists = ModelCache(
+    loader=lambda crop: load_specialist(crop),
+    max_bytes=app.config.get('SPECIALIST_MAX_MB', 512) * 1024 * 1024,
+    size_of=lambda specialist: model_bytes(specialist),
+    metrics=metrics,
+    prefix='specialist')
+
+# Grad-CAM explanations: preprocessed inputs of recent uploads (by content hash),
+# rendered overlays on disk, and a batcher that runs them at background priority
+explain_inputs = ArrayLRU(app.config.get('EXPLAIN_INPUT_CACHE_MB', 64) * 1024 * 1024)
+explain_cache = DiskCache(app.config.get('EXPLAIN_CACHE_DIR', 'explanations'),
+                          app.config.get('EXPLAIN_CACHE_MB', 256) * 1024 * 1024)
+explain_batcher = MicroBatcher(
+    lambda items: explain_batch(items),
+    max_batch=app.config.get('EXPLAIN_BATCH_MAX', 8),
+    max_wait=app.config.get('EXPLAIN_BATCH_WAIT_MS', 20) / 1000,
+    name='explain-batcher')
+
+single_flight = SingleFlight(
+    on_duplicate=lambda: metrics.inc('predict_duplicates_total'),
+    on_fallback=lambda: metrics.inc('singleflight_fallbacks_total'))
 
 # Load the model
 MODEL_PATH = 'model/model.h5'
+TFLITE_PATH = 'model/model.tflite'
+# Reduced-precision variants written by train_model.convert_to_tflite (see utils/precision.py)
+TFLITE_PRECISION_PATHS = {'tflite-fp16': 'model/model_fp16.tflite', 'tflite-int8': 'model/model_int8.tflite'}
 model = None
 model_type = None  # 'keras', 'tflite', or None
+model_version = app.config.get('MODEL_VERSION', 'demo')
+cascade_model = None  # optional cheap first stage (see train_model.create_cascade_model)
+cascade_threshold = 1.0
+CASCADE_PATH = 'model/cascade_small.h5'
+# Cheaper resolution tiers next to the full model (see train_model.train_resolution_tiers)
+MODEL_INPUT_SIZE = 224
+TIER_PATTERN = 'model/model_*.h5'
+tier_models = {}  # input size -> Keras model
+tier_versions = {}  # input size -> model version for the prediction log
+# Optional SavedModel that decodes and resizes in the graph (see train_model.export_bytes_model)
+BYTES_MODEL_PATH = 'model/serving_bytes'
+GRAPH_DECODE_FORMATS = ('jpeg', 'png', 'bmp', 'gif')
+bytes_model = None
+# Probabilities plus the penultimate Dense layer from one forward pass, for /similar
+embedding_model = None
+embedding_indexes = {}
+job_executor = None
+
+JOB_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.agt')
 
 # Load remedies
 with open('remedies.json', 'r') as f:
@@ -45,9 +162,41 @@ CLASS_NAMES = [
     'Tomato___healthy'
 ]
 
+def crop_slug(class_name):
+    """Short crop name used for the `crop` hint, e.g. 'Corn_(maize)___Common_rust_' -> 'corn'"""
+    return re.split(r'[_,(]', class_name.split('___')[0])[0].lower()
+
+# Class indices per crop; a crop specialist predicts these classes in this order
+CROP_CLASSES = {}
+for index, class_name in enumerate(CLASS_NAMES):
+    CROP_CLASSES.setdefault(crop_slug(class_name), []).append(index)
+
+# Stands in for the model when none is loaded (no TensorFlow, or
+# AGRIVISION_SYNTHETIC_PROFILE set): configurable cost, deterministic outputs
+synthetic_backend = SyntheticBackend(load_profile(app.config.get('SYNTHETIC_PROFILE')), len(CLASS_NAMES))
+
+# Per-prediction performance data logged next to each prediction
+PREDICTION_STAT_COLUMNS = (
+    ('decode_ms', 'REAL'), ('preprocess_ms', 'REAL'), ('inference_ms', 'REAL'), ('total_ms', 'REAL'),
+    ('width', 'INTEGER'), ('height', 'INTEGER'), ('bytes', 'INTEGER'), ('format', 'TEXT'),
+    ('batch_size', 'INTEGER'), ('model_version', 'TEXT'),
+)
+# Every column of the predictions table, as copied between log shards
+PREDICTION_LOG_COLUMNS = ('id', 'filename', 'timestamp', 'prediction', 'confidence') + tuple(
+    column for column, _ in PREDICTION_STAT_COLUMNS)
+migrated_databases = set()
+shard_databases = set()
+rollups = {}
+
 def init_db():
     """Initialize SQLite database"""
-    conn = sqlite3.connect('predictions.db')
+    db_path = app.config.get('DATABASE', 'predictions.db')
+    conn = sqlite3.connect(db_path)
+    create_prediction_table(conn, db_path)
+    conn.close()
+
+def create_prediction_table(conn, db_path):
+    """Predictions table with its indexes and stats columns, if missing"""
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS predictions
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -55,24 +204,171 @@ def init_db():
                   timestamp TEXT,
                   prediction TEXT,
                   confidence REAL)''')
+    # Indexes for /predictions filters; (prediction, id) keeps keyset order without a sort
+    c.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_predictions_prediction ON predictions (prediction, id)')
+    ensure_prediction_columns(conn, db_path)
     conn.commit()
+
+def ensure_prediction_columns(conn, db_path):
+    """Add the per-prediction stats columns to databases created before they existed"""
+    if db_path in migrated_databases:
+        return
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(predictions)')}
+    for column, column_type in PREDICTION_STAT_COLUMNS:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE predictions ADD COLUMN {column} {column_type}')
+    conn.commit()
+    migrated_databases.add(db_path)
+
+def init_shard(db_path, path, slot):
+    """Create a worker's log shard, with ids starting in the slot's own range"""
+    conn = sqlite3.connect(path)
+    create_prediction_table(conn, path)
+    main = sqlite3.connect(db_path)
+    # Ids of this range merged into the main database earlier are not reused
+    used_max = main.execute('SELECT MAX(id) FROM predictions WHERE id BETWEEN ? AND ?', id_range(slot)).fetchone()[0]
+    main.close()
+    reserve_id_range(conn, slot, used_max)
     conn.close()
 
-def log_prediction(filename, prediction, confidence):
-    """Log prediction to database"""
-    conn = sqlite3.connect(app.config.get('DATABASE', 'predictions.db'))
+def prediction_log_path():
+    """
+    Database this process appends predictions to
+
+    With LOG_SHARDS each gunicorn worker slot writes to its own shard next
+    to the main database (predictions.shard-<slot>.db), so workers do not
+    queue for SQLite's single writer lock. Reads go through
+    open_prediction_log(), which sees every shard.
+    """
+    db_path = app.config.get('DATABASE', 'predictions.db')
+    slot = os.environ.get('AGRIVISION_WORKER_SLOT')
+    if not app.config.get('LOG_SHARDS', False) or slot is None:
+        return db_path
+    path = shard_path(db_path, int(slot))
+    if path not in shard_databases:
+        init_shard(db_path, path, int(slot))
+        shard_databases.add(path)
+    return path
+
+def open_prediction_log(db_path=None):
+    """
+    Connection for reading the prediction log
+
+    Shards that exist are attached and `predictions` reads as the union of
+    the main table and theirs, whether or not this worker writes to one.
+    """
+    db_path = db_path or app.config.get('DATABASE', 'predictions.db')
+    conn = sqlite3.connect(db_path)
+    # The union needs the same columns on every side
+    ensure_prediction_columns(conn, db_path)
+    attach_shards(conn, db_path, PREDICTION_LOG_COLUMNS)
+    return conn
+
+def merge_prediction_shards():
+    """Move all shard rows into the main database; returns rows moved per shard"""
+    return merge_shards(app.config.get('DATABASE', 'predictions.db'), PREDICTION_LOG_COLUMNS)
+
+def start_shard_merger():
+    """Merge the log shards every LOG_SHARD_MERGE_SECONDS, from the worker in slot 0"""
+    interval = app.config.get('LOG_SHARD_MERGE_SECONDS', 0)
+    if not interval or os.environ.get('AGRIVISION_WORKER_SLOT') != '0':
+        return
+
+    def merge_periodically():
+        while True:
+            time.sleep(interval)
+            try:
+                metrics.inc('log_shard_rows_merged_total', sum(merge_prediction_shards().values()))
+            except sqlite3.Error:
+                metrics.inc('log_shard_merge_errors_total')
+
+    threading.Thread(target=merge_periodically, name='shard-merger', daemon=True).start()
+
+def get_rollup(db_path):
+    """Latency rollup for a predictions database (created on first use)"""
+    if db_path not in rollups:
+        rollups[db_path] = LatencyRollup(db_path)
+    return rollups[db_path]
+
+def embedding_index_path():
+    """Embedding index directory, next to predictions.db unless configured"""
+    db_dir = os.path.dirname(os.path.abspath(app.config.get('DATABASE', 'predictions.db')))
+    return app.config.get('EMBEDDING_INDEX') or os.path.join(db_dir, 'embeddings')
+
+def get_embedding_index():
+    """Embedding index for the configured path (created on first use)"""
+    path = embedding_index_path()
+    if path not in embedding_indexes:
+        # One shard per gunicorn worker slot, so restarted workers keep appending to theirs
+        slot = os.environ.get('AGRIVISION_WORKER_SLOT')
+        embedding_indexes[path] = EmbeddingIndex(path, dim=app.config.get('EMBEDDING_DIM', 256),
+                                                 writer=f'worker-{slot}' if slot else None)
+    return embedding_indexes[path]
+
+def log_prediction(filename, prediction, confidence, stats=None):
+    """
+    Log prediction to database
+
+    Args:
+        filename: Uploaded file name
+        prediction: Display name of the predicted class
+        confidence: Confidence in percent
+        stats: Optional stage timings (decode_ms, preprocess_ms, inference_ms,
+            total_ms), input width/height/bytes/format and batch_size, and
+            the image's embedding, which is added to the embedding index
+
+    Returns:
+        Id of the logged prediction
+    """
+    db_path = app.config.get('DATABASE', 'predictions.db')
+    log_path = prediction_log_path()
+    stats = dict(stats or {})
+    stats.setdefault('model_version', model_version)
+    conn = sqlite3.connect(log_path)
+    ensure_prediction_columns(conn, log_path)
     c = conn.cursor()
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute("INSERT INTO predictions (filename, timestamp, prediction, confidence) VALUES (?, ?, ?, ?)",
-              (filename, timestamp, prediction, confidence))
+    columns = [column for column, _ in PREDICTION_STAT_COLUMNS]
+    c.execute(f"INSERT INTO predictions (filename, timestamp, prediction, confidence, {', '.join(columns)}) "
+              f"VALUES (?, ?, ?, ?{', ?' * len(columns)})",
+              [filename, timestamp, prediction, confidence] + [stats.get(column) for column in columns])
+    prediction_id = c.lastrowid
     conn.commit()
     conn.close()
+    get_rollup(db_path).add(timestamp, stats)
+    if stats.get('embedding') is not None:
+        get_embedding_index().add([prediction_id], [stats['embedding']])
+    return prediction_id
+
+def describe_model_version(path):
+    """MODEL_VERSION setting, or the model file name and modification time"""
+    if app.config.get('MODEL_VERSION'):
+        return app.config['MODEL_VERSION']
+    modified = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d%H%M')
+    return f"{os.path.basename(path)}@{modified}"
 
 def load_model():
-    """Load the TensorFlow model"""
-    global model, model_type
+    """
+    Load the TensorFlow model
+
+    MODEL_PRECISION picks the variant: float32 (default), float16 (the
+    Keras model converted after loading), tflite-fp16 or tflite-int8. The
+    bytes-input model is a float32 export and is loaded for float32 only.
+    """
+    global model, model_type, model_version
+    precision = app.config.get('MODEL_PRECISION', 'float32')
+    if precision not in PRECISIONS:
+        raise ValueError(f'MODEL_PRECISION must be one of {PRECISIONS}, got {precision!r}')
+    profile = app.config.get('SYNTHETIC_PROFILE')
+    if profile:
+        print(f"Serving from the synthetic backend (profile {profile})")
+        model = None
+        model_type = None
+        model_version = app.config.get('MODEL_VERSION', f'synthetic:{os.path.basename(profile)}')
+        return
     if not TENSORFLOW_AVAILABLE:
-        print("⚠️  Running in DEMO MODE - predictions will be random")
+        print("⚠️  Running in DEMO MODE - predictions come from the synthetic backend")
         print("    To use real AI predictions:")
         print("    1. Install TensorFlow: pip install tensorflow")
         print("    2. Add your trained model.h5 to the model/ directory")
@@ -80,31 +376,170 @@ def load_model():
         model_type = None
         return
     
-    if os.path.exists(MODEL_PATH):
+    if precision in TFLITE_PRECISION_PATHS:
+        path = TFLITE_PRECISION_PATHS[precision]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'MODEL_PRECISION={precision} needs {path} (train_model.convert_to_tflite)')
+        load_tflite_model(path)
+    elif os.path.exists(MODEL_PATH):
         model = tf.keras.models.load_model(MODEL_PATH)
         model_type = 'keras'
-        print("Model loaded successfully")
-    elif os.path.exists('model/model.tflite'):
-        # Load TFLite model
-        interpreter = tf.lite.Interpreter(model_path='model/model.tflite')
-        interpreter.allocate_tensors()
-        model = interpreter
-        model_type = 'tflite'
-        print("TFLite model loaded successfully")
+        model_version = describe_model_version(MODEL_PATH)
+        if precision == 'float16':
+            # The float32 copy is released once the converted model replaces it
+            model = float16_model(model, tf)
+            model_version += '+float16'
+        print(f"Model loaded successfully ({precision} weights)")
+        load_embedding_model()
+        load_cascade()
+        load_tiers()
+    elif os.path.exists(TFLITE_PATH):
+        load_tflite_model(TFLITE_PATH)
     else:
         print("Warning: No model file found. Creating a dummy model for testing.")
         # Create a simple dummy model for testing
         model = tf.keras.Sequential([
-            tf.keras.layers.InputLayer(input_shape=(224, 224, 3)),
+            tf.keras.layers.InputLayer(input_shape=(MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3)),
             tf.keras.layers.GlobalAveragePooling2D(),
             tf.keras.layers.Dense(len(CLASS_NAMES), activation='softmax')
         ])
         model_type = 'keras'
+        model_version = 'dummy'
+    if precision == 'float32':
+        load_bytes_model()
+    elif os.path.isdir(BYTES_MODEL_PATH):
+        # The export holds float32 weights; keeping it resident would undo the precision setting
+        print(f"Bytes-input serving model not used with MODEL_PRECISION={precision}")
+
+def load_tflite_model(path):
+    """Load a TFLite model as the served model"""
+    global model, model_type, model_version
+    interpreter = tf.lite.Interpreter(model_path=path, num_threads=THREAD_PLAN['intra_op'])
+    interpreter.allocate_tensors()
+    model = interpreter
+    model_type = 'tflite'
+    model_version = describe_model_version(path)
+    print(f"TFLite model loaded successfully ({path})")
+
+def load_embedding_model():
+    """Expose the penultimate Dense layer next to the probabilities"""
+    global embedding_model
+    dense = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Dense)]
+    if not app.config.get('EMBEDDINGS', True) or len(dense) < 2:
+        return
+    embedding_model = tf.keras.Model(model.inputs, [model.outputs[0], dense[-2].output])
+    app.config.setdefault('EMBEDDING_DIM', int(dense[-2].units))
+    print(f"Embeddings enabled ({dense[-2].units} dimensions)")
+
+def load_bytes_model():
+    """Load the bytes-input serving model if it was exported and is not disabled"""
+    global bytes_model
+    if not app.config.get('BYTES_MODEL', True) or not os.path.isdir(BYTES_MODEL_PATH):
+        return
+    if cascade_model is not None:
+        # The export wraps the full model only; uploads keep the early exit
+        print("Bytes-input serving model not used: the cascade serves full-resolution uploads")
+        return
+    signature = tf.saved_model.load(BYTES_MODEL_PATH).signatures['serving_default']
+    if embedding_model is not None and 'embeddings' not in signature.structured_outputs:
+        # Older exports return probabilities only; their predictions would miss /similar
+        print("Bytes-input serving model not used: it has no embeddings output "
+              "(re-export with train_model.export_bytes_model)")
+        return
+    bytes_model = signature
+    print("Bytes-input serving model loaded (in-graph decode and resize)")
+
+def load_cascade():
+    """Load the early-exit first stage if it was trained and is not disabled"""
+    global cascade_model, cascade_threshold
+    if not app.config.get('CASCADE', True) or not os.path.exists(CASCADE_PATH):
+        return
+    with open('model/cascade.json') as f:
+        settings = json.load(f)
+    cascade_model = tf.keras.models.load_model(CASCADE_PATH)
+    cascade_threshold = app.config.get('CASCADE_THRESHOLD', settings['threshold'])
+    print(f"Cascade stage 1 loaded (threshold {cascade_threshold:.3f})")
+    if embedding_model is not None:
+        print("Note: early-exit cascade answers are not added to the /similar index")
+
+def load_tiers():
+    """Load the lower-resolution sibling models (model/model_<size>.h5)"""
+    for path in glob.glob(TIER_PATTERN):
+        size = os.path.basename(path)[len('model_'):-len('.h5')]
+        if not size.isdigit() or int(size) == MODEL_INPUT_SIZE:
+            continue
+        tier_models[int(size)] = tf.keras.models.load_model(path)
+        tier_versions[int(size)] = describe_model_version(path)
+        print(f"Resolution tier {size}px loaded")
+    if tier_models and embedding_model is not None:
+        print(f"Note: predictions served by resolution tiers {sorted(tier_models)} "
+              "are not added to the /similar index")
+
+def specialist_path(crop):
+    """Model file of a crop specialist (see train_model.train_crop_specialist)"""
+    return os.path.join(app.config.get('SPECIALIST_DIR', 'model/crops'), f'{crop}.h5')
+
+def load_specialist(crop):
+    """Load one crop specialist; called by the specialists cache"""
+    specialist = tf.keras.models.load_model(specialist_path(crop))
+    print(f"Specialist model for {crop} loaded")
+    return specialist
+
+def model_bytes(keras_model):
+    """Estimated resident size of a model: its weights"""
+    return sum(weights.nbytes for weights in keras_model.get_weights())
+
+def crop_hint():
+    """
+    Crop named by the `crop` parameter, or None
+
+    Raises:
+        ValueError: If the crop is not one of CROP_CLASSES
+    """
+    crop = request.values.get('crop', '').strip().lower()
+    if not crop:
+        return None
+    if crop not in CROP_CLASSES:
+        raise ValueError(f'Unknown crop {crop!r}')
+    return crop
+
+def get_specialist(crop):
+    """
+    (crop, model) for the crop's specialist, loading it if needed, or None
+    when there is no hint or no specialist was trained for that crop
+    """
+    if crop is None or not os.path.exists(specialist_path(crop)):
+        return None
+    return crop, specialists.get(crop)
 
-def preprocess_image(image):
+def available_tiers():
+    """Input sizes that can serve a request, most accurate first"""
+    return sorted(set(tier_models) | {MODEL_INPUT_SIZE}, reverse=True)
+
+def select_tier(params=None):
+    """
+    Input size for the current request
+
+    Starts from the `tier` parameter (a size such as 160, or 'auto' for the
+    full model) and moves to cheaper tiers as the inference queue fills up.
+    The parameter is read from request.values unless other params are given.
+
+    Raises:
+        ValueError: If the tier parameter is invalid
+    """
+    requested = parse_tier((request.values if params is None else params).get('tier'))
+    load = admission.load() if app.config.get('TIER_AUTO_FALLBACK', True) else 0.0
+    size, downgraded = choose_tier(available_tiers(), requested, load,
+                                   app.config.get('TIER_LOAD_STEPS', [0.5, 0.8]))
+    metrics.inc(f'predict_tier_{size}_total')
+    if downgraded:
+        metrics.inc('tier_downgrades_total')
+    return size
+
+def preprocess_image(image, size=MODEL_INPUT_SIZE):
     """Preprocess the image for model input"""
     # Resize image to model input size
-    img = image.resize((224, 224))
+    img = image.resize((size, size))
     # Convert to array
     img_array = np.array(img)
     # Normalize pixel values
@@ -113,84 +548,1020 @@ def preprocess_image(image):
     img_array = np.expand_dims(img_array, axis=0)
     return img_array
 
+def normalize_pixels(pixels):
+    """Scale a uint8 (size, size, 3) array to float32 [0, 1] with a batch dimension"""
+    return np.multiply(pixels, 1 / 255.0, dtype=np.float32)[np.newaxis]
+
+def decode_image(image_bytes, stats=None):
+    """
+    Decode uploaded bytes (encoded image or raw tensor) into a PIL image
+
+    If a stats dict is given, the input format, size and dimensions are recorded in it.
+    """
+    if is_tensor_payload(image_bytes):
+        image = Image.fromarray(decode_tensor(image_bytes))
+        image_format = 'tensor'
+    else:
+        image = Image.open(io.BytesIO(image_bytes))
+        # Decode now rather than lazily so the decode stage is timed correctly
+        image.load()
+        image_format = (image.format or 'unknown').lower()
+    if stats is not None:
+        stats.update(format=image_format, width=image.width, height=image.height, bytes=len(image_bytes))
+    # Convert RGBA to RGB if necessary
+    if image.mode == 'RGBA':
+        image = image.convert('RGB')
+    return image
+
+def run_inference(batch, specialist=None, outputs=None):
+    """
+    Run the loaded model on a preprocessed batch
+
+    Batches at a lower resolution go to the matching tier model.
+
+    Args:
+        batch: Array of shape (N, size, size, 3) with values in [0, 1]
+        specialist: Optional (crop, model) from get_specialist() to use
+            instead of the general model
+        outputs: Optional dict that receives 'embeddings', one vector (or
+            None) per row, for rows the general Keras model scored
+
+    Returns:
+        Array of class probabilities with shape (N, len(CLASS_NAMES))
+    """
+    if specialist is not None:
+        # Specialists score only their crop's classes; other classes get 0
+        crop, crop_model = specialist
+        predictions = np.zeros((len(batch), len(CLASS_NAMES)), dtype=np.float32)
+        predictions[:, CROP_CLASSES[crop]] = crop_model.predict(batch, verbose=0)
+        return predictions
+    if model is None:
+        # Demo / capacity-planning mode
+        return synthetic_backend.predict(batch)
+    if batch.shape[1] in tier_models:
+        return tier_models[batch.shape[1]].predict(batch, verbose=0)
+    if model_type == 'tflite':
+        # Handle TFLite model
+        input_details = model.get_input_details()
+        output_details = model.get_output_details()
+
+        # Resize the input tensor when the batch size changes
+        if input_details[0]['shape'][0] != len(batch):
+            model.resize_tensor_input(input_details[0]['index'], batch.shape)
+            model.allocate_tensors()
+
+        # Set input tensor and run inference; fully integer models take
+        # quantized inputs and return quantized probabilities
+        model.set_tensor(input_details[0]['index'], quantize(batch, input_details[0]))
+        model.invoke()
+        return dequantize(model.get_tensor(output_details[0]['index']), output_details[0])
+    if cascade_model is not None:
+        # Confident stage-1 answers exit early; the rest go to the full model,
+        # which also yields their embeddings
+        full_outputs = {}
+
+        def full_stage(rows):
+            if embedding_model is None:
+                return model.predict(rows, verbose=0)
+            probabilities, full_outputs['embeddings'] = embedding_model.predict(rows, verbose=0)
+            return probabilities
+
+        predictions, escalated = cascade_predict(
+            batch,
+            lambda b: cascade_model.predict(b, verbose=0),
+            full_stage,
+            cascade_threshold)
+        metrics.inc('cascade_images_total', len(batch))
+        metrics.inc('cascade_escalated_total', int(escalated.sum()))
+        if outputs is not None and 'embeddings' in full_outputs:
+            # Early exits have no full-model embedding and stay out of the index
+            embeddings = [None] * len(batch)
+            for i, embedding in zip(np.flatnonzero(escalated), full_outputs['embeddings']):
+                embeddings[i] = embedding
+            outputs['embeddings'] = embeddings
+        return predictions
+    if embedding_model is not None:
+        # Same forward pass, with the penultimate layer kept
+        predictions, embeddings = embedding_model.predict(batch, verbose=0)
+        if outputs is not None:
+            outputs['embeddings'] = embeddings
+        return predictions
+    # Handle Keras model
+    return model.predict(batch, verbose=0)
+
+def run_encoded_inference(payloads, outputs=None):
+    """
+    Run the bytes-input model on encoded images
+
+    Decoding, resizing and normalization happen inside the graph, in
+    TensorFlow's native kernels and without holding the GIL. The export's
+    'embeddings' output is put into the optional outputs dict.
+    """
+    result = bytes_model(images=tf.constant(payloads))
+    if outputs is not None and embedding_model is not None and 'embeddings' in result:
+        outputs['embeddings'] = result['embeddings'].numpy()
+    return result['probabilities'].numpy()
+
+def request_budget(default_priority):
+    """
+    Admission parameters for the current request
+
+    The priority class comes from the X-Priority header (clients may only
+    lower their priority below the endpoint default); the deadline from
+    X-Request-Deadline-Ms or the REQUEST_DEADLINE_MS setting.
+    """
+    priority = default_priority
+    requested = request.headers.get('X-Priority', '').lower()
+    if requested in PRIORITIES and PRIORITIES[requested] > PRIORITIES[priority]:
+        priority = requested
+    budget_ms = request.headers.get('X-Request-Deadline-Ms', type=float)
+    if budget_ms is None:
+        budget_ms = app.config.get('REQUEST_DEADLINE_MS', 30000)
+    return {'priority': priority, 'deadline': time.monotonic() + budget_ms / 1000}
+
+def infer(batch, budget=None, specialist=None, encoded=False, outputs=None):
+    """
+    Run a batch through the model once the admission queue lets it in
+
+    With encoded=True, batch is a list of encoded image bytes for the
+    bytes-input model instead of a preprocessed array. Extra model outputs
+    (embeddings) are put into the optional outputs dict.
+    """
+    if encoded:
+        run = lambda: run_encoded_inference(batch, outputs)
+    else:
+        run = lambda: run_inference(batch, specialist, outputs)
+    session = g.get('profile') if has_request_context() else None
+    if session is not None and TENSORFLOW_AVAILABLE and model is not None:
+        # Profiled request: add a TensorFlow trace of the inference stage
+        call = lambda: profiler.trace_tensorflow(session, tf, run)
+    else:
+        call = run
+    return admission.run(call, **(budget or {}))
+
+def overloaded_response(error):
+    """503 + Retry-After for a full queue, 504 for an expired deadline"""
+    if isinstance(error, QueueFull):
+        response = jsonify({'error': str(error)})
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+    return jsonify({'error': str(error)}), 504
+
+def prepare_pixels(pixels, size=MODEL_INPUT_SIZE):
+    """Model-ready batch of one from a decoded uint8 (H, W, 3) array"""
+    if pixels.shape[:2] == (size, size):
+        return normalize_pixels(pixels)
+    return preprocess_image(Image.fromarray(pixels), size)
+
+def prepare_input(image_bytes, stats=None, size=MODEL_INPUT_SIZE):
+    """
+    Turn one upload into a model-ready batch of one at the given input size
+
+    Raw tensor payloads already at that size skip decoding and resizing and go
+    straight to normalization. If a stats dict is given, decode and
+    preprocess timings and input properties are recorded in it.
+    """
+    stats = {} if stats is None else stats
+    started = time.perf_counter()
+    if is_tensor_payload(image_bytes):
+        pixels = decode_tensor(image_bytes)
+        stats.update(format='tensor', width=pixels.shape[1], height=pixels.shape[0], bytes=len(image_bytes))
+        decoded = time.perf_counter()
+        batch = prepare_pixels(pixels, size)
+    else:
+        image = decode_image(image_bytes, stats)
+        decoded = time.perf_counter()
+        batch = preprocess_image(image, size)
+    stats['decode_ms'] = (decoded - started) * 1000
+    stats['preprocess_ms'] = (time.perf_counter() - decoded) * 1000
+    return batch
+
+def tier_stats(size, specialist=None):
+    """Stats entries identifying the tier or specialist model in the prediction log"""
+    if specialist is not None:
+        return {'model_version': describe_model_version(specialist_path(specialist[0]))}
+    return {'model_version': tier_versions[size]} if size in tier_versions else {}
+
+def graph_decodable(image_bytes, stats):
+    """
+    Whether an upload can go to the bytes-input model as is
+
+    Only the image header is read. For such uploads decode_ms covers the
+    header check and preprocess_ms is 0: decoding and resizing happen in
+    the graph and count as inference.
+    """
+    if is_tensor_payload(image_bytes):
+        return False
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    image_format = (image.format or 'unknown').lower()
+    if image_format not in GRAPH_DECODE_FORMATS:
+        return False
+    stats.update(format=image_format, width=image.width, height=image.height, bytes=len(image_bytes),
+                 decode_ms=(time.perf_counter() - started) * 1000, preprocess_ms=0.0)
+    return True
+
+def input_pixels(batch):
+    """uint8 pixels of the first image of a preprocessed batch (4x smaller to cache)"""
+    return np.rint(batch[0] * 255).astype(np.uint8)
+
+def classify(image_bytes, budget=None, size=MODEL_INPUT_SIZE, specialist=None, image_hash=None):
+    """
+    Decode, preprocess and classify a single uploaded image
+
+    Args:
+        image_bytes: Uploaded file content
+        budget: Admission parameters from request_budget()
+        size: Input size of the resolution tier to use
+        specialist: Optional (crop, model) from get_specialist()
+        image_hash: Content hash; the preprocessed input (or, for the
+            bytes-input model, the upload itself) is kept under it for a
+            later /explain
+
+    Returns:
+        Tuple (predicted class index, confidence in percent, stats dict)
+    """
+    stats = {'batch_size': 1, **tier_stats(size, specialist)}
+    use_bytes_model = bytes_model is not None and size == MODEL_INPUT_SIZE and specialist is None
+    if use_bytes_model and graph_decodable(image_bytes, stats):
+        batch, encoded = [image_bytes], True
+        if image_hash:
+            # Kept encoded (smaller); /explain decodes it on first use
+            explain_inputs.put(image_hash, np.frombuffer(image_bytes, dtype=np.uint8))
+    else:
+        batch, encoded = prepare_input(image_bytes, stats, size), False
+        if image_hash and size == MODEL_INPUT_SIZE:
+            explain_inputs.put(image_hash, input_pixels(batch))
+    started = time.perf_counter()
+    outputs = {}
+    predictions = infer(batch, budget, specialist, encoded, outputs)
+    stats['inference_ms'] = (time.perf_counter() - started) * 1000
+    if 'embeddings' in outputs:
+        stats['embedding'] = outputs['embeddings'][0]
+    predicted_class_idx = int(np.argmax(predictions[0]))
+    confidence = float(predictions[0][predicted_class_idx]) * 100
+    return predicted_class_idx, confidence, stats
+
+def display_name(class_name):
+    """Format a class name for display"""
+    return class_name.replace('___', ' - ').replace('_', ' ')
+
+def tile_options():
+    """Tiling parameters for this request, bounded by the server configuration"""
+    max_tiles = app.config.get('TILE_MAX', 64)
+    requested = request.values.get('max_tiles', type=int)
+    if requested:
+        max_tiles = max(1, min(requested, max_tiles))
+    scales = request.values.get('scales', '1.0')
+    return {
+        'scales': tuple(sorted({min(1.0, max(0.05, float(s))) for s in scales.split(',')})),
+        'max_tiles': max_tiles,
+        'overlap': app.config.get('TILE_OVERLAP', 0.25),
+        'min_leaf': app.config.get('TILE_MIN_LEAF', 0.3),
+    }
+
+def classify_tiled(image_bytes, budget=None, specialist=None, **options):
+    """
+    Classify a high-resolution image from overlapping leaf tiles
+
+    All kept tiles run through the model as one batch.
+
+    Returns:
+        Tuple (class index, confidence in percent, stats dict, per-tile scores,
+        skipped tile count)
+    """
+    stats = tier_stats(MODEL_INPUT_SIZE, specialist)
+    started = time.perf_counter()
+    image = decode_image(image_bytes, stats).convert('RGB')
+    decoded = time.perf_counter()
+    tiles, info, skipped = generate_tiles(image, tile_size=MODEL_INPUT_SIZE, **options)
+    batch = tiles.astype(np.float32) / 255.0
+    preprocessed = time.perf_counter()
+    predictions = infer(batch, budget, specialist)
+    stats.update(decode_ms=(decoded - started) * 1000,
+                 preprocess_ms=(preprocessed - decoded) * 1000,
+                 inference_ms=(time.perf_counter() - preprocessed) * 1000,
+                 batch_size=len(tiles))
+    predicted_class_idx, confidence, tile_scores = aggregate_tiles(predictions, info, CLASS_NAMES)
+    return predicted_class_idx, confidence * 100, stats, tile_scores, skipped
+
+def format_result(predicted_class_idx, confidence):
+    """Build the API response fields for a predicted class"""
+    # Get disease name
+    disease_name = CLASS_NAMES[predicted_class_idx]
+
+    # Get remedy
+    remedy = remedies.get(disease_name, "Consult an agricultural expert for specific treatment.")
+
+    return {
+        'prediction': display_name(disease_name),
+        'confidence': round(confidence, 2),
+        'remedy': remedy
+    }
+
+def profiled(view):
+    """
+    Profile a view when RequestProfiler selects the request
+
+    With profiling off this costs a single attribute check per request.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return view(*args, **kwargs)
+        header = request.headers.get('X-Profile') == '1' and admin_allowed()
+        session = profiler.begin(header_requested=header)
+        if session is None:
+            return view(*args, **kwargs)
+        g.profile = session
+        response = None
+        try:
+            response = app.make_response(view(*args, **kwargs))
+            return response
+        finally:
+            name = profiler.finish(session, request.endpoint)
+            if name:
+                metrics.inc('profiles_written_total')
+                if response is not None:
+                    response.headers['X-Profile-Dump'] = name
+    return wrapper
+
+CAPTURED_HEADERS = ('X-Priority', 'X-Request-Deadline-Ms', 'X-Filename')
+CAPTURED_RESPONSE_KEYS = ('prediction', 'confidence', 'tier', 'specialist', 'error')
+
+def captured(view):
+    """
+    Record a sample of requests (upload, timing, response) when CAPTURE_DIR is set
+
+    Requests sent by replay.py (X-Replay header) are never recorded; they
+    get their view time, measured like the recorded latency_ms, in the
+    X-Server-Time-Ms response header instead. With capture off this costs a
+    single attribute check per request.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.headers.get('X-Replay'):
+            started = time.perf_counter()
+            response = app.make_response(view(*args, **kwargs))
+            response.headers['X-Server-Time-Ms'] = f'{(time.perf_counter() - started) * 1000:.2f}'
+            return response
+        if traffic_capture is None or not traffic_capture.sample():
+            return view(*args, **kwargs)
+        arrived = time.time()
+        started = time.perf_counter()
+        response = app.make_response(view(*args, **kwargs))
+        latency_ms = (time.perf_counter() - started) * 1000
+        try:
+            data, filename = None, None
+            if request.mimetype == TENSOR_MIMETYPE:
+                data = request.get_data()
+            else:
+                file = request.files.get('image')
+                if file is not None and file.filename:
+                    file.stream.seek(0)
+                    data, filename = file.read(), file.filename
+            if data:
+                body = response.get_json(silent=True) or {}
+                traffic_capture.record(data, {
+                    'time': arrived,
+                    'endpoint': request.path,
+                    'mimetype': request.mimetype,
+                    'filename': filename,
+                    'form': request.form.to_dict(),
+                    'args': request.args.to_dict(),
+                    'headers': {name: request.headers[name] for name in CAPTURED_HEADERS if name in request.headers},
+                    'status': response.status_code,
+                    'latency_ms': round(latency_ms, 2),
+                    'response': {key: body[key] for key in CAPTURED_RESPONSE_KEYS if key in body},
+                })
+                metrics.inc('capture_requests_total')
+        except Exception:
+            # Capturing must never fail the request it observes
+            metrics.inc('capture_errors_total')
+        return response
+    return wrapper
+
+def classify_many(uploads, budget=None, started=None, size=MODEL_INPUT_SIZE):
+    """
+    Classify several uploads with one batched forward pass and log them
+
+    Args:
+        uploads: List of (filename, image bytes, decoded pixels); either the
+            bytes or the pixels may be None
+        budget: Admission parameters from request_budget()
+        started: time.perf_counter() at request start, for the logged total_ms
+        size: Input size of the resolution tier to use
+
+    Returns:
+        List of result dicts in upload order; an upload that fails to decode
+        gets an 'error' entry instead of failing the whole batch
+    """
+    results = [None] * len(uploads)
+    use_bytes_model = bytes_model is not None and size == MODEL_INPUT_SIZE
+    # Preprocessed arrays, and encoded bytes for the bytes-input model:
+    # each group is (inputs, positions in uploads, stats)
+    arrays, encoded = ([], [], []), ([], [], [])
+    for i, (filename, image_bytes, pixels) in enumerate(uploads):
+        stats = tier_stats(size)
+        try:
+            if pixels is not None:
+                prepared = time.perf_counter()
+                batch = prepare_pixels(pixels, size)
+                stats.update(format='tensor', width=pixels.shape[1], height=pixels.shape[0],
+                             bytes=pixels.nbytes, decode_ms=0.0,
+                             preprocess_ms=(time.perf_counter() - prepared) * 1000)
+            elif use_bytes_model and graph_decodable(image_bytes, stats):
+                for part, value in zip(encoded, (image_bytes, i, stats)):
+                    part.append(value)
+                continue
+            else:
+                batch = prepare_input(image_bytes, stats, size)
+            for part, value in zip(arrays, (batch[0], i, stats)):
+                part.append(value)
+        except Exception as e:
+            results[i] = {'filename': filename, 'error': str(e)}
+
+    def run_group(inputs, positions, all_stats, is_encoded):
+        inference_started = time.perf_counter()
+        outputs = {}
+        predictions = infer(inputs if is_encoded else np.stack(inputs), budget,
+                            encoded=is_encoded, outputs=outputs)
+        inference_ms = (time.perf_counter() - inference_started) * 1000
+        embeddings = outputs.get('embeddings', [None] * len(inputs))
+        for i, probs, stats, embedding in zip(positions, predictions, all_stats, embeddings):
+            predicted_class_idx = int(np.argmax(probs))
+            confidence = float(probs[predicted_class_idx]) * 100
+            stats.update(inference_ms=inference_ms, batch_size=len(inputs), embedding=embedding)
+            if started is not None:
+                stats['total_ms'] = (time.perf_counter() - started) * 1000
+            else:
+                stats['total_ms'] = stats['decode_ms'] + stats['preprocess_ms'] + inference_ms
+            result = format_result(predicted_class_idx, confidence)
+            prediction_id = log_prediction(uploads[i][0], result['prediction'], confidence, stats)
+            results[i] = dict(result, filename=uploads[i][0], prediction_id=prediction_id)
+
+    if encoded[0]:
+        try:
+            run_group(*encoded, True)
+        except (QueueFull, DeadlineExceeded):
+            raise
+        except Exception:
+            # A corrupt file behind a valid header fails the whole in-graph
+            # decode: decode the group with PIL so only that upload gets an error
+            metrics.inc('bytes_model_fallbacks_total')
+            for image_bytes, i in zip(*encoded[:2]):
+                stats = tier_stats(size)
+                try:
+                    batch = prepare_input(image_bytes, stats, size)
+                except Exception as e:
+                    results[i] = {'filename': uploads[i][0], 'error': str(e)}
+                    continue
+                for part, value in zip(arrays, (batch[0], i, stats)):
+                    part.append(value)
+    if arrays[0]:
+        run_group(*arrays, False)
+    return results
+
 @app.route('/predict', methods=['POST'])
+@captured
+@profiled
 def predict():
     """Handle prediction requests"""
+    started = time.perf_counter()
     try:
-        # Check if image file is present
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'error': 'No selected file'}), 400
-        
-        # Read and process image
-        image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert RGBA to RGB if necessary
-        if image.mode == 'RGBA':
-            image = image.convert('RGB')
-        
-        # Preprocess image
-        processed_image = preprocess_image(image)
-        
-        # Make prediction
-        if model is None:
-            # Demo mode - generate random prediction
-            import random
-            predicted_class_idx = random.randint(0, len(CLASS_NAMES) - 1)
-            confidence = random.uniform(75.0, 95.0)
-        elif model_type == 'tflite':
-            # Handle TFLite model
-            input_details = model.get_input_details()
-            output_details = model.get_output_details()
-            
-            # Set input tensor
-            model.set_tensor(input_details[0]['index'], processed_image.astype(np.float32))
-            
-            # Run inference
-            model.invoke()
-            
-            # Get output tensor
-            predictions = model.get_tensor(output_details[0]['index'])
-            predicted_class_idx = np.argmax(predictions[0])
-            confidence = float(predictions[0][predicted_class_idx]) * 100
+        if request.mimetype == TENSOR_MIMETYPE:
+            # Raw tensor body (no multipart wrapper)
+            filename = request.headers.get('X-Filename', 'tensor.agt')
+            image_bytes = request.get_data()
         else:
-            # Handle Keras model
-            predictions = model.predict(processed_image, verbose=0)
-            predicted_class_idx = np.argmax(predictions[0])
-            confidence = float(predictions[0][predicted_class_idx]) * 100
-        
-        # Get disease name
-        disease_name = CLASS_NAMES[predicted_class_idx]
-        # Format disease name for display
-        display_name = disease_name.replace('___', ' - ').replace('_', ' ')
-        
-        # Get remedy
-        remedy = remedies.get(disease_name, "Consult an agricultural expert for specific treatment.")
+            # Check if image file is present
+            if 'image' not in request.files:
+                return jsonify({'error': 'No image file provided'}), 400
+
+            file = request.files['image']
+            if file.filename == '':
+                return jsonify({'error': 'No selected file'}), 400
+            filename = file.filename
+            image_bytes = file.read()
+
+        metrics.inc('predict_requests_total')
+        if is_tensor_payload(image_bytes):
+            metrics.inc('predict_tensor_uploads_total')
+
+        try:
+            crop = crop_hint()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # Loaded outside the admission queue so a cold load does not hold a model slot
+        specialist = get_specialist(crop)
+
+        tiled = request.values.get('tiled', '').lower() in ('1', 'true', 'yes')
+        if tiled:
+            try:
+                options = tile_options()
+            except ValueError:
+                return jsonify({'error': 'Invalid tile scales'}), 400
+            # Tiles are cut at the full model's input size
+            size = MODEL_INPUT_SIZE
+        elif specialist is not None:
+            # Specialists exist at full resolution only
+            size = MODEL_INPUT_SIZE
+        else:
+            try:
+                size = select_tier()
+            except ValueError:
+                return jsonify({'error': 'Invalid tier'}), 400
+        budget = request_budget('interactive')
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        if tiled:
+            compute = lambda: classify_tiled(image_bytes, budget, specialist, **options)
+        else:
+            compute = lambda: classify(image_bytes, budget, size, specialist, image_hash)
+
+        # Identical uploads in flight at the same time share one decode + inference
+        if app.config.get('SINGLE_FLIGHT', True):
+            content_key = image_hash
+            if tiled:
+                content_key += f":tiled:{sorted(options.items())}"
+            else:
+                content_key += f":tier:{size}"
+            if specialist is not None:
+                content_key += f":crop:{crop}"
+            # A follower waits no longer than its own deadline allows
+            result, _ = single_flight.do(content_key, compute,
+                                         timeout=app.config.get('SINGLE_FLIGHT_TIMEOUT', 30),
+                                         deadline=budget['deadline'])
+        else:
+            result = compute()
+
+        predicted_class_idx, confidence = result[:2]
+        # Copy: followers of a single-flight call share the leader's result
+        stats = dict(result[2])
+        response = format_result(predicted_class_idx, confidence)
+        response['tier'] = size
+        response['specialist'] = crop if specialist is not None else None
+        response['image_hash'] = image_hash
+        if tiled:
+            tile_scores, skipped = result[3:]
+            response['tiles'] = [
+                {'box': t['box'], 'scale': t['scale'], 'leaf_fraction': t['leaf_fraction'],
+                 'prediction': display_name(CLASS_NAMES[t['class_index']]),
+                 'confidence': round(t['confidence'] * 100, 2)}
+                for t in tile_scores
+            ]
+            response['tiles_skipped'] = skipped
         
         # Log prediction
-        log_prediction(file.filename, display_name, confidence)
-        
-        # Return response
-        response = {
-            'prediction': display_name,
-            'confidence': round(confidence, 2),
-            'remedy': remedy
-        }
+        stats['total_ms'] = (time.perf_counter() - started) * 1000
+        response['prediction_id'] = log_prediction(filename, response['prediction'], confidence, stats)
         
         return jsonify(response), 200
     
+    except TensorFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except (QueueFull, DeadlineExceeded) as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def explainable():
+    """Whether the loaded model supports Grad-CAM"""
+    return (TENSORFLOW_AVAILABLE and model_type == 'keras' and
+            split_feature_model(model, tf) is not None)
+
+def explain_batch(items):
+    """
+    Grad-CAM for a batch of /explain requests
+
+    Runs through the admission queue at background priority, so
+    interactive predictions are always served first.
+
+    Returns:
+        List of (heatmap, explained class index, probability) per item
+    """
+    backbone, head = split_feature_model(model, tf)
+    batch = np.stack([item['pixels'] for item in items]).astype(np.float32) / 255
+    class_indices = [item['class_index'] for item in items]
+    heatmaps, classes, scores = admission.run(
+        lambda: gradcam(tf, backbone, head, batch, class_indices),
+        priority='background', deadline=max(item['deadline'] for item in items))
+    metrics.inc('explain_batches_total')
+    metrics.inc('explain_images_total', len(items))
+    return list(zip(heatmaps, classes, scores))
+
+def explanation_response(png, cache_state):
+    """PNG response with the explained class from the PNG's text chunks"""
+    text = Image.open(io.BytesIO(png)).text
+    return Response(png, mimetype='image/png', headers={
+        'X-Explained-Class': text.get('class', ''),
+        'X-Explained-Confidence': text.get('confidence', ''),
+        'X-Cache': cache_state,
+    })
+
+@app.route('/explain', methods=['POST'])
+def explain():
+    """
+    Grad-CAM heatmap over a predicted image, as a PNG overlay
+
+    Form fields: image (the file) or hash (image_hash returned by /predict,
+    no re-upload needed while the input is still cached), class (class to
+    explain, raw or display name; default the predicted class).
+    """
+    try:
+        if not explainable():
+            return jsonify({'error': 'Explanations need a Keras model with a convolutional backbone'}), 503
+        file = request.files.get('image')
+        image_bytes = file.read() if file and file.filename else None
+        if image_bytes:
+            image_hash = hashlib.sha256(image_bytes).hexdigest()
+        else:
+            image_hash = request.values.get('hash', '').lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', image_hash):
+            return jsonify({'error': 'Provide an image or the image_hash returned by /predict'}), 400
+
+        class_index = -1
+        class_name = request.values.get('class')
+        if class_name:
+            names = {name: i for i, name in enumerate(CLASS_NAMES)}
+            names.update({display_name(name): i for i, name in enumerate(CLASS_NAMES)})
+            if class_name not in names:
+                return jsonify({'error': f'Unknown class {class_name!r}'}), 400
+            class_index = names[class_name]
+
+        cache_key = hashlib.sha256(f'{image_hash}:{class_index}:{model_version}'.encode()).hexdigest() + '.png'
+        cached = explain_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc('explain_cache_hits_total')
+            return explanation_response(cached, 'hit')
+
+        pixels = explain_inputs.get(image_hash)
+        if pixels is None:
+            if image_bytes is None:
+                return jsonify({'error': 'Image no longer cached; upload it again'}), 404
+            pixels = input_pixels(prepare_input(image_bytes))
+            explain_inputs.put(image_hash, pixels)
+        else:
+            metrics.inc('explain_input_reuse_total')
+            if pixels.ndim == 1:
+                # Upload cached encoded by the bytes-input path
+                pixels = input_pixels(prepare_input(pixels.tobytes()))
+                explain_inputs.put(image_hash, pixels)
+
+        budget = request_budget('background')
+        future = explain_batcher.submit({'pixels': pixels, 'class_index': class_index,
+                                         'deadline': budget['deadline']})
+        try:
+            heatmap, explained, score = future.result(timeout=max(0.0, budget['deadline'] - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded()
+        png = overlay_png(pixels, heatmap, text={'class': display_name(CLASS_NAMES[explained]),
+                                                 'confidence': f'{float(score) * 100:.2f}'})
+        explain_cache.put(cache_key, png)
+        return explanation_response(png, 'miss')
+
+    except TensorFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except (QueueFull, DeadlineExceeded) as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Classify several images with one batched forward pass
+
+    Accepts multipart `images` files (encoded images or raw tensors) or a
+    raw tensor body holding several tensor payloads back to back.
+    """
+    started = time.perf_counter()
+    try:
+        if request.mimetype == TENSOR_MIMETYPE:
+            uploads = [(f'tensor_{i}.agt', None, pixels)
+                       for i, pixels in enumerate(split_tensors(request.get_data()))]
+        else:
+            uploads = [(f.filename, f.read(), None)
+                       for f in request.files.getlist('images') if f.filename]
+        if not uploads:
+            return jsonify({'error': 'No image files provided'}), 400
+
+        max_batch = app.config.get('BATCH_MAX', 32)
+        if len(uploads) > max_batch:
+            return jsonify({'error': f'At most {max_batch} images per batch'}), 400
+
+        try:
+            size = select_tier()
+        except ValueError:
+            return jsonify({'error': 'Invalid tier'}), 400
+
+        metrics.inc('predict_batch_requests_total')
+        metrics.inc('predict_batch_images_total', len(uploads))
+        results = classify_many(uploads, request_budget('batch'), started, size)
+
+        return jsonify({'results': results, 'count': len(results), 'tier': size}), 200
+
+    except TensorFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except (QueueFull, DeadlineExceeded) as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def frame_part(headers):
+    """Multipart parts that carry frames: named 'frame', or unnamed (x-mixed-replace feeds)"""
+    match = re.search(r'\bname="([^"]*)"', headers.get('content-disposition', ''))
+    return match is None or match.group(1) == 'frame'
+
+def frame_source():
+    """
+    Frames of a /predict/stream request, read from the body as they arrive
+
+    Returns:
+        Iterator of frame payloads, or None for an unsupported content type
+    """
+    max_bytes = app.config.get('STREAM_MAX_FRAME_MB', 8) * 1024 * 1024
+    if request.mimetype == FRAMES_MIMETYPE:
+        return iter_length_prefixed(request.stream, max_bytes)
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype.startswith('multipart/') and boundary:
+        # Not request.files: the form parser would wait for the whole upload
+        return (body for headers, body in iter_multipart(request.stream, boundary, max_bytes)
+                if frame_part(headers))
+    return None
+
+def classify_stream(frames, name, size, segment_frames, threshold, batch_max, max_frames):
+    """
+    Diagnose a stream of frames, one segment of segment_frames frames at a time
+
+    A frame whose hash is within threshold bits of the last kept frame is
+    skipped and counts as another copy of that frame in its segment's
+    averaged probabilities. Kept frames are decoded and batched (at most
+    batch_max per forward pass, flushed at every segment end). Each segment
+    is logged as one prediction named '<name>#<segment>'.
+
+    Yields:
+        A dict per segment as soon as it is diagnosed, then {'summary': ...}
+    """
+    skipper = FrameSkipper(threshold)
+    started = time.perf_counter()
+    totals = {'frames': 0, 'kept': 0, 'skipped': 0, 'errors': 0, 'segments': 0, 'inference_ms': 0.0}
+    last_probs = None
+    segment = None
+
+    def flush():
+        if not segment['pending']:
+            return
+        inference_started = time.perf_counter()
+        # The deadline applies to each batch, not to the whole stream; waiting
+        # for a slot (instead of shedding) slows the upload down via TCP
+        probabilities = infer(np.stack(segment['pending']), dict(request_budget('batch'), shed=False))
+        segment['inference_ms'] += (time.perf_counter() - inference_started) * 1000
+        segment['probabilities'].extend(np.asarray(probabilities, dtype=np.float64))
+        segment['pending'] = []
+
+    def finish():
+        nonlocal last_probs
+        flush()
+        number = totals['segments']
+        totals['segments'] += 1
+        for key in ('kept', 'skipped', 'errors', 'inference_ms'):
+            totals[key] += segment[key]
+        line = {'segment': number, 'frames': [segment['start'], segment['start'] + segment['frames'] - 1],
+                'kept': segment['kept'], 'skipped': segment['skipped'], 'errors': segment['errors']}
+        # (probabilities, weight) of every frame, skipped ones folded into the frame they repeat
+        weighted = list(zip(segment['probabilities'], segment['weights']))
+        if segment['carry'] and last_probs is not None:
+            weighted.append((last_probs, segment['carry']))
+        if not weighted:
+            line['error'] = 'No decodable frames in segment'
+            return line
+        weight = sum(w for _, w in weighted)
+        mean = sum(p * w for p, w in weighted) / weight
+        predicted_class_idx = int(np.argmax(mean))
+        confidence = float(mean[predicted_class_idx]) * 100
+        line.update(format_result(predicted_class_idx, confidence))
+        line['agreement'] = round(sum(w for p, w in weighted if np.argmax(p) == predicted_class_idx) / weight, 3)
+        stats = dict(tier_stats(size), format='stream', batch_size=segment['kept'],
+                     decode_ms=segment['decode_ms'], preprocess_ms=segment['preprocess_ms'],
+                     inference_ms=segment['inference_ms'],
+                     total_ms=(time.perf_counter() - segment['started']) * 1000)
+        line['prediction_id'] = log_prediction(f'{name}#{number}', line['prediction'], confidence, stats)
+        if segment['probabilities']:
+            last_probs = segment['probabilities'][-1]
+        metrics.inc('stream_segments_total')
+        return line
+
+    try:
+        for data in frames:
+            if totals['frames'] >= max_frames:
+                raise FrameStreamError(f'Streams are limited to {max_frames} frames')
+            if segment is None:
+                segment = {'start': totals['frames'], 'started': time.perf_counter(), 'frames': 0, 'kept': 0,
+                           'skipped': 0, 'errors': 0, 'carry': 0, 'pending': [], 'probabilities': [],
+                           'weights': [], 'decode_ms': 0.0, 'preprocess_ms': 0.0, 'inference_ms': 0.0}
+            totals['frames'] += 1
+            segment['frames'] += 1
+            try:
+                digest = frame_hash(data)
+                if skipper.is_duplicate(digest):
+                    segment['skipped'] += 1
+                    if segment['weights']:
+                        segment['weights'][-1] += 1
+                    else:
+                        segment['carry'] += 1
+                else:
+                    stats = {}
+                    batch = prepare_input(data, stats, size)
+                    skipper.keep(digest)
+                    segment['kept'] += 1
+                    segment['pending'].append(batch[0])
+                    segment['weights'].append(1)
+                    segment['decode_ms'] += stats['decode_ms']
+                    segment['preprocess_ms'] += stats['preprocess_ms']
+            except Exception:
+                # A corrupt frame costs that frame only
+                segment['errors'] += 1
+            if len(segment['pending']) >= batch_max:
+                flush()
+            if segment['frames'] == segment_frames:
+                line = finish()
+                segment = None
+                yield line
+        if segment is not None:
+            line = finish()
+            segment = None
+            yield line
+    except (FrameStreamError, QueueFull, DeadlineExceeded) as e:
+        yield {'error': str(e)}
+    finally:
+        if segment is not None:
+            # Frames of a segment cut short by an error or a disconnect
+            for key in ('kept', 'skipped', 'errors'):
+                totals[key] += segment[key]
+        metrics.inc('stream_frames_total', totals['frames'])
+        metrics.inc('stream_frames_skipped_total', totals['skipped'])
+
+    elapsed = time.perf_counter() - started
+    yield {'summary': {
+        'frames': totals['frames'], 'kept': totals['kept'], 'skipped': totals['skipped'],
+        'errors': totals['errors'], 'segments': totals['segments'],
+        'skip_ratio': round(totals['skipped'] / totals['frames'], 4) if totals['frames'] else 0.0,
+        'frames_per_s': round(totals['frames'] / elapsed, 1) if elapsed else 0.0,
+        'inference_ms': round(totals['inference_ms'], 1), 'elapsed_s': round(elapsed, 3), 'tier': size,
+    }}
+
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    """
+    Diagnose a stream of frames (phone video) segment by segment
+
+    Frames arrive as multipart parts named `frame` (or a multipart/x-mixed-replace
+    camera feed), or as a length-prefixed application/x-agrivision-frames body,
+    possibly uploaded chunked. Query parameters: segment (frames per
+    diagnosis), threshold (dHash bits under which a frame is a duplicate),
+    tier. The response is NDJSON: one line per segment as soon as it is
+    diagnosed, then a summary with frames per second and the skip ratio.
+    """
+    frames = frame_source()
+    if frames is None:
+        return jsonify({'error': f'Send multipart parts named "frame" or a {FRAMES_MIMETYPE} body'}), 400
+    try:
+        # Query string only: reading form values would consume the upload
+        size = select_tier(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid tier'}), 400
+    segment_frames = request.args.get('segment', app.config.get('STREAM_SEGMENT_FRAMES', 30), type=int)
+    threshold = request.args.get('threshold', app.config.get('STREAM_SKIP_THRESHOLD', 6), type=int)
+    if segment_frames is None or segment_frames < 1 or threshold is None or not 0 <= threshold <= 64:
+        return jsonify({'error': 'segment must be positive and threshold between 0 and 64'}), 400
+
+    metrics.inc('predict_stream_requests_total')
+    lines = classify_stream(frames, request.headers.get('X-Filename', 'stream'), size, segment_frames,
+                            threshold, app.config.get('STREAM_BATCH_MAX', 8),
+                            app.config.get('STREAM_MAX_FRAMES', 18000))
+    return Response(stream_with_context(json.dumps(line) + '\n' for line in lines),
+                    mimetype='application/x-ndjson')
+
+def jobs_db_path():
+    """Jobs database, next to predictions.db unless configured"""
+    db_dir = os.path.dirname(os.path.abspath(app.config.get('DATABASE', 'predictions.db')))
+    return app.config.get('JOBS_DATABASE') or os.path.join(db_dir, 'jobs.db')
+
+def process_job_batch(items):
+    """Run one batch of job items through the model"""
+    # Background work waits for a slot instead of being shed
+    results = classify_many([(filename, data, None) for _, filename, data in items],
+                            {'priority': 'background', 'shed': False})
+    return [(seq, result) for (seq, _, _), result in zip(items, results)]
+
+def get_job_executor():
+    """Job executor for the configured jobs database (created on first use)"""
+    global job_executor
+    path = jobs_db_path()
+    if job_executor is None or job_executor.store.db_path != path:
+        if job_executor is not None:
+            job_executor.stop()
+        job_executor = JobExecutor(
+            JobStore(path, max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 3)),
+            process_job_batch,
+            batch_size=app.config.get('JOB_BATCH_SIZE', 32),
+            workers=app.config.get('JOB_WORKERS', 1),
+            per_job=app.config.get('JOB_WORKER_SHARE', 1),
+            retention=app.config.get('JOB_RETENTION_HOURS', 168) * 3600 or None)
+    return job_executor
+
+def start_job_executor():
+    """Start background job processing, resuming jobs left over from a restart"""
+    if app.config.get('JOB_EXECUTOR_AUTOSTART', True):
+        get_job_executor().start()
+
+def start_worker_services():
+    """Background threads every worker runs: job executor, memory monitor, log shard merger"""
+    start_job_executor()
+    memory_monitor.start()
+    start_shard_merger()
+
+def read_job_uploads():
+    """
+    Collect (filename, bytes) pairs from `images` files and/or an `archive`
+    (zip or tar) in the current request
+    """
+    items = [(f.filename, f.read()) for f in request.files.getlist('images') if f.filename]
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        data = archive.read()
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for name in zf.namelist():
+                    if name.lower().endswith(JOB_IMAGE_EXTENSIONS):
+                        items.append((os.path.basename(name), zf.read(name)))
+        else:
+            try:
+                with tarfile.open(fileobj=io.BytesIO(data)) as tf_archive:
+                    for member in tf_archive.getmembers():
+                        if member.isfile() and member.name.lower().endswith(JOB_IMAGE_EXTENSIONS):
+                            items.append((os.path.basename(member.name),
+                                          tf_archive.extractfile(member).read()))
+            except tarfile.TarError:
+                raise ValueError('Archive must be a zip or tar file')
+    return items
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Submit images or an archive for asynchronous prediction"""
+    try:
+        try:
+            items = read_job_uploads()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not items:
+            return jsonify({'error': 'No image files provided'}), 400
+        max_items = app.config.get('JOB_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return jsonify({'error': f'At most {max_items} images per job'}), 400
+
+        executor = get_job_executor()
+        job_id = executor.store.create_job(items)
+        metrics.inc('jobs_submitted_total')
+        metrics.inc('jobs_images_total', len(items))
+        start_job_executor()
+        executor.notify()
+
+        response = jsonify({'job_id': job_id, 'status': 'queued', 'total': len(items)})
+        response.headers['Location'] = f'/jobs/{job_id}'
+        return response, 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status and progress of an asynchronous job"""
+    job = get_job_executor().store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """Stream finished results of a job as NDJSON (one line per image)"""
+    store = get_job_executor().store
+    if store.get_job(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        for result in store.iter_results(job_id):
+            yield json.dumps(result) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/insights', methods=['GET'])
+@profiled
 def get_insights():
     """Get insights from prediction logs"""
     try:
-        conn = sqlite3.connect(app.config.get('DATABASE', 'predictions.db'))
+        conn = open_prediction_log()
         c = conn.cursor()
         
         # Get most frequent diseases
@@ -220,12 +1591,235 @@ def get_insights():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+PREDICTION_COLUMNS = ('id', 'filename', 'timestamp', 'prediction', 'confidence')
+
+def prediction_query(args):
+    """
+    Build the keyset-paginated history query from request arguments
+
+    Returns:
+        Tuple (sql, params, limit)
+    """
+    clauses, params = ['id > ?'], [int(args.get('after_id', 0))]
+    if args.get('since'):
+        clauses.append('timestamp >= ?')
+        params.append(args['since'])
+    if args.get('until'):
+        clauses.append('timestamp < ?')
+        params.append(args['until'])
+    if args.get('class'):
+        # Accept raw class names as well as the logged display names
+        name = args['class']
+        clauses.append('prediction = ?')
+        params.append(display_name(name) if name in CLASS_NAMES else name)
+    if args.get('min_confidence'):
+        clauses.append('confidence >= ?')
+        params.append(float(args['min_confidence']))
+    if args.get('max_confidence'):
+        clauses.append('confidence <= ?')
+        params.append(float(args['max_confidence']))
+
+    # limit=0 exports everything after the cursor
+    limit = int(args.get('limit', 1000))
+    sql = (f"SELECT {', '.join(PREDICTION_COLUMNS)} FROM predictions "
+           f"WHERE {' AND '.join(clauses)} ORDER BY id")
+    if limit > 0:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return sql, params, limit
+
+def stream_rows(db_path, sql, params, fmt, chunk_size=500):
+    """
+    Yield query results as NDJSON or CSV text, a chunk of rows at a time
+
+    The rows are read from a live cursor, so memory use does not depend on
+    the number of rows exported.
+    """
+    conn = open_prediction_log(db_path)
+    try:
+        cursor = conn.execute(sql, params)
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(PREDICTION_COLUMNS)
+            yield buffer.getvalue()
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield ''.join(json.dumps(dict(zip(PREDICTION_COLUMNS, row))) + '\n' for row in rows)
+    finally:
+        conn.close()
+
+@app.route('/predictions', methods=['GET'])
+def get_predictions():
+    """
+    Stream logged predictions, oldest first
+
+    Query parameters: after_id (keyset cursor: pass the last id you received),
+    limit (default 1000, 0 = no limit), since / until (timestamps),
+    class, min_confidence, max_confidence, format (ndjson or csv).
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        sql, params, limit = prediction_query(request.args)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    if limit < 0:
+        return jsonify({'error': 'limit must not be negative'}), 400
+
+    db_path = app.config.get('DATABASE', 'predictions.db')
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_rows(db_path, sql, params, fmt), mimetype=mimetype)
+
+@app.route('/similar', methods=['GET'])
+def get_similar():
+    """
+    Logged predictions whose images look most like a given one
+
+    Query parameters: id (a prediction_id returned by /predict), k (default 5,
+    at most 100), min_confidence (only neighbors predicted at least this
+    confidently).
+    """
+    try:
+        prediction_id = int(request.args['id'])
+        k = max(1, min(request.args.get('k', 5, type=int), 100))
+        min_confidence = float(request.args.get('min_confidence', 0))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'id must be a prediction id'}), 400
+
+    index = get_embedding_index()
+    query = index.vector(prediction_id)
+    if query is None:
+        return jsonify({'error': 'No embedding for this prediction'}), 404
+    # Over-fetch so the confidence filter still leaves k neighbors in most cases
+    matches = index.search(query, k=k * 4 if min_confidence else k, exclude=[prediction_id])
+
+    conn = open_prediction_log()
+    rows = {row[0]: row for row in conn.execute(
+        f"SELECT {', '.join(PREDICTION_COLUMNS)} FROM predictions "
+        f"WHERE id IN ({', '.join('?' * len(matches))})", [match_id for match_id, _ in matches])}
+    conn.close()
+    neighbors = []
+    for match_id, similarity in matches:
+        row = rows.get(match_id)
+        if row is None or row[4] < min_confidence:
+            continue
+        neighbors.append(dict(zip(PREDICTION_COLUMNS, row), similarity=round(similarity, 4)))
+    return jsonify({'id': prediction_id, 'neighbors': neighbors[:k]}), 200
+
+@app.route('/insights/latency', methods=['GET'])
+@profiled
+def get_latency_insights():
+    """
+    Latency percentiles grouped by one dimension, read from the hourly rollup
+
+    Query parameters: group_by (all, format, model_version, batch_size, size,
+    bytes), stage (decode, preprocess, inference, total), since / until,
+    percentiles (comma separated, default 50,90,99).
+    """
+    group_by = request.args.get('group_by', 'all')
+    stage = request.args.get('stage', 'total')
+    if group_by not in ROLLUP_DIMENSIONS or stage not in ROLLUP_STAGES:
+        return jsonify({'error': f'group_by must be one of {list(ROLLUP_DIMENSIONS)} '
+                                 f'and stage one of {list(ROLLUP_STAGES)}'}), 400
+    try:
+        percentiles = [float(p) for p in request.args.get('percentiles', '50,90,99').split(',')]
+    except ValueError:
+        return jsonify({'error': 'Invalid percentiles'}), 400
+    if not all(0 < p <= 100 for p in percentiles):
+        return jsonify({'error': 'Percentiles must be in (0, 100]'}), 400
+
+    rollup = get_rollup(app.config.get('DATABASE', 'predictions.db'))
+    groups = rollup.percentiles(group_by, stage, request.args.get('since'), request.args.get('until'),
+                                percentiles)
+    return jsonify({'group_by': group_by, 'stage': stage, 'groups': groups}), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'AgriVision API is running'}), 200
 
+def admin_allowed():
+    """
+    Admin endpoints need the X-Admin-Token header when ADMIN_TOKEN is set,
+    and are limited to local requests otherwise
+    """
+    token = app.config.get('ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), str(token))
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.after_request
+def recycle_if_needed(response):
+    """Recycle the worker once it crosses its RSS or request limit"""
+    reason = recycler.request_finished()
+    if reason and request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        print(f"Recycling worker {os.getpid()}: {reason}")
+        metrics.inc('worker_recycles_total')
+        recycler.recycle()
+    return response
+
+@app.route('/admin/memory', methods=['GET'])
+def admin_memory():
+    """RSS history and top allocation sites for the worker answering the request"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    report = memory_monitor.report(top=request.args.get('top', 15, type=int))
+    report['requests_served'] = recycler.requests
+    report['recycle'] = {'max_rss_mb': recycler.max_rss_mb, 'max_requests': recycler.max_requests,
+                         'pending': recycler.reason}
+    return jsonify(report), 200
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    """Loaded models: the general model, its tiers and the resident crop specialists"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    report = specialists.snapshot()
+    report['available'] = sorted(crop for crop in CROP_CLASSES if os.path.exists(specialist_path(crop)))
+    return jsonify({
+        'general': {'type': model_type or 'demo', 'version': model_version,
+                    'tiers': available_tiers(), 'cascade': cascade_model is not None,
+                    'bytes_input': bytes_model is not None},
+        'specialists': report,
+        'rss_mb': round(current_rss() / 1024 / 1024, 1),
+    }), 200
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """List stored request profiles, newest first"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'profiles': profiler.list_dumps()}), 200
+
+@app.route('/admin/profiles/<name>', methods=['GET'])
+def admin_profile_download(name):
+    """Download one request profile as a zip archive"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    data = profiler.archive(name)
+    if data is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(data, mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={name}.zip'})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Per-worker counters and gauges in Prometheus text format"""
+    metrics.set_gauge('singleflight_in_flight', single_flight.in_flight())
+    metrics.set_gauge('worker_rss_bytes', current_rss())
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     init_db()
     load_model()
+    start_worker_services()
     app.run(debug=True, host='0.0.0.0', port=5000)
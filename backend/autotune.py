@@ -0,0 +1,148 @@
+# Offline CPU auto-tuner for AgriVision inference
+#
+# Sweeps worker processes x threads per worker x batch size on this host,
+# measures throughput and tail latency, and prints the best configuration.
+#
+# Usage:
+#   python autotune.py --duration 10 --batch-sizes 1,8,32 --p99-budget 250 --output tuning.json
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from utils.cpu_tuning import available_cores
+
+MODEL_PATH = 'model/model.h5'
+IMG_SIZE = 224
+
+def _build_model(tf):
+    """Load the production model, or an untrained MobileNetV2 of the same shape"""
+    if os.path.exists(MODEL_PATH):
+        return tf.keras.models.load_model(MODEL_PATH)
+    base = tf.keras.applications.MobileNetV2(
+        input_shape=(IMG_SIZE, IMG_SIZE, 3), include_top=False, weights=None)
+    return tf.keras.Sequential([
+        base,
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(256, activation='relu'),
+        tf.keras.layers.Dense(38, activation='softmax'),
+    ])
+
+def _worker(threads, batch_size, duration, start_at, results):
+    """Run inference in a loop and report per-call latencies"""
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[name] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    model = _build_model(tf)
+    batch = np.random.rand(batch_size, IMG_SIZE, IMG_SIZE, 3).astype(np.float32)
+    model(batch, training=False)  # warm-up / graph tracing
+
+    # Start all workers together so they actually compete for the cores
+    while time.time() < start_at:
+        time.sleep(0.01)
+    latencies = []
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        t0 = time.perf_counter()
+        model(batch, training=False)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    results.put(latencies)
+
+def measure(workers, threads, batch_size, duration):
+    """
+    Measure one configuration
+
+    Returns:
+        Dict with throughput (images/sec) and latency percentiles (ms per batch)
+    """
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    # Leave time for every worker to import TensorFlow and build the model
+    start_at = time.time() + 15
+    procs = [ctx.Process(target=_worker, args=(threads, batch_size, duration, start_at, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    latencies = []
+    calls = 0
+    for _ in procs:
+        worker_latencies = results.get()
+        calls += len(worker_latencies)
+        latencies.extend(worker_latencies)
+    for p in procs:
+        p.join()
+
+    latencies = np.array(latencies)
+    return {
+        'workers': workers,
+        'threads': threads,
+        'batch_size': batch_size,
+        'images_per_sec': round(calls * batch_size / duration, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+    }
+
+def candidate_configs(cores, batch_sizes, oversubscribe=False):
+    """Yield (workers, threads, batch_size) combinations worth trying"""
+    worker_options = sorted({1, 2, 4, 8, cores // 2, cores} - {0})
+    thread_options = sorted({1, 2, 4, 8, cores} - {0})
+    for workers in worker_options:
+        for threads in thread_options:
+            if workers * threads > cores and not oversubscribe:
+                continue
+            for batch_size in batch_sizes:
+                yield workers, threads, batch_size
+
+def pick_best(results, p99_budget):
+    """Highest throughput within the latency budget (or lowest p99 if none fit)"""
+    within = [r for r in results if r['p99_ms'] <= p99_budget]
+    if within:
+        return max(within, key=lambda r: r['images_per_sec'])
+    return min(results, key=lambda r: r['p99_ms'])
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep workers x threads x batch size')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per configuration')
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--p99-budget', type=float, default=250, help='ms per batch')
+    parser.add_argument('--oversubscribe', action='store_true',
+                        help='also try workers x threads > cores')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    cores = available_cores()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    print(f"AgriVision auto-tuner: {cores} cores")
+    print("=" * 50)
+
+    results = []
+    for workers, threads, batch_size in candidate_configs(cores, batch_sizes, args.oversubscribe):
+        result = measure(workers, threads, batch_size, args.duration)
+        results.append(result)
+        print(f"workers={workers:<3} threads={threads:<3} batch={batch_size:<3} "
+              f"{result['images_per_sec']:>8} img/s  p50={result['p50_ms']}ms  p99={result['p99_ms']}ms")
+
+    best = pick_best(results, args.p99_budget)
+    print("\nBest configuration:")
+    print(f"  AGRIVISION_WORKERS={best['workers']}")
+    print(f"  TF_NUM_INTRAOP_THREADS={best['threads']}")
+    print(f"  batch size: {best['batch_size']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cores': cores, 'p99_budget_ms': args.p99_budget,
+                       'best': best, 'results': results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Benchmark server-side decode + preprocess cost per upload format
+#
+# Compares PNG, JPEG and the raw tensor format (utils/tensor_format.py) on
+# the path /predict takes before inference.
+#
+# Usage:
+#   python bench_decode.py --size 224 --repeats 500
+
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from app import prepare_input
+from utils.tensor_format import encode_tensor
+
+def encode(pixels, fmt):
+    """Encode pixels the way a client would upload them"""
+    if fmt == 'tensor':
+        return encode_tensor(pixels)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode cost per upload format')
+    parser.add_argument('--size', type=int, default=224, help='uploaded image side in pixels')
+    parser.add_argument('--repeats', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Smooth-ish content so PNG/JPEG sizes are realistic
+    base = rng.integers(0, 255, (args.size // 8, args.size // 8, 3), dtype=np.uint8)
+    pixels = np.asarray(Image.fromarray(base).resize((args.size, args.size), Image.BILINEAR))
+
+    print(f"Decode + preprocess benchmark ({args.size}x{args.size}, {args.repeats} repeats)")
+    print("=" * 60)
+    print(f"{'format':<8} {'bytes':>9} {'wall us':>10} {'cpu us':>10}")
+    for fmt in ('PNG', 'JPEG', 'tensor'):
+        payload = encode(pixels, fmt)
+        prepare_input(payload)  # warm-up
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        for _ in range(args.repeats):
+            prepare_input(payload)
+        wall = (time.perf_counter() - wall0) / args.repeats * 1e6
+        cpu = (time.process_time() - cpu0) / args.repeats * 1e6
+        print(f"{fmt:<8} {len(payload):>9} {wall:>10.1f} {cpu:>10.1f}")
+
+if __name__ == '__main__':
+    main()
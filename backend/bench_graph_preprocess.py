@@ -0,0 +1,75 @@
+# Benchmark in-graph preprocessing against the PIL path
+#
+# Compares, per thread count, throughput and CPU time per request of
+#   pil:   PIL decode + resize + NumPy normalize, then the Keras model
+#   graph: encoded bytes straight into the bytes-input SavedModel
+#          (train_model.export_bytes_model)
+#
+# Usage:
+#   python bench_graph_preprocess.py --size 1024x768 --threads 1,2,4,8 --requests 200
+
+import argparse
+import io
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from app import BYTES_MODEL_PATH, MODEL_PATH, prepare_input
+
+def synthetic_jpeg(width, height, seed=0):
+    """A smooth photo-like JPEG, the usual upload"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(base).resize((width, height), Image.BILINEAR).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def run_threads(handler, payload, threads, requests):
+    """Run `requests` calls split over `threads` threads; returns (wall s, cpu s, requests done)"""
+    per_thread = requests // threads
+
+    def worker():
+        for _ in range(per_thread):
+            handler(payload)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - wall0, time.process_time() - cpu0, per_thread * threads
+
+def main():
+    parser = argparse.ArgumentParser(description='PIL vs in-graph preprocessing')
+    parser.add_argument('--size', default='1024x768', help='uploaded JPEG size')
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    payload = synthetic_jpeg(width, height)
+    keras_model = tf.keras.models.load_model(MODEL_PATH)
+    bytes_model = tf.saved_model.load(BYTES_MODEL_PATH).signatures['serving_default']
+
+    handlers = {
+        'pil': lambda data: keras_model.predict_on_batch(prepare_input(data)),
+        'graph': lambda data: bytes_model(images=tf.constant([data]))['probabilities'].numpy(),
+    }
+    for handler in handlers.values():
+        handler(payload)  # warm-up
+
+    print(f"Preprocessing benchmark ({width}x{height} JPEG, {len(payload)} bytes, {args.requests} requests)")
+    print("=" * 64)
+    print(f"{'path':<6} {'threads':>7} {'req/s':>8} {'cpu ms/req':>11} {'wall ms/req':>12}")
+    for threads in (int(t) for t in args.threads.split(',')):
+        for name, handler in handlers.items():
+            wall, cpu, done = run_threads(handler, payload, threads, args.requests)
+            print(f"{name:<6} {threads:>7} {done / wall:>8.1f} {cpu / done * 1000:>11.2f} "
+                  f"{wall / done * threads * 1000:>12.2f}")
+
+if __name__ == '__main__':
+    main()
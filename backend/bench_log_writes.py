@@ -0,0 +1,66 @@
+# Benchmark prediction log write throughput against the number of workers
+#
+# Each process stands in for a gunicorn worker (its own AGRIVISION_WORKER_SLOT)
+# and logs predictions through app.log_prediction as fast as it can, first
+# into the shared predictions.db, then into per-worker shards
+# (AGRIVISION_LOG_SHARDS). Reports rows/s for each worker count.
+#
+# Usage:
+#   python bench_log_writes.py --workers 1 2 4 8 --rows 2000
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+def write_rows(db_path, slot, sharded, rows, barrier, results):
+    """Worker process: log `rows` predictions once every worker is ready"""
+    os.environ.update(AGRIVISION_DATABASE=db_path, AGRIVISION_WORKER_SLOT=str(slot),
+                      AGRIVISION_LOG_SHARDS='true' if sharded else 'false')
+    import app as server
+    server.log_prediction('warmup.jpg', 'Tomato - healthy', 90.0)
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(rows):
+        server.log_prediction(f'{slot}-{i}.jpg', 'Tomato - healthy', 90.0,
+                              {'inference_ms': 10.0, 'total_ms': 12.0, 'batch_size': 1})
+    results.put(time.perf_counter() - started)
+
+def run(workers, sharded, rows):
+    """Rows per second over all workers, wall time of the slowest"""
+    directory = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(directory, 'predictions.db')
+        os.environ['AGRIVISION_DATABASE'] = db_path
+        from app import init_db, app
+        app.config['DATABASE'] = db_path
+        init_db()
+        context = multiprocessing.get_context('spawn')
+        barrier, results = context.Barrier(workers), context.Queue()
+        processes = [context.Process(target=write_rows, args=(db_path, slot, sharded, rows, barrier, results))
+                     for slot in range(workers)]
+        for process in processes:
+            process.start()
+        elapsed = max(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        return workers * rows / elapsed
+    finally:
+        shutil.rmtree(directory)
+
+def main():
+    parser = argparse.ArgumentParser(description='Prediction log write throughput')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--rows', type=int, default=2000, help='predictions logged per worker')
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'shared rows/s':>14} {'sharded rows/s':>15} {'speedup':>8}")
+    for workers in args.workers:
+        shared = run(workers, False, args.rows)
+        sharded = run(workers, True, args.rows)
+        print(f"{workers:>8} {shared:>14.0f} {sharded:>15.0f} {sharded / shared:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Benchmark /similar search latency and recall against an exact scan
+#
+# Builds a synthetic clustered index (38 classes, near-duplicate groups)
+# and compares signature search + re-rank with the exact float16 scan.
+#
+# Usage:
+#   python bench_similar.py --vectors 10000000 --queries 20
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from utils.embedding_index import EmbeddingIndex
+
+def synthetic_embeddings(rng, count, dim, centers, groups):
+    """Class centers plus near-duplicate groups plus noise, like real embeddings"""
+    return (centers[rng.integers(0, len(centers), count)] * 2 +
+            groups[rng.integers(0, len(groups), count)] +
+            rng.normal(size=(count, dim)) * 0.7).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description='Embedding index search benchmark')
+    parser.add_argument('--vectors', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(38, args.dim))
+    groups = rng.normal(size=(max(1, args.vectors // 200), args.dim))
+    directory = tempfile.mkdtemp()
+    try:
+        index = EmbeddingIndex(directory, args.dim)
+        started = time.perf_counter()
+        for start in range(0, args.vectors, 250000):
+            count = min(250000, args.vectors - start)
+            index.add(np.arange(start, start + count),
+                      synthetic_embeddings(rng, count, args.dim, centers, groups))
+        print(f"Indexed {args.vectors} x {args.dim} in {time.perf_counter() - started:.1f}s")
+
+        approximate_ms, exact_ms, recall = [], [], []
+        for query_id in rng.integers(0, args.vectors, args.queries):
+            query = index.vector(int(query_id))
+            index.exact_below = 0
+            t0 = time.perf_counter()
+            found = index.search(query, args.k, exclude=[query_id])
+            approximate_ms.append((time.perf_counter() - t0) * 1000)
+            index.exact_below = args.vectors + 1
+            t0 = time.perf_counter()
+            expected = index.search(query, args.k, exclude=[query_id])
+            exact_ms.append((time.perf_counter() - t0) * 1000)
+            recall.append(len({i for i, _ in found} & {i for i, _ in expected}) / args.k)
+
+        print("=" * 48)
+        print(f"{'search':<12} {'p50 ms':>10} {'p90 ms':>10} {'recall':>8}")
+        print(f"{'signature':<12} {np.percentile(approximate_ms, 50):>10.1f} "
+              f"{np.percentile(approximate_ms, 90):>10.1f} {np.mean(recall):>8.3f}")
+        print(f"{'exact':<12} {np.percentile(exact_ms, 50):>10.1f} {np.percentile(exact_ms, 90):>10.1f} "
+              f"{1.0:>8.3f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
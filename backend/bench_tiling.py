@@ -0,0 +1,62 @@
+# Benchmark tiled inference latency against the number of tiles
+#
+# Usage:
+#   python bench_tiling.py --size 4000x3000 --tiles 1,4,16,32,64 --repeats 5
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+import app as server
+from utils.tiling import generate_tiles, aggregate_tiles
+
+def synthetic_field_image(width, height, seed=0):
+    """Leaf-green image with soil-colored gaps and a few brown spots"""
+    rng = np.random.default_rng(seed)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[...] = (60, 140, 50)
+    # Bare soil / background bands
+    for x in range(0, width, width // 5):
+        pixels[:, x:x + width // 20] = (120, 110, 100)
+    # Lesions
+    for _ in range(40):
+        x, y = rng.integers(0, width - 30), rng.integers(0, height - 30)
+        pixels[y:y + 30, x:x + 30] = (130, 90, 40)
+    noise = rng.integers(-10, 10, pixels.shape)
+    return Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiled inference latency vs tile count')
+    parser.add_argument('--size', default='4000x3000')
+    parser.add_argument('--tiles', default='1,4,16,32,64')
+    parser.add_argument('--scales', default='1.0')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    scales = tuple(float(s) for s in args.scales.split(','))
+    image = synthetic_field_image(width, height)
+    server.load_model()
+
+    print(f"Tiled inference benchmark ({width}x{height}, scales={scales}, model={server.model_type or 'demo'})")
+    print("=" * 72)
+    print(f"{'max_tiles':>9} {'tiles':>6} {'tiling ms':>10} {'infer ms':>10} {'total ms':>10} {'ms/tile':>8}")
+    for max_tiles in (int(t) for t in args.tiles.split(',')):
+        tiling_ms, infer_ms = [], []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            tiles, info, _ = generate_tiles(image, scales=scales, max_tiles=max_tiles)
+            t1 = time.perf_counter()
+            predictions = server.run_inference(tiles.astype(np.float32) / 255.0)
+            aggregate_tiles(predictions, info, server.CLASS_NAMES)
+            t2 = time.perf_counter()
+            tiling_ms.append((t1 - t0) * 1000)
+            infer_ms.append((t2 - t1) * 1000)
+        tiling, infer = np.median(tiling_ms), np.median(infer_ms)
+        print(f"{max_tiles:>9} {len(tiles):>6} {tiling:>10.1f} {infer:>10.1f} "
+              f"{tiling + infer:>10.1f} {(tiling + infer) / len(tiles):>8.1f}")
+
+if __name__ == '__main__':
+    main()
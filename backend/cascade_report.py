@@ -0,0 +1,67 @@
+# Report cascade accuracy and average latency as the early-exit threshold varies
+#
+# Usage:
+#   python cascade_report.py --data data/val --batch-size 32 --output cascade_report.json
+
+import argparse
+import json
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from train_model import load_image_folder
+from utils.cascade import cascade_tradeoff
+
+def run_stage(model, dataset):
+    """Probabilities for the whole dataset and the measured per-image latency"""
+    probs, labels = [], []
+    elapsed, images = 0.0, 0
+    for batch, one_hot in dataset:
+        start = time.perf_counter()
+        probs.append(model.predict(batch, verbose=0))
+        elapsed += time.perf_counter() - start
+        images += len(batch)
+        labels.append(np.argmax(one_hot.numpy(), axis=1))
+    return np.concatenate(probs), np.concatenate(labels), elapsed / images * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Cascade threshold sweep')
+    parser.add_argument('--data', required=True, help='labelled directory (one folder per class)')
+    parser.add_argument('--full-model', default='model/model.h5')
+    parser.add_argument('--small-model', default='model/cascade_small.h5')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--thresholds', default='0,0.5,0.6,0.7,0.8,0.85,0.9,0.95,0.98,0.99,1.01')
+    parser.add_argument('--output', help='write the table as JSON here')
+    args = parser.parse_args()
+
+    dataset = load_image_folder(args.data, batch_size=args.batch_size)
+    full_model = tf.keras.models.load_model(args.full_model)
+    small_model = tf.keras.models.load_model(args.small_model)
+
+    # Warm up both graphs so tracing is not counted as latency
+    for batch, _ in dataset.take(1):
+        full_model.predict(batch, verbose=0)
+        small_model.predict(batch, verbose=0)
+
+    small_probs, labels, small_ms = run_stage(small_model, dataset)
+    full_probs, _, full_ms = run_stage(full_model, dataset)
+    thresholds = [float(t) for t in args.thresholds.split(',')]
+    rows = cascade_tradeoff(small_probs, full_probs, labels, small_ms, full_ms, thresholds)
+
+    print(f"Cascade report ({len(labels)} images, batch {args.batch_size})")
+    print(f"Stage 1: {small_ms:.2f} ms/image   Full model: {full_ms:.2f} ms/image   "
+          f"Full-model accuracy: {(full_probs.argmax(axis=1) == labels).mean():.4f}")
+    print("=" * 60)
+    print(f"{'threshold':>9} {'escalated':>10} {'accuracy':>9} {'avg ms':>8} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['threshold']:>9.2f} {row['escalation_rate']:>10.1%} {row['accuracy']:>9.4f} "
+              f"{row['avg_ms']:>8.2f} {full_ms / row['avg_ms']:>7.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'small_ms': small_ms, 'full_ms': full_ms, 'rows': rows}, f, indent=2)
+        print(f"Report saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
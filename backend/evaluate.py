@@ -0,0 +1,197 @@
+# Offline evaluation of a candidate model on a labelled directory
+#
+# Images are decoded on a thread pool with the server's own preprocessing
+# (app.prepare_input) while the previous batch runs through the model.
+# Reports accuracy, top-k, per-class precision/recall, calibration error and
+# the confusion matrix together with inference latency and throughput from
+# the same run.
+#
+# Usage:
+#   python evaluate.py --model model/model.h5 --data data/val --output eval_model.json
+#   python evaluate.py --model model/student_int8.tflite --data data/val --baseline eval_model.json
+#   python evaluate.py --model synthetic --data data/val       # no TensorFlow needed
+#
+# --data holds one sub-folder per class, named like CLASS_NAMES in app.py.
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import CLASS_NAMES, MODEL_INPUT_SIZE, display_name, prepare_input
+from utils.cpu_tuning import available_cores
+from utils.evaluation import confusion_matrix, expected_calibration_error, per_class_metrics, top_k_accuracy
+from utils.model_report import format_table
+from utils.synthetic import SyntheticBackend, load_profile
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.agt')
+
+def load_backend(spec):
+    """
+    Predict function and input size for a model file or 'synthetic[:profile.json]'
+    """
+    if spec == 'synthetic' or spec.startswith('synthetic:'):
+        backend = SyntheticBackend(load_profile(spec.partition(':')[2] or None), len(CLASS_NAMES))
+        return backend.predict, MODEL_INPUT_SIZE
+    from pareto_report import load_predictor
+    return load_predictor(spec)
+
+def list_labelled(directory, limit=None, seed=0):
+    """(path, class index) for every image, sub-folders named after CLASS_NAMES"""
+    index = {name: i for i, name in enumerate(CLASS_NAMES)}
+    folders = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+    unknown = [name for name in folders if name not in index]
+    if unknown:
+        raise ValueError(f'Folders that are not model classes: {unknown}')
+    items = []
+    for name in folders:
+        for root, _, files in sorted(os.walk(os.path.join(directory, name))):
+            items.extend((os.path.join(root, f), index[name]) for f in sorted(files)
+                         if f.lower().endswith(IMAGE_EXTENSIONS))
+    if limit and limit < len(items):
+        # Random subset so every class keeps roughly its share
+        keep = np.random.default_rng(seed).choice(len(items), limit, replace=False)
+        items = [items[i] for i in sorted(keep)]
+    return items
+
+def load_image(path, size):
+    """Preprocessed pixels, or None if the file cannot be decoded"""
+    try:
+        with open(path, 'rb') as f:
+            return prepare_input(f.read(), size=size)[0]
+    except Exception:
+        return None
+
+def run(predict, items, size, batch_size, threads):
+    """
+    Decode and infer all items, decoding the next batch while the model runs
+
+    Returns:
+        Tuple (probabilities, labels, per-batch inference ms, undecodable
+        paths, wall seconds)
+    """
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    probabilities, labels, timings, failed = [], [], [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        decode = lambda batch: pool.map(lambda item: load_image(item[0], size), batch)
+        pending = decode(batches[0]) if batches else None
+        for i, batch in enumerate(batches):
+            pixels = list(pending)
+            if i + 1 < len(batches):
+                pending = decode(batches[i + 1])
+            kept = [(item, p) for item, p in zip(batch, pixels) if p is not None]
+            failed.extend(item[0] for item, p in zip(batch, pixels) if p is None)
+            if not kept:
+                continue
+            inputs = np.stack([p for _, p in kept]).astype(np.float32)
+            inference_started = time.perf_counter()
+            probabilities.append(np.asarray(predict(inputs)))
+            timings.append((time.perf_counter() - inference_started) * 1000)
+            labels.extend(label for (_, label), _ in kept)
+    wall = time.perf_counter() - started
+    if not probabilities:
+        return np.empty((0, len(CLASS_NAMES))), np.empty(0, np.int64), timings, failed, wall
+    return np.concatenate(probabilities), np.asarray(labels), timings, failed, wall
+
+def summarize(probabilities, labels, timings, wall, batch_size, top_k=(1, 3, 5)):
+    """JSON-ready report"""
+    predicted = probabilities.argmax(axis=1)
+    matrix = confusion_matrix(labels, predicted, len(CLASS_NAMES))
+    classes = per_class_metrics(matrix)
+    ece, calibration = expected_calibration_error(probabilities, labels)
+    return {
+        'images': int(len(labels)),
+        'accuracy': round(float(np.mean(predicted == labels)), 4),
+        'top_k': {str(k): round(top_k_accuracy(probabilities, labels, k), 4) for k in top_k},
+        'macro_precision': round(float(classes['precision'][classes['support'] > 0].mean()), 4),
+        'macro_recall': round(float(classes['recall'][classes['support'] > 0].mean()), 4),
+        'ece': round(ece, 4),
+        'calibration': calibration,
+        'per_class': [
+            {'class': display_name(name), 'precision': round(float(classes['precision'][i]), 4),
+             'recall': round(float(classes['recall'][i]), 4), 'f1': round(float(classes['f1'][i]), 4),
+             'support': int(classes['support'][i])}
+            for i, name in enumerate(CLASS_NAMES)
+        ],
+        'confusion_matrix': matrix.tolist(),
+        'performance': {
+            'batch_size': batch_size,
+            'batch_p50_ms': round(float(np.percentile(timings, 50)), 2),
+            'batch_p90_ms': round(float(np.percentile(timings, 90)), 2),
+            'inference_ms_per_image': round(float(np.sum(timings)) / max(len(labels), 1), 3),
+            'images_per_s': round(len(labels) / wall, 1),
+            'wall_s': round(wall, 2),
+        },
+    }
+
+def compare(report, baseline):
+    """Differences that matter for a release decision"""
+    lines = []
+    for key in ('accuracy', 'macro_recall', 'ece'):
+        lines.append(f"{key}: {baseline[key]} -> {report[key]} ({report[key] - baseline[key]:+.4f})")
+    for key in ('batch_p50_ms', 'images_per_s'):
+        before, after = baseline['performance'][key], report['performance'][key]
+        lines.append(f"{key}: {before} -> {after} ({(after / before - 1) * 100 if before else 0:+.1f}%)")
+    recall_before = {row['class']: row['recall'] for row in baseline['per_class']}
+    changes = sorted(((row['recall'] - recall_before.get(row['class'], 0), row['class'])
+                      for row in report['per_class'] if row['support']), key=lambda change: change[0])
+    for delta, name in changes[:5]:
+        if delta < 0:
+            lines.append(f"recall {name}: {delta:+.4f}")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate a model on a labelled directory')
+    parser.add_argument('--model', default='model/model.h5', help='.h5/.keras, .tflite or synthetic[:profile]')
+    parser.add_argument('--data', required=True, help='labelled directory, one sub-folder per class')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=available_cores(), help='decode threads')
+    parser.add_argument('--limit', type=int, help='evaluate a random subset of this many images')
+    parser.add_argument('--output', help='write the report as JSON here')
+    parser.add_argument('--baseline', help='earlier report to compare with')
+    args = parser.parse_args()
+
+    items = list_labelled(args.data, args.limit)
+    predict, size = load_backend(args.model)
+    # Warm-up outside the timed run (graph tracing, allocation)
+    predict(np.zeros((args.batch_size, size, size, 3), dtype=np.float32))
+    print(f"Evaluating {args.model} on {len(items)} images ({size}px, batch {args.batch_size})")
+
+    probabilities, labels, timings, failed, wall = run(predict, items, size, args.batch_size, args.threads)
+    if not len(labels):
+        print("No images could be decoded")
+        return 1
+    report = summarize(probabilities, labels, timings, wall, args.batch_size)
+    report.update(model=args.model, data=args.data, undecodable=failed)
+
+    print(f"\nAccuracy {report['accuracy']}  top-k {report['top_k']}  ECE {report['ece']}  "
+          f"macro precision {report['macro_precision']}  macro recall {report['macro_recall']}")
+    performance = report['performance']
+    print(f"Batch p50 {performance['batch_p50_ms']} ms, p90 {performance['batch_p90_ms']} ms, "
+          f"{performance['inference_ms_per_image']} ms/image inference, "
+          f"{performance['images_per_s']} images/s end to end")
+    worst = sorted((row for row in report['per_class'] if row['support']), key=lambda row: row['recall'])[:10]
+    print("\nLowest recall:")
+    print(format_table(worst, [('class', 'class'), ('precision', 'precision'), ('recall', 'recall'),
+                               ('f1', 'f1'), ('support', 'support')]))
+    if failed:
+        print(f"\n{len(failed)} files could not be decoded")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.baseline}:")
+        for line in compare(report, baseline):
+            print(f"  {line}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
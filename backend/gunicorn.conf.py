@@ -0,0 +1,38 @@
+# Gunicorn configuration for AgriVision
+# Usage: gunicorn -c gunicorn.conf.py app:app
+
+import os
+
+bind = os.environ.get('AGRIVISION_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('AGRIVISION_WORKERS', os.environ.get('WEB_CONCURRENCY', 2)))
+timeout = int(os.environ.get('AGRIVISION_TIMEOUT', 60))
+# Threads accept requests into the app's own bounded inference queue
+# (utils/admission.py) instead of leaving them in the listen backlog
+worker_class = 'gthread'
+threads = int(os.environ.get('AGRIVISION_THREADS', 8))
+backlog = int(os.environ.get('AGRIVISION_BACKLOG', 64))
+# Time a recycling worker (AGRIVISION_MAX_RSS_MB / AGRIVISION_MAX_REQUESTS)
+# gets to finish its in-flight requests
+graceful_timeout = int(os.environ.get('AGRIVISION_GRACEFUL_TIMEOUT', 30))
+
+# Let utils/cpu_tuning.py split the cores between this many workers
+os.environ.setdefault('AGRIVISION_WORKERS', str(workers))
+
+def pre_fork(server, worker):
+    """Give each worker the lowest free slot so affinity stays stable across restarts"""
+    used = {getattr(w, 'slot', None) for w in server.WORKERS.values()}
+    slot = 0
+    while slot in used:
+        slot += 1
+    worker.slot = slot
+
+def post_fork(server, worker):
+    """Expose the slot to the worker before the app (and TensorFlow) is imported"""
+    os.environ['AGRIVISION_WORKER_SLOT'] = str(worker.slot)
+
+def post_worker_init(worker):
+    """Open the database, load the model and start background services once per worker"""
+    from app import init_db, load_model, start_worker_services
+    init_db()
+    load_model()
+    start_worker_services()
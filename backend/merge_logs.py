@@ -0,0 +1,28 @@
+# Merge per-worker prediction log shards into the main database
+#
+# With AGRIVISION_LOG_SHARDS=true every gunicorn worker appends to its own
+# predictions.shard-<slot>.db. Reads already see all shards; merging keeps
+# their number of rows small and leaves a single file to back up. The
+# worker in slot 0 does the same every AGRIVISION_LOG_SHARD_MERGE_SECONDS.
+#
+# Usage:
+#   python merge_logs.py --database predictions.db
+
+import argparse
+
+from app import PREDICTION_LOG_COLUMNS, app
+from utils.log_shards import merge_shards
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge prediction log shards')
+    parser.add_argument('--database', default=app.config.get('DATABASE', 'predictions.db'))
+    args = parser.parse_args()
+
+    moved = merge_shards(args.database, PREDICTION_LOG_COLUMNS)
+    for path, rows in moved.items():
+        print(f"{path}: {rows} rows merged")
+    if not moved:
+        print(f"No shards next to {args.database}")
+
+if __name__ == '__main__':
+    main()
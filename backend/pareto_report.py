@@ -0,0 +1,102 @@
+# Compare candidate models on size, CPU latency and accuracy
+#
+# Usage:
+#   python pareto_report.py --data data/val \
+#       --models model/model.h5,model/model.tflite,model/student.tflite,model/student_pruned.tflite \
+#       --output pareto.json
+
+import argparse
+import gzip
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from train_model import load_image_folder
+from utils.cpu_tuning import thread_plan
+from utils.model_report import format_table, measure_latency, pareto_front
+from utils.precision import dequantize, quantize
+
+COLUMNS = [('model', 'model'), ('size_mb', 'size MB'), ('gzip_mb', 'gzip MB'),
+           ('b1_ms', 'b1 ms'), ('b32_ms', 'b32 ms/img'), ('accuracy', 'accuracy'), ('pareto', 'pareto')]
+
+def load_predictor(path):
+    """
+    Predict function and input size for a .h5/.keras or .tflite model
+
+    TFLite models with integer inputs/outputs (full int8 quantization) are
+    fed quantized inputs and their outputs are dequantized.
+    """
+    if path.endswith('.tflite'):
+        interpreter = tf.lite.Interpreter(model_path=path, num_threads=thread_plan()['intra_op'])
+        interpreter.allocate_tensors()
+        input_detail = interpreter.get_input_details()[0]
+        output_detail = interpreter.get_output_details()[0]
+        input_index, output_index = input_detail['index'], output_detail['index']
+
+        def predict(batch):
+            if tuple(interpreter.get_input_details()[0]['shape']) != batch.shape:
+                interpreter.resize_tensor_input(input_index, batch.shape)
+                interpreter.allocate_tensors()
+            interpreter.set_tensor(input_index, quantize(batch, input_detail))
+            interpreter.invoke()
+            return dequantize(interpreter.get_tensor(output_index), output_detail)
+
+        return predict, int(interpreter.get_input_details()[0]['shape'][1])
+    model = tf.keras.models.load_model(path)
+    return (lambda batch: model.predict_on_batch(batch)), int(model.input_shape[1])
+
+def evaluate(predict, dataset):
+    """Top-1 accuracy on a labelled dataset"""
+    correct = total = 0
+    for images, one_hot in dataset:
+        # Predict in slices of 32 so TFLite interpreters keep one tensor shape
+        for start in range(0, len(images), 32):
+            probs = predict(images[start:start + 32].numpy())
+            labels = np.argmax(one_hot[start:start + 32].numpy(), axis=1)
+            correct += int(np.sum(np.argmax(probs, axis=1) == labels))
+            total += len(labels)
+    return correct / total
+
+def main():
+    parser = argparse.ArgumentParser(description='Size / latency / accuracy Pareto table')
+    parser.add_argument('--data', required=True, help='labelled validation directory')
+    parser.add_argument('--models', required=True, help='comma-separated model files')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--output', help='write the rows as JSON here')
+    args = parser.parse_args()
+
+    datasets = {}
+    rows = []
+    for path in args.models.split(','):
+        predict, size = load_predictor(path)
+        if size not in datasets:
+            datasets[size] = load_image_folder(args.data, img_size=size, batch_size=32)
+        with open(path, 'rb') as f:
+            compressed = len(gzip.compress(f.read()))
+        rng = np.random.default_rng(0)
+        single = rng.random((1, size, size, 3), dtype=np.float32)
+        batch = rng.random((32, size, size, 3), dtype=np.float32)
+        print(f"Measuring {path} ({size}px)")
+        rows.append({
+            'model': os.path.basename(path),
+            'size_mb': round(os.path.getsize(path) / 1e6, 2),
+            'gzip_mb': round(compressed / 1e6, 2),
+            'b1_ms': measure_latency(predict, single, runs=args.runs)['p50_ms'],
+            'b32_ms': round(measure_latency(predict, batch, runs=args.runs)['p50_ms'] / 32, 2),
+            'accuracy': round(evaluate(predict, datasets[size]), 4),
+        })
+
+    pareto_front(rows, minimize=('gzip_mb', 'b1_ms', 'b32_ms'), maximize=('accuracy',))
+    print()
+    print(format_table(rows, COLUMNS))
+    print("\nPareto rows are not beaten by another model on every column.")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
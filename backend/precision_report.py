@@ -0,0 +1,133 @@
+# Memory, latency and accuracy of each model precision option
+#
+# Every option is loaded in a fresh process the way a gunicorn worker loads
+# it (app.load_model with AGRIVISION_MODEL_PRECISION), so RSS is per worker
+# and includes the TensorFlow runtime. With --data every option classifies
+# the same labelled images and is compared with float32. Workers per node
+# is how many such workers fit in --node-mb after --reserve-mb.
+#
+# Usage:
+#   python precision_report.py --data data/val --limit 1000 --output precision.json
+#   python precision_report.py --precisions float32,float16,tflite-int8 --node-mb 4096
+#
+# The TFLite options need model/model_fp16.tflite and model/model_int8.tflite
+# (train_model.export_precision_variants).
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from utils.evaluation import confusion_matrix, per_class_metrics
+from utils.memprof import current_rss
+from utils.model_report import format_table, measure_latency
+from utils.precision import PRECISIONS, agreement
+
+MB = 1024 * 1024
+COLUMNS = [('precision', 'precision'), ('model_mb', 'model MB'), ('rss_mb', 'worker RSS MB'),
+           ('b1_ms', 'b1 ms'), ('b8_ms', 'b8 ms'), ('accuracy', 'accuracy'),
+           ('top1_agreement', 'agree f32'), ('confidence_delta_max', 'max Δconf'),
+           ('workers_per_node', 'workers/node')]
+
+def measure(precision, args):
+    """Worker process: load one option and measure it; returns the JSON-ready row"""
+    baseline = current_rss()
+    import app as server
+    runtime = current_rss()
+    server.load_model()
+    loaded = current_rss()
+
+    size = server.MODEL_INPUT_SIZE
+    rng = np.random.default_rng(0)
+    row = {'precision': precision, 'model_version': server.model_version,
+           'runtime_mb': round((runtime - baseline) / MB, 1), 'model_mb': round((loaded - runtime) / MB, 1)}
+    for batch_size in (1, 8):
+        batch = rng.random((batch_size, size, size, 3), dtype=np.float32)
+        row[f'b{batch_size}_ms'] = measure_latency(server.run_inference, batch, runs=args.runs)['p50_ms']
+
+    if args.data:
+        from evaluate import list_labelled, run
+        items = list_labelled(args.data, args.limit)
+        probabilities, labels, _, _, _ = run(server.run_inference, items, size, args.batch_size, args.threads)
+        matrix = confusion_matrix(labels, probabilities.argmax(axis=1), len(server.CLASS_NAMES))
+        row['accuracy'] = round(float(np.trace(matrix) / max(matrix.sum(), 1)), 4)
+        row['macro_recall'] = round(float(per_class_metrics(matrix)['recall'].mean()), 4)
+        np.save(args.probabilities, probabilities)
+    # Steady state after serving batches: what the worker keeps resident
+    row['rss_mb'] = round(current_rss() / MB, 1)
+    return row
+
+def run_option(precision, args, directory):
+    """Measure one option in a child process; returns its row (with 'error' on failure)"""
+    probabilities = os.path.join(directory, f'{precision}.npy')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', precision, '--probabilities', probabilities,
+               '--runs', str(args.runs), '--batch-size', str(args.batch_size), '--threads', str(args.threads)]
+    if args.data:
+        command += ['--data', args.data] + (['--limit', str(args.limit)] if args.limit else [])
+    env = dict(os.environ, AGRIVISION_MODEL_PRECISION=precision)
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {'precision': precision, 'error': lines[-1] if lines else f'exit status {result.returncode}'}
+    row = json.loads(result.stdout.strip().splitlines()[-1])
+    if os.path.exists(probabilities):
+        row['probabilities'] = probabilities
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare model precision options')
+    parser.add_argument('--precisions', default=','.join(PRECISIONS))
+    parser.add_argument('--data', help='labelled directory for the accuracy check')
+    parser.add_argument('--limit', type=int, help='evaluate a random subset of this many images')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=2, help='decode threads')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--node-mb', type=float, default=4096, help='memory of one instance')
+    parser.add_argument('--reserve-mb', type=float, default=512, help='kept free for the OS and gunicorn master')
+    parser.add_argument('--output', help='write the rows as JSON here')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--probabilities', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args)))
+        return 0
+
+    precisions = args.precisions.split(',')
+    unknown = [p for p in precisions if p not in PRECISIONS]
+    if unknown:
+        parser.error(f'Unknown precisions {unknown}, choose from {PRECISIONS}')
+    with tempfile.TemporaryDirectory() as directory:
+        rows = []
+        for precision in precisions:
+            print(f"Measuring {precision}")
+            rows.append(run_option(precision, args, directory))
+        reference = next((row for row in rows if row['precision'] == 'float32' and 'probabilities' in row), None)
+        for row in rows:
+            if 'rss_mb' in row:
+                row['workers_per_node'] = int(max(args.node_mb - args.reserve_mb, 0) // row['rss_mb'])
+            if reference is not None and 'probabilities' in row:
+                row.update(agreement(np.load(reference['probabilities']), np.load(row['probabilities'])))
+        for row in rows:
+            row.pop('probabilities', None)
+
+    measured = [row for row in rows if 'error' not in row]
+    print()
+    print(format_table(measured, COLUMNS))
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['precision']}: {row['error']}")
+    print(f"\nworkers/node: ({args.node_mb:g} - {args.reserve_mb:g} MB) / worker RSS. "
+          "Check accuracy and agreement before switching AGRIVISION_MODEL_PRECISION.")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report saved to {args.output}")
+    return 0 if measured else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
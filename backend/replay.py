@@ -0,0 +1,199 @@
+# Replay captured /predict traffic and compare with the recording
+#
+# Capture first on the server being measured (see AGRIVISION_CAPTURE_DIR),
+# then replay the archive against a local server running the candidate
+# model or server change:
+#
+#   python replay.py --capture captures --url http://localhost:5000              # original timing
+#   python replay.py --capture captures --speed 4                                # 4x faster
+#   python replay.py --capture captures --speed 0 --concurrency 16               # as fast as possible
+#
+# Arrivals keep their recorded spacing (divided by --speed), so bursts are
+# reproduced; with --speed 0 requests are sent back to back by --concurrency
+# clients. Exits with status 1 if predictions agree less than
+# --min-agreement or replayed p90 latency exceeds the recorded p90 by more
+# than --max-p90-ratio.
+#
+# Latency is compared as server view time on both sides: the recorded
+# latency_ms and the X-Server-Time-Ms header the server returns to replayed
+# requests time the same code, without HTTP, upload and WSGI overhead. The
+# client round trip is reported alongside but not gated on.
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.capture import load_capture, read_blob
+from utils.http_client import post_body, post_image
+from utils.model_report import format_table
+
+def send(url, record, data):
+    """
+    Re-issue one recorded request
+
+    Returns:
+        Tuple (status, body, client round trip ms, server view ms or None
+        if the server did not send X-Server-Time-Ms)
+    """
+    target = f"{url}{record.get('endpoint', '/predict')}"
+    if record.get('args'):
+        target += '?' + urllib.parse.urlencode(record['args'])
+    # Marked so a server that is itself capturing does not record the replay
+    headers = dict(record.get('headers') or {}, **{'X-Replay': '1'})
+    response_headers = {}
+    started = time.perf_counter()
+    if record.get('filename') is None:
+        status, body = post_body(target, data, record['mimetype'], headers, response_headers=response_headers)
+    else:
+        status, body = post_image(target, record['filename'], data, record.get('form'), headers,
+                                  response_headers=response_headers)
+    round_trip = (time.perf_counter() - started) * 1000
+    server_ms = response_headers.get('X-Server-Time-Ms')
+    return status, body or {}, round_trip, float(server_ms) if server_ms is not None else None
+
+def replay(records, blobs, url, speed, concurrency):
+    """
+    Send the records, paced by their recorded arrival times
+
+    Returns:
+        List of dicts (status, body, latency_ms, round_trip_ms, lag_ms) in
+        record order; latency_ms is the server view time, lag_ms is how late
+        each request left compared to its schedule
+    """
+    results = [None] * len(records)
+    if speed <= 0:
+        def run(i):
+            status, body, round_trip, latency = send(url, records[i], blobs[records[i]['sha256']])
+            results[i] = {'status': status, 'body': body, 'latency_ms': latency,
+                          'round_trip_ms': round_trip, 'lag_ms': 0.0}
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(run, range(len(records))))
+        return results
+
+    # Open loop: one thread per in-flight request, started on schedule
+    origin = records[0]['time']
+    start = time.perf_counter()
+    threads = []
+
+    def run(i, scheduled):
+        lag = (time.perf_counter() - scheduled) * 1000
+        status, body, round_trip, latency = send(url, records[i], blobs[records[i]['sha256']])
+        results[i] = {'status': status, 'body': body, 'latency_ms': latency,
+                      'round_trip_ms': round_trip, 'lag_ms': lag}
+
+    for i, record in enumerate(records):
+        scheduled = start + (record['time'] - origin) / speed
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        thread = threading.Thread(target=run, args=(i, scheduled), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
+def percentiles(values):
+    if not values:
+        return {'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': round(float(p50), 1), 'p90': round(float(p90), 1), 'p99': round(float(p99), 1),
+            'max': round(float(max(values)), 1)}
+
+def compare(records, results):
+    """
+    Prediction agreement and latency distributions, recorded vs replayed
+
+    recorded_ms and replayed_ms are both server view time; replayed requests
+    answered without X-Server-Time-Ms (an older server) are left out of
+    replayed_ms and counted in untimed.
+    """
+    status_mismatches, agree, compared, confidence_deltas = 0, 0, 0, []
+    for record, result in zip(records, results):
+        if record['status'] != result['status']:
+            status_mismatches += 1
+            continue
+        recorded, replayed = record.get('response', {}), result['body']
+        if 'prediction' in recorded and 'prediction' in replayed:
+            compared += 1
+            agree += recorded['prediction'] == replayed['prediction']
+            confidence_deltas.append(abs(recorded['confidence'] - replayed['confidence']))
+    return {
+        'requests': len(records),
+        'status_mismatches': status_mismatches,
+        'compared': compared,
+        'agreement': round(agree / compared, 4) if compared else None,
+        'confidence_delta_mean': round(float(np.mean(confidence_deltas)), 3) if confidence_deltas else None,
+        'latency_measure': 'server view time (recorded latency_ms vs X-Server-Time-Ms)',
+        'recorded_ms': percentiles([record['latency_ms'] for record in records]),
+        'replayed_ms': percentiles([result['latency_ms'] for result in results
+                                    if result['latency_ms'] is not None]),
+        'untimed': sum(result['latency_ms'] is None for result in results),
+        'round_trip_ms': percentiles([result['round_trip_ms'] for result in results]),
+        'lag_ms': percentiles([result['lag_ms'] for result in results]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured /predict traffic')
+    parser.add_argument('--capture', required=True, help='capture directory (AGRIVISION_CAPTURE_DIR)')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='time compression (1 = recorded pace, 0 = as fast as possible)')
+    parser.add_argument('--concurrency', type=int, default=8, help='clients with --speed 0')
+    parser.add_argument('--limit', type=int, help='replay only the first N requests')
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    parser.add_argument('--max-p90-ratio', type=float, default=1.25)
+    parser.add_argument('--output', help='write the comparison as JSON here')
+    args = parser.parse_args()
+
+    records = load_capture(args.capture)[:args.limit]
+    if not records:
+        print(f"No captured requests in {args.capture}")
+        return 1
+    blobs = {record['sha256']: read_blob(args.capture, record['sha256']) for record in records}
+    span = records[-1]['time'] - records[0]['time']
+    mode = 'max speed' if args.speed <= 0 else f'{args.speed:g}x ({span / args.speed:.0f} s)'
+    print(f"Replaying {len(records)} requests ({len(blobs)} distinct uploads) at {mode}")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    results = replay(records, blobs, args.url, args.speed, args.concurrency)
+    report = compare(records, results)
+    report['wall_s'] = round(time.perf_counter() - started, 1)
+    report['throughput_rps'] = round(len(records) / max(report['wall_s'], 1e-9), 1)
+
+    print(format_table([dict(report['recorded_ms'], run='recorded (server)'),
+                        dict(report['replayed_ms'], run='replayed (server)'),
+                        dict(report['round_trip_ms'], run='replayed (client round trip)')],
+                       [('run', 'latency ms'), ('p50', 'p50'), ('p90', 'p90'), ('p99', 'p99'), ('max', 'max')]))
+    print(f"\nLatency gate compares {report['latency_measure']}")
+    if report['untimed']:
+        print(f"{report['untimed']} responses had no X-Server-Time-Ms header and are not in replayed (server)")
+    print(f"\nPrediction agreement: {report['agreement']} over {report['compared']} requests, "
+          f"mean confidence change {report['confidence_delta_mean']} points, "
+          f"{report['status_mismatches']} status mismatches")
+    print(f"Throughput {report['throughput_rps']} req/s, schedule lag p90 {report['lag_ms']['p90']} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report['agreement'] is not None and report['agreement'] < args.min_agreement:
+        failures.append(f"agreement {report['agreement']} < {args.min_agreement}")
+    recorded_p90 = report['recorded_ms']['p90']
+    if report['untimed'] == len(results):
+        print("Latency gate skipped: the server does not return X-Server-Time-Ms")
+    elif recorded_p90 and report['replayed_ms']['p90'] > recorded_p90 * args.max_p90_ratio:
+        failures.append(f"p90 {report['replayed_ms']['p90']} ms > {args.max_p90_ratio}x recorded {recorded_p90} ms")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# Soak test: hammer /predict and check that worker memory stays bounded
+#
+# Start the server first (python app.py or gunicorn -c gunicorn.conf.py app:app),
+# then run from the same host (admin endpoints are local-only unless
+# AGRIVISION_ADMIN_TOKEN is set):
+#
+#   python soak.py --url http://localhost:5000 --requests 5000 --concurrency 8
+#
+# Exits with status 1 if any worker's RSS grew by more than --max-growth-mb
+# after the warm-up phase.
+
+import argparse
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from utils.http_client import post_image, get_json
+
+def make_images(count, size=224, seed=0):
+    """A pool of distinct JPEG uploads so caches and single-flight do not hide work"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+def memory_snapshot(url, headers):
+    """RSS of whichever worker answers"""
+    report = get_json(f'{url}/admin/memory', headers=headers)
+    return report['pid'], report['rss_mb']
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test /predict and watch worker RSS')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=float, default=0.1, help='fraction of requests before the baseline')
+    parser.add_argument('--sample-every', type=int, default=100)
+    parser.add_argument('--max-growth-mb', type=float, default=50)
+    parser.add_argument('--admin-token')
+    args = parser.parse_args()
+
+    headers = {'X-Admin-Token': args.admin_token} if args.admin_token else {}
+    images = make_images(64)
+    warmup = int(args.requests * args.warmup)
+    baseline, latest = {}, {}
+    statuses = {}
+
+    print(f"Soak test: {args.requests} requests, concurrency {args.concurrency}")
+    print("=" * 60)
+    start = time.time()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(post_image, f'{args.url}/predict', f'soak_{i}.jpg', images[i % len(images)])
+                   for i in range(args.requests)]
+        for i, future in enumerate(futures, 1):
+            status, _ = future.result()
+            statuses[status] = statuses.get(status, 0) + 1
+            if i % args.sample_every == 0:
+                # Ask several times to reach the different workers
+                for _ in range(args.concurrency):
+                    pid, rss = memory_snapshot(args.url, headers)
+                    latest[pid] = rss
+                    if i >= warmup:
+                        baseline.setdefault(pid, rss)
+                print(f"{i:>7} requests  {i / (time.time() - start):6.1f} req/s  "
+                      + '  '.join(f'pid {pid}: {rss:.0f} MB' for pid, rss in sorted(latest.items())))
+
+    print(f"\nStatus codes: {statuses}")
+    failed = False
+    for pid, rss in sorted(latest.items()):
+        if pid not in baseline:
+            continue
+        growth = rss - baseline[pid]
+        verdict = 'OK' if growth <= args.max_growth_mb else 'LEAK?'
+        failed |= growth > args.max_growth_mb
+        print(f"pid {pid}: {baseline[pid]:.0f} MB -> {rss:.0f} MB ({growth:+.0f} MB) {verdict}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
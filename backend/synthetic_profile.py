@@ -0,0 +1,73 @@
+# Measure a real model into a synthetic backend profile
+#
+# The profile lets app.py stand in for the model on machines without
+# TensorFlow (AGRIVISION_SYNTHETIC_PROFILE=model/synthetic_profile.json) with
+# the same per-batch latency, CPU time, memory and output distribution.
+#
+# Usage:
+#   python synthetic_profile.py --model model/model.h5 --data data/val \
+#       --output model/synthetic_profile.json
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils.memprof import current_rss
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure a model into a synthetic backend profile')
+    parser.add_argument('--model', default='model/model.h5', help='.h5/.keras or .tflite model')
+    parser.add_argument('--data', help='labelled directory for the confidence/class distribution')
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--output', default='model/synthetic_profile.json')
+    args = parser.parse_args()
+
+    before = current_rss()
+    # Imported here so the RSS baseline excludes TensorFlow itself
+    import tensorflow as tf
+    from pareto_report import load_predictor
+    from train_model import load_image_folder
+    from utils.synthetic import fit_profile
+    runtime = current_rss()
+    predict, size = load_predictor(args.model)
+    predict(np.zeros((1, size, size, 3), dtype=np.float32))  # warm-up
+    loaded = current_rss()
+
+    rng = np.random.default_rng(0)
+    latency, cpu, activation = {}, {}, []
+    for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+        batch = rng.random((batch_size, size, size, 3), dtype=np.float32)
+        predict(batch)
+        timings, cpu_times = [], []
+        for _ in range(args.runs):
+            wall, cpu_start = time.perf_counter(), time.process_time()
+            predict(batch)
+            cpu_times.append((time.process_time() - cpu_start) * 1000)
+            timings.append((time.perf_counter() - wall) * 1000)
+        latency[batch_size], cpu[batch_size] = timings, float(np.mean(cpu_times))
+        activation.append(max(current_rss() - loaded, 0) / 1024 / 1024 / batch_size)
+        print(f"batch {batch_size:>3}: {np.median(timings):8.2f} ms wall, {cpu[batch_size]:8.2f} ms CPU")
+
+    confidences = predicted = None
+    if args.data:
+        probabilities = []
+        for images, _ in load_image_folder(args.data, img_size=size, batch_size=32):
+            probabilities.append(predict(images.numpy()))
+        probabilities = np.concatenate(probabilities)
+        confidences, predicted = probabilities.max(axis=1), probabilities.argmax(axis=1)
+
+    profile = fit_profile(latency, cpu, (loaded - runtime) / 1024 / 1024, float(np.median(activation)),
+                          confidences, predicted, num_classes=None if predicted is None else
+                          int(probabilities.shape[1]))
+    profile['source'] = {'model': args.model, 'tensorflow': tf.__version__, 'rss_before_mb':
+                         round(before / 1024 / 1024, 1)}
+    with open(args.output, 'w') as f:
+        json.dump(profile, f, indent=2)
+    print(json.dumps(profile, indent=2))
+    print(f"Profile saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
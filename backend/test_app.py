@@ -3,10 +3,36 @@ import json
 import io
 import os
 import sqlite3
+import shutil
 import tempfile
 from PIL import Image
 import numpy as np
 from app import app, init_db, load_model, preprocess_image
+import threading
+import time
+from utils.cluster import free_ports, local_tf_config, scaled_learning_rate, shard_items, task_info
+from utils.cpu_tuning import thread_plan, worker_cpus
+from utils.singleflight import SingleFlight
+from utils.jobs import JobStore, JobExecutor
+from utils.log_shards import SHARD_ID_STRIDE, list_shards
+from utils.memprof import MemoryMonitor, WorkerRecycler
+from utils.rollup import LatencyRollup
+from utils.batcher import MicroBatcher
+from utils.capture import TrafficCapture, load_capture, read_blob
+from utils.embedding_index import EmbeddingIndex
+from utils.evaluation import confusion_matrix, expected_calibration_error, per_class_metrics, top_k_accuracy
+from utils.explain import ArrayLRU, DiskCache, overlay_png
+from utils.frames import FRAMES_MIMETYPE, FrameSkipper, dhash, encode_frames, hamming, iter_multipart
+from utils.model_cache import ModelCache
+from utils.model_report import format_table, measure_latency, pareto_front
+from utils.precision import agreement, dequantize, quantize
+from utils.synthetic import SyntheticBackend, fit_profile, load_profile
+from utils.tiers import choose_tier, parse_tier
+from utils.training_log import TrainingLog
+from utils.cascade import cascade_predict, cascade_tradeoff
+from utils.admission import AdmissionController, QueueFull, DeadlineExceeded
+from utils.tiling import generate_tiles
+from utils.tensor_format import encode_tensor, decode_tensor, TensorFormatError
 
 class TestFlaskApp(unittest.TestCase):
     @classmethod
@@ -161,6 +187,72 @@ class TestFlaskApp(unittest.TestCase):
         self.assertGreater(len(data['frequent_diseases']), 0)
         self.assertAlmostEqual(data['average_confidence'], (95.5 + 87.3 + 92.1) / 3, places=2)
 
+    def _insert_history(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('INSERT INTO predictions (filename, timestamp, prediction, confidence) VALUES (?, ?, ?, ?)', [
+            ('a.jpg', '2024-01-01 10:00:00', 'Apple - Apple scab', 95.5),
+            ('b.jpg', '2024-01-02 10:00:00', 'Tomato - Leaf Mold', 60.0),
+            ('c.jpg', '2024-01-03 10:00:00', 'Apple - Apple scab', 80.0),
+            ('d.jpg', '2024-01-04 10:00:00', 'Apple - Apple scab', 99.0),
+        ])
+        conn.commit()
+        conn.close()
+
+    def test_predictions_keyset_pagination(self):
+        """Test history export pages by id and filters by class and confidence"""
+        self._insert_history()
+        response = self.client.get('/predictions?limit=2')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        page = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual([row['id'] for row in page], [1, 2])
+        response = self.client.get(f"/predictions?limit=2&after_id={page[-1]['id']}")
+        self.assertEqual([json.loads(line)['id'] for line in response.data.splitlines()], [3, 4])
+
+        response = self.client.get('/predictions?class=Apple___Apple_scab&min_confidence=90'
+                                   '&since=2024-01-01&until=2024-01-04')
+        self.assertEqual([json.loads(line)['filename'] for line in response.data.splitlines()], ['a.jpg'])
+        self.assertEqual(self.client.get('/predictions?limit=abc').status_code, 400)
+
+    def test_predictions_csv_export(self):
+        """Test full CSV export with limit=0"""
+        self._insert_history()
+        response = self.client.get('/predictions?format=csv&limit=0')
+        self.assertEqual(response.mimetype, 'text/csv')
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[0], 'id,filename,timestamp,prediction,confidence')
+        self.assertEqual(len(lines), 5)
+
+    def test_sharded_prediction_log(self):
+        """Test worker shards get their own id range, are read with the main table and merge back"""
+        import app as server
+        from unittest import mock
+        self._insert_history()
+        app.config['LOG_SHARDS'] = True
+        try:
+            for slot in ('0', '2'):
+                with mock.patch.dict(os.environ, {'AGRIVISION_WORKER_SLOT': slot}):
+                    response = self.client.post('/predict', data={
+                        'image': (io.BytesIO(self.test_image_rgb.getvalue()), 'test.png')})
+                self.assertEqual(json.loads(response.data)['prediction_id'], (int(slot) + 1) * SHARD_ID_STRIDE)
+            self.assertEqual([slot for slot, _ in list_shards(self.db_path)], [0, 2])
+
+            rows = [json.loads(line) for line in self.client.get('/predictions?limit=0').data.splitlines()]
+            self.assertEqual([row['id'] for row in rows][-2:], [SHARD_ID_STRIDE, 3 * SHARD_ID_STRIDE])
+            self.assertEqual(json.loads(self.client.get('/insights').data)['total_predictions'], 6)
+
+            self.assertEqual(sum(server.merge_prediction_shards().values()), 2)
+            conn = sqlite3.connect(self.db_path)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0], 6)
+            conn.close()
+            self.assertEqual(json.loads(self.client.get('/insights').data)['total_predictions'], 6)
+            # The shard keeps counting after the merge instead of reusing merged ids
+            with mock.patch.dict(os.environ, {'AGRIVISION_WORKER_SLOT': '0'}):
+                self.assertEqual(server.log_prediction('x.jpg', 'Tomato - healthy', 90.0), SHARD_ID_STRIDE + 1)
+        finally:
+            app.config.pop('LOG_SHARDS')
+            for _, path in list_shards(self.db_path):
+                os.unlink(path)
+
     def test_preprocess_image(self):
         """Test image preprocessing function"""
         # Test with RGB image
@@ -207,5 +299,1169 @@ class TestFlaskApp(unittest.TestCase):
             self.assertIn(disease, remedies)
             self.assertIsInstance(remedies[disease], str)
 
+    def test_predict_tiled(self):
+        """Test tiled mode returns per-tile scores and honours the tile cap"""
+        field = io.BytesIO()
+        Image.new('RGB', (900, 600), color=(60, 140, 50)).save(field, format='PNG')
+        field.seek(0)
+        response = self.client.post('/predict', data={
+            'image': (field, 'field.png'), 'tiled': '1', 'max_tiles': '3'
+        })
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIn('prediction', data)
+        self.assertEqual(len(data['tiles']), 3)
+        self.assertTrue(all(len(tile['box']) == 4 for tile in data['tiles']))
+
+    def test_tiles_skip_background(self):
+        """Non-leaf tiles are skipped before inference"""
+        pixels = np.zeros((448, 896, 3), dtype=np.uint8)
+        pixels[:, :448] = (60, 140, 50)     # leaf
+        pixels[:, 448:] = (90, 120, 200)    # sky
+        tiles, info, skipped = generate_tiles(Image.fromarray(pixels), overlap=0)
+        self.assertEqual(len(tiles), 4)
+        self.assertEqual(skipped, 4)
+        self.assertTrue(all(i['box'][0] < 448 for i in info))
+
+    def test_predict_raw_tensor(self):
+        """Test raw tensor uploads as multipart file and as request body"""
+        payload = encode_tensor(np.full((224, 224, 3), 120, dtype=np.uint8))
+        response = self.client.post('/predict', data={
+            'image': (io.BytesIO(payload), 'leaf.agt')
+        })
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/predict', data=payload,
+                                    content_type='application/x-agrivision-tensor')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('prediction', json.loads(response.data))
+
+    def test_predict_malformed_tensor(self):
+        """Test truncated tensor payloads are rejected"""
+        payload = encode_tensor(np.zeros((224, 224, 3), dtype=np.uint8))[:-10]
+        response = self.client.post('/predict', data=payload,
+                                    content_type='application/x-agrivision-tensor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_batch(self):
+        """Test batch endpoint with mixed formats and a broken file"""
+        tensor = encode_tensor(np.zeros((160, 120, 3), dtype=np.uint8))
+        response = self.client.post('/predict/batch', data={
+            'images': [(self.test_image_rgb, 'a.png'),
+                       (io.BytesIO(tensor), 'b.agt'),
+                       (io.BytesIO(b'not an image'), 'c.jpg')]
+        })
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)['results']
+        self.assertEqual([r['filename'] for r in results], ['a.png', 'b.agt', 'c.jpg'])
+        self.assertIn('prediction', results[0])
+        self.assertIn('prediction', results[1])
+        self.assertIn('error', results[2])
+
+    def test_predict_batch_corrupt_file_in_graph_decode(self):
+        """Test a truncated JPEG that fails the bytes-input model only fails its own entry"""
+        import app as server
+        from unittest import mock
+        jpeg = io.BytesIO()
+        Image.fromarray((np.random.default_rng(0).random((64, 64, 3)) * 255).astype(np.uint8)).save(jpeg, 'JPEG')
+        # Valid header, scan data cut off: passes graph_decodable, fails to decode
+        truncated = jpeg.getvalue()[:len(jpeg.getvalue()) // 2]
+
+        calls = []
+
+        def decode_in_graph(payloads, outputs=None):
+            calls.append(len(payloads))
+            if truncated in payloads:
+                raise ValueError('Invalid JPEG data or crop window')
+            return server.synthetic_backend.predict(np.zeros((len(payloads), 4, 4, 3), np.float32))
+
+        with mock.patch.object(server, 'bytes_model', object()), \
+                mock.patch.object(server, 'run_encoded_inference', decode_in_graph):
+            response = self.client.post('/predict/batch', data={
+                'images': [(io.BytesIO(jpeg.getvalue()), 'good.jpg'), (io.BytesIO(truncated), 'bad.jpg')]
+            })
+        self.assertEqual(response.status_code, 200)
+        good, bad = json.loads(response.data)['results']
+        self.assertEqual(good['filename'], 'good.jpg')
+        self.assertIn('prediction', good)
+        self.assertEqual(bad['filename'], 'bad.jpg')
+        self.assertIn('error', bad)
+        self.assertEqual(calls, [2])
+
+    def test_predict_batch_empty(self):
+        """Test an empty batch is rejected for both upload formats"""
+        response = self.client.post('/predict/batch', data=b'',
+                                    content_type='application/x-agrivision-tensor')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/predict/batch', data={}, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_stream(self):
+        """Test /predict/stream skips repeated frames and reports each segment as NDJSON"""
+        def frame(seed):
+            cells = (np.random.default_rng(seed).random((8, 8, 3)) * 255).astype(np.uint8)
+            buffer = io.BytesIO()
+            Image.fromarray(np.kron(cells, np.ones((16, 16, 1), np.uint8))).save(buffer, 'JPEG')
+            return buffer.getvalue()
+        # Two scenes of four frames each, then a corrupt frame
+        frames = [frame(0)] * 4 + [frame(1)] * 4 + [b'not an image']
+        response = self.client.post('/predict/stream?segment=3', data=encode_frames(frames),
+                                    content_type=FRAMES_MIMETYPE)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        segments, summary = lines[:-1], lines[-1]['summary']
+        self.assertEqual([s['frames'] for s in segments], [[0, 2], [3, 5], [6, 8]])
+        self.assertEqual([s['kept'] for s in segments], [1, 1, 0])
+        self.assertEqual(segments[2]['errors'], 1)
+        # A segment made only of repeats inherits the diagnosis of the frame they repeat
+        self.assertEqual(segments[2]['prediction'], segments[1]['prediction'])
+        self.assertEqual((summary['frames'], summary['kept'], summary['skipped']), (9, 2, 6))
+        self.assertAlmostEqual(summary['skip_ratio'], 6 / 9, places=3)
+        self.assertGreater(summary['frames_per_s'], 0)
+
+        # Multipart parts named 'frame' work the same way
+        response = self.client.post('/predict/stream', data={
+            'frame': [(io.BytesIO(data), f'{i}.jpg') for i, data in enumerate(frames[:5])]
+        })
+        summary = json.loads(response.get_data(as_text=True).splitlines()[-1])['summary']
+        self.assertEqual((summary['frames'], summary['kept'], summary['segments']), (5, 2, 1))
+        self.assertEqual(self.client.post('/predict/stream', data=b'x').status_code, 400)
+
+    def test_predict_resolution_tier(self):
+        """Test the response reports the tier and requested tiers round down"""
+        import app as server
+        data = json.loads(self.client.post('/predict', data={
+            'image': (io.BytesIO(self.test_image_rgb.getvalue()), 'test.png')
+        }).data)
+        self.assertEqual(data['tier'], 224)
+        server.tier_models[128] = None
+        try:
+            data = json.loads(self.client.post('/predict', data={
+                'image': (io.BytesIO(self.test_image_rgb.getvalue()), 'test.png'), 'tier': '160'
+            }).data)
+            self.assertEqual(data['tier'], 128)
+        finally:
+            server.tier_models.pop(128)
+        response = self.client.post('/predict', data={
+            'image': (self.test_image_rgb, 'test.png'), 'tier': 'fast'
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_crop_specialist(self):
+        """Test the crop hint routes to a lazily loaded specialist"""
+        import app as server
+
+        class FakeSpecialist:
+            def predict(self, batch, verbose=0):
+                # Tomato classes in order; the last one is Tomato___healthy
+                probs = np.zeros((len(batch), len(server.CROP_CLASSES['tomato'])), dtype=np.float32)
+                probs[:, -1] = 0.9
+                probs[:, 0] = 0.1
+                return probs
+
+        specialist_dir = tempfile.mkdtemp()
+        open(os.path.join(specialist_dir, 'tomato.h5'), 'w').close()
+        app.config['SPECIALIST_DIR'] = specialist_dir
+        original = server.specialists
+        server.specialists = ModelCache(lambda crop: FakeSpecialist(), max_bytes=10, size_of=lambda m: 1)
+        try:
+            data = json.loads(self.client.post('/predict', data={
+                'image': (io.BytesIO(self.test_image_rgb.getvalue()), 'leaf.png'), 'crop': 'Tomato'
+            }).data)
+            self.assertEqual((data['specialist'], data['prediction']), ('tomato', 'Tomato - healthy'))
+            self.assertAlmostEqual(data['confidence'], 90.0)
+
+            # No specialist for potato: the general model answers
+            data = json.loads(self.client.post('/predict', data={
+                'image': (io.BytesIO(self.test_image_rgb.getvalue()), 'leaf.png'), 'crop': 'potato'
+            }).data)
+            self.assertIsNone(data['specialist'])
+
+            response = self.client.post('/predict', data={
+                'image': (self.test_image_rgb, 'leaf.png'), 'crop': 'banana'
+            })
+            self.assertEqual(response.status_code, 400)
+
+            models = json.loads(self.client.get('/admin/models').data)
+            self.assertEqual(models['specialists']['available'], ['tomato'])
+            self.assertEqual([m['key'] for m in models['specialists']['resident']], ['tomato'])
+        finally:
+            server.specialists = original
+            app.config.pop('SPECIALIST_DIR')
+            os.unlink(os.path.join(specialist_dir, 'tomato.h5'))
+            os.rmdir(specialist_dir)
+
+    def test_graph_decodable_reads_header_only(self):
+        """Test which uploads may skip PIL decoding for the bytes-input model"""
+        import app as server
+        stats = {}
+        self.assertTrue(server.graph_decodable(self.test_image_rgb.getvalue(), stats))
+        self.assertEqual((stats['format'], stats['width'], stats['preprocess_ms']), ('png', 224, 0.0))
+        tiff = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(tiff, format='TIFF')
+        self.assertFalse(server.graph_decodable(tiff.getvalue(), {}))
+        self.assertFalse(server.graph_decodable(encode_tensor(np.zeros((4, 4, 3), dtype=np.uint8)), {}))
+
+    def test_similar_cases(self):
+        """Test logged embeddings are searchable by prediction id"""
+        import app as server
+        app.config['EMBEDDING_INDEX'] = self.db_path + '.idx'
+        app.config['EMBEDDING_DIM'] = 4
+        try:
+            with app.app_context():
+                init_db()
+            ids = [server.log_prediction(f'{i}.png', 'Tomato - healthy', 90.0 - i,
+                                         {'embedding': np.array(vector, dtype=np.float32)})
+                   for i, vector in enumerate([[1, 0, 0, 0], [0.9, 0.1, 0, 0], [0, 1, 0, 0], [0.7, 0.7, 0, 0]])]
+            data = json.loads(self.client.get(f'/similar?id={ids[0]}&k=2').data)
+            self.assertEqual([n['id'] for n in data['neighbors']], [ids[1], ids[3]])
+            self.assertEqual(data['neighbors'][0]['filename'], '1.png')
+            data = json.loads(self.client.get(f'/similar?id={ids[0]}&k=2&min_confidence=88.5').data)
+            self.assertEqual([n['id'] for n in data['neighbors']], [ids[1]])
+            self.assertEqual(self.client.get('/similar?id=999').status_code, 404)
+            self.assertEqual(self.client.get('/similar').status_code, 400)
+        finally:
+            server.embedding_indexes.pop(app.config['EMBEDDING_INDEX'], None)
+            app.config.pop('EMBEDDING_DIM')
+            shutil.rmtree(app.config.pop('EMBEDDING_INDEX'))
+
+    def test_cascade_logs_embeddings_of_escalated_rows(self):
+        """Test images escalated past the cascade still reach the /similar index"""
+        import app as server
+
+        class Fake:
+            def __init__(self, fn):
+                self.predict = lambda batch, verbose=0: fn(batch)
+
+        # Row 0 is uncertain in stage 1 and escalated, row 1 exits early
+        stage1 = Fake(lambda b: np.array([[0.5, 0.5] + [0] * 36, [0.99, 0.01] + [0] * 36])[:len(b)])
+        full = Fake(lambda b: (np.tile(np.eye(38)[1], (len(b), 1)), np.tile([1.0, 0, 0, 0], (len(b), 1))))
+        saved = server.model, server.model_type, server.cascade_model, server.cascade_threshold, server.embedding_model
+        server.model, server.model_type = Fake(lambda b: np.tile(np.eye(38)[1], (len(b), 1))), 'keras'
+        server.cascade_model, server.cascade_threshold, server.embedding_model = stage1, 0.9, full
+        app.config['EMBEDDING_INDEX'] = self.db_path + '.idx'
+        app.config['EMBEDDING_DIM'] = 4
+        try:
+            with app.app_context():
+                init_db()
+            outputs = {}
+            predictions = server.run_inference(np.zeros((2, 8, 8, 3), np.float32), outputs=outputs)
+            self.assertEqual(predictions.argmax(axis=1).tolist(), [1, 0])
+            self.assertIsNone(outputs['embeddings'][1])
+            ids = [server.log_prediction(f'{i}.png', 'Tomato - healthy', 90.0, {'embedding': embedding})
+                   for i, embedding in enumerate(outputs['embeddings'])]
+            other = server.log_prediction('2.png', 'Tomato - healthy', 90.0,
+                                          {'embedding': np.array([0.9, 0.1, 0, 0], np.float32)})
+            data = json.loads(self.client.get(f'/similar?id={other}&k=5').data)
+            self.assertEqual([n['id'] for n in data['neighbors']], [ids[0]])
+        finally:
+            (server.model, server.model_type, server.cascade_model,
+             server.cascade_threshold, server.embedding_model) = saved
+            server.embedding_indexes.pop(app.config['EMBEDDING_INDEX'], None)
+            app.config.pop('EMBEDDING_DIM')
+            shutil.rmtree(app.config.pop('EMBEDDING_INDEX'))
+
+    def test_explain_by_hash(self):
+        """Test /explain reuses the input cached by /predict and caches the overlay"""
+        import app as server
+        from unittest import mock
+        self.assertEqual(self.client.post('/explain', data={'hash': 'ab' * 32}).status_code, 503)
+
+        response = self.client.post('/predict', data={'image': (self.test_image_rgb, 'leaf.png')},
+                                    content_type='multipart/form-data')
+        image_hash = json.loads(response.data)['image_hash']
+        batches = []
+
+        def fake_batch(items):
+            batches.append(len(items))
+            return [(np.linspace(0, 1, 49).reshape(7, 7), 3, 0.9) for _ in items]
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(server, 'explainable', return_value=True), \
+                 mock.patch.object(server, 'explain_batch', side_effect=fake_batch), \
+                 mock.patch.object(server, 'explain_cache', DiskCache(cache_dir, 1 << 20)):
+                response = self.client.post('/explain', data={'hash': image_hash})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.mimetype, 'image/png')
+                self.assertEqual(response.headers['X-Cache'], 'miss')
+                self.assertEqual(response.headers['X-Explained-Class'], server.display_name(server.CLASS_NAMES[3]))
+                self.assertEqual(Image.open(io.BytesIO(response.data)).size, (224, 224))
+
+                response = self.client.post('/explain', data={'hash': image_hash})
+                self.assertEqual(response.headers['X-Cache'], 'hit')
+                self.assertEqual(batches, [1])
+
+                self.assertEqual(self.client.post('/explain', data={'hash': 'cd' * 32}).status_code, 404)
+                self.assertEqual(self.client.post('/explain', data={'hash': 'nope'}).status_code, 400)
+                self.assertEqual(self.client.post('/explain', data={'hash': image_hash,
+                                                                    'class': 'Banana'}).status_code, 400)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_explain_after_bytes_model_prediction(self):
+        """Test /explain by hash works for uploads the bytes-input model classified"""
+        import app as server
+        from unittest import mock
+        upload = self.test_image_rgb.getvalue()
+        fake_encoded = lambda payloads, outputs=None: server.synthetic_backend.predict(
+            np.zeros((len(payloads), 4, 4, 3), np.float32))
+        with mock.patch.object(server, 'bytes_model', object()), \
+                mock.patch.object(server, 'run_encoded_inference', fake_encoded):
+            response = self.client.post('/predict', data={'image': (io.BytesIO(upload), 'leaf.png')},
+                                        content_type='multipart/form-data')
+        image_hash = json.loads(response.data)['image_hash']
+        # Cached still encoded, decoded on the first /explain
+        self.assertEqual(server.explain_inputs.get(image_hash).ndim, 1)
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(server, 'explainable', return_value=True), \
+                 mock.patch.object(server, 'explain_batch',
+                                   side_effect=lambda items: [(np.ones((7, 7)), 3, 0.9) for _ in items]), \
+                 mock.patch.object(server, 'explain_cache', DiskCache(cache_dir, 1 << 20)):
+                response = self.client.post('/explain', data={'hash': image_hash})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(server.explain_inputs.get(image_hash).shape, (224, 224, 3))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_traffic_capture(self):
+        """Test sampled /predict requests are archived once per upload with their response"""
+        import app as server
+        from unittest import mock
+        path = tempfile.mkdtemp()
+        try:
+            upload = self.test_image_rgb.getvalue()
+            with mock.patch.object(server, 'traffic_capture', TrafficCapture(path, sample_rate=1.0)):
+                for _ in range(2):
+                    response = self.client.post('/predict?tier=auto',
+                                                data={'image': (io.BytesIO(upload), 'leaf.png'), 'crop': 'tomato'},
+                                                headers={'X-Priority': 'batch'},
+                                                content_type='multipart/form-data')
+                    self.assertEqual(response.status_code, 200)
+            records = load_capture(path)
+            self.assertEqual(len(records), 2)
+            self.assertEqual(len(os.listdir(os.path.join(path, 'blobs'))), 1)
+            record = records[0]
+            self.assertEqual(read_blob(path, record['sha256']), upload)
+            self.assertEqual(record['filename'], 'leaf.png')
+            self.assertEqual(record['form'], {'crop': 'tomato'})
+            self.assertEqual(record['args'], {'tier': 'auto'})
+            self.assertEqual(record['headers'], {'X-Priority': 'batch'})
+            self.assertEqual(record['status'], 200)
+            self.assertIn('prediction', record['response'])
+
+            # Replayed requests are not recorded and report their view time
+            with mock.patch.object(server, 'traffic_capture', TrafficCapture(path, sample_rate=1.0)):
+                response = self.client.post('/predict', data={'image': (io.BytesIO(upload), 'leaf.png')},
+                                            headers={'X-Replay': '1'}, content_type='multipart/form-data')
+            self.assertGreater(float(response.headers['X-Server-Time-Ms']), 0)
+            self.assertEqual(len(load_capture(path)), 2)
+        finally:
+            shutil.rmtree(path)
+
+    def test_demo_predictions_are_deterministic(self):
+        """Test the synthetic backend answers the same image the same way"""
+        upload = self.test_image_rgb.getvalue()
+        answers = set()
+        for _ in range(3):
+            response = self.client.post('/predict', data={'image': (io.BytesIO(upload), 'leaf.png')},
+                                        content_type='multipart/form-data')
+            data = json.loads(response.data)
+            answers.add((data['prediction'], data['confidence']))
+        self.assertEqual(len(answers), 1)
+
+    def test_tensor_roundtrip_zero_copy(self):
+        """Decoded tensors are views over the payload, not copies"""
+        pixels = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
+        payload = encode_tensor(pixels)
+        decoded = decode_tensor(payload)
+        np.testing.assert_array_equal(decoded, pixels)
+        self.assertFalse(decoded.flags['OWNDATA'])
+        with self.assertRaises(TensorFormatError):
+            decode_tensor(payload + b'x')
+
+    def test_async_job_lifecycle(self):
+        """Test submitting a job with files and an archive, then polling and fetching results"""
+        import app as server
+        import zipfile
+        app.config['JOBS_DATABASE'] = self.db_path + '.jobs'
+        app.config['JOB_EXECUTOR_AUTOSTART'] = False
+        try:
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w') as zf:
+                zf.writestr('leaves/one.png', self.test_image_small.getvalue())
+                zf.writestr('leaves/readme.txt', 'ignored')
+            archive.seek(0)
+            response = self.client.post('/jobs', data={
+                'images': [(self.test_image_rgb, 'a.png'), (io.BytesIO(b'broken'), 'b.png')],
+                'archive': (archive, 'leaves.zip')
+            })
+            self.assertEqual(response.status_code, 202)
+            job_id = json.loads(response.data)['job_id']
+
+            status = json.loads(self.client.get(f'/jobs/{job_id}').data)
+            self.assertEqual((status['status'], status['total'], status['done']), ('queued', 3, 0))
+
+            server.get_job_executor().run_pending()
+            status = json.loads(self.client.get(f'/jobs/{job_id}').data)
+            self.assertEqual((status['status'], status['done'], status['failed']), ('completed', 3, 1))
+
+            response = self.client.get(f'/jobs/{job_id}/results')
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            lines = [json.loads(line) for line in response.data.splitlines()]
+            self.assertEqual([line['filename'] for line in lines], ['a.png', 'b.png', 'one.png'])
+            self.assertIn('error', lines[1])
+            self.assertEqual(self.client.get('/jobs/unknown').status_code, 404)
+        finally:
+            app.config.pop('JOBS_DATABASE')
+            app.config.pop('JOB_EXECUTOR_AUTOSTART')
+            for suffix in ('.jobs', '.jobs-wal', '.jobs-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.unlink(self.db_path + suffix)
+
+    def test_predict_sheds_load_when_queue_full(self):
+        """Test a full inference queue answers 503 with Retry-After"""
+        import app as server
+        saturated = AdmissionController(concurrency=1, max_queue=0)
+        release = threading.Event()
+        holder = threading.Thread(target=saturated.run, args=(lambda: release.wait(5),))
+        holder.start()
+        time.sleep(0.05)
+        original, server.admission = server.admission, saturated
+        try:
+            response = self.client.post('/predict', data={
+                'image': (self.test_image_rgb, 'test.png')
+            })
+            self.assertEqual(response.status_code, 503)
+            self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        finally:
+            server.admission = original
+            release.set()
+            holder.join()
+
+    def test_predict_expired_deadline(self):
+        """Test requests whose deadline already passed are dropped before inference"""
+        response = self.client.post('/predict', data={
+            'image': (self.test_image_rgb, 'test.png')
+        }, headers={'X-Request-Deadline-Ms': '0'})
+        self.assertEqual(response.status_code, 504)
+
+    def test_admin_memory(self):
+        """Test memory report is served locally and token-protected when configured"""
+        response = self.client.get('/admin/memory')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertGreater(data['rss_mb'], 0)
+        self.assertIn('requests_served', data)
+
+        app.config['ADMIN_TOKEN'] = 'secret'
+        try:
+            self.assertEqual(self.client.get('/admin/memory').status_code, 403)
+            response = self.client.get('/admin/memory', headers={'X-Admin-Token': 'secret'})
+            self.assertEqual(response.status_code, 200)
+        finally:
+            app.config.pop('ADMIN_TOKEN')
+
+    def test_profiling_hooks(self):
+        """Test header-triggered and slow-request profiles can be listed and downloaded"""
+        import app as server
+        import zipfile
+        from utils.profiling import RequestProfiler
+        with tempfile.TemporaryDirectory() as profile_dir:
+            original = server.profiler
+            server.profiler = RequestProfiler(profile_dir, slow_ms=0.001, max_dumps=2)
+            try:
+                response = self.client.get('/insights', headers={'X-Profile': '1'})
+                self.assertEqual(response.status_code, 200)
+                name = response.headers['X-Profile-Dump']
+                self.assertIn('header', name)
+                for _ in range(2):
+                    self.client.post('/predict', data={
+                        'image': (io.BytesIO(self.test_image_rgb.getvalue()), 'test.png')
+                    })
+
+                profiles = json.loads(self.client.get('/admin/profiles').data)['profiles']
+                self.assertEqual(len(profiles), 2)
+                self.assertTrue(all('_slow_' in p['name'] for p in profiles))
+                self.assertIn('stacks.txt', profiles[0]['files'])
+
+                response = self.client.get(f"/admin/profiles/{profiles[0]['name']}")
+                self.assertEqual(response.mimetype, 'application/zip')
+                self.assertTrue(zipfile.ZipFile(io.BytesIO(response.data)).namelist())
+                self.assertEqual(self.client.get('/admin/profiles/..').status_code, 404)
+            finally:
+                server.profiler = original
+
+    def test_prediction_timings_logged(self):
+        """Test stage timings and input properties are stored with each prediction"""
+        self.client.post('/predict', data={'image': (self.test_image_small, 'small.png')})
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT decode_ms, preprocess_ms, inference_ms, total_ms, width, height, '
+                           'bytes, format, batch_size, model_version FROM predictions').fetchone()
+        conn.close()
+        self.assertTrue(all(ms is not None and ms >= 0 for ms in row[:4]))
+        self.assertGreaterEqual(row[3], row[2])
+        self.assertEqual(row[4:6], (100, 100))
+        self.assertEqual(row[7:9], ('png', 1))
+        self.assertIsNotNone(row[9])
+
+    def test_latency_insights(self):
+        """Test latency percentiles grouped by input format"""
+        self.client.post('/predict', data={'image': (self.test_image_rgb, 'a.png')})
+        jpeg = io.BytesIO()
+        Image.new('RGB', (300, 200), color='green').save(jpeg, format='JPEG')
+        jpeg.seek(0)
+        self.client.post('/predict', data={'image': (jpeg, 'b.jpg')})
+
+        response = self.client.get('/insights/latency?group_by=format&stage=total')
+        self.assertEqual(response.status_code, 200)
+        groups = {g['value']: g for g in json.loads(response.data)['groups']}
+        self.assertEqual(set(groups), {'png', 'jpeg'})
+        self.assertEqual(groups['png']['count'], 1)
+        self.assertIn('p99_ms', groups['png'])
+        self.assertEqual(self.client.get('/insights/latency?group_by=nope').status_code, 400)
+
+    def test_metrics_endpoint(self):
+        """Test metrics are exported in Prometheus text format"""
+        self.client.post('/predict', data={
+            'image': (self.test_image_rgb, 'test.png')
+        })
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'agrivision_predict_requests_total', response.data)
+
+class TestSingleFlight(unittest.TestCase):
+    def _run_concurrently(self, flight, fn, n=5):
+        results, errors = [], []
+        def call():
+            try:
+                results.append(flight.do('key', fn, timeout=5))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=call) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_calls_collapse(self):
+        """Concurrent identical keys run the computation once"""
+        calls = []
+        duplicates = []
+        flight = SingleFlight(on_duplicate=lambda: duplicates.append(1))
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+        results, errors = self._run_concurrently(flight, slow)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(duplicates), 4)
+        self.assertTrue(all(result == 42 for result, _ in results))
+        self.assertEqual(sum(shared for _, shared in results), 4)
+
+    def test_failing_leader_does_not_poison_followers(self):
+        """Only the leader sees its own error; followers retry"""
+        calls = []
+        def flaky():
+            calls.append(1)
+            time.sleep(0.2)
+            if len(calls) == 1:
+                raise ValueError('leader failed')
+            return 'ok'
+        results, errors = self._run_concurrently(SingleFlight(), flaky)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual([result for result, _ in results], ['ok'] * 4)
+        self.assertEqual(len(calls), 2)
+
+    def test_follower_timeout_computes_itself(self):
+        """A follower stops waiting for a stuck leader"""
+        flight = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=('key', lambda: release.wait(5)))
+        leader.start()
+        time.sleep(0.05)
+        result, shared = flight.do('key', lambda: 'own', timeout=0.1)
+        release.set()
+        leader.join()
+        self.assertEqual((result, shared), ('own', False))
+
+    def test_follower_deadline_shorter_than_timeout(self):
+        """A follower with a short deadline gives up at its deadline and never computes"""
+        flight = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=('key', lambda: release.wait(5)))
+        leader.start()
+        time.sleep(0.05)
+        calls = []
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            flight.do('key', lambda: calls.append(1), timeout=30, deadline=time.monotonic() + 0.1)
+        waited = time.monotonic() - started
+        release.set()
+        leader.join()
+        self.assertLess(waited, 1)
+        self.assertEqual(calls, [])
+
+class TestAdmissionController(unittest.TestCase):
+    def _hold_slot(self, controller):
+        release = threading.Event()
+        holder = threading.Thread(target=controller.run, args=(lambda: release.wait(5),))
+        holder.start()
+        time.sleep(0.05)
+        return release, holder
+
+    def test_priority_order(self):
+        """Interactive calls queued after batch calls still run first"""
+        controller = AdmissionController(concurrency=1, max_queue=10)
+        release, holder = self._hold_slot(controller)
+        order = []
+        waiters = []
+        for name in ('batch', 'batch', 'interactive'):
+            t = threading.Thread(target=controller.run,
+                                 args=(lambda n=name: order.append(n),), kwargs={'priority': name})
+            t.start()
+            waiters.append(t)
+            time.sleep(0.02)
+        self.assertEqual(controller.depth(), 3)
+        release.set()
+        for t in [holder] + waiters:
+            t.join()
+        self.assertEqual(order, ['interactive', 'batch', 'batch'])
+
+    def test_queue_full_and_deadline(self):
+        """Calls beyond the queue bound are rejected; expired waiters never run"""
+        controller = AdmissionController(concurrency=1, max_queue=1)
+        release, holder = self._hold_slot(controller)
+        ran = []
+        with self.assertRaises(DeadlineExceeded):
+            controller.run(lambda: ran.append(1), deadline=time.monotonic() + 0.05)
+        waiter = threading.Thread(target=controller.run, args=(lambda: ran.append(2),))
+        waiter.start()
+        time.sleep(0.02)
+        with self.assertRaises(QueueFull):
+            controller.run(lambda: ran.append(3))
+        # Background work is never shed
+        background = threading.Thread(target=controller.run, args=(lambda: ran.append(4),),
+                                      kwargs={'priority': 'background', 'shed': False})
+        background.start()
+        release.set()
+        for t in (holder, waiter, background):
+            t.join()
+        self.assertEqual(ran, [2, 4])
+
+    def test_unshed_background_waiters_do_not_block_interactive(self):
+        """Background waiters past the queue bound never cause an interactive QueueFull"""
+        controller = AdmissionController(concurrency=1, max_queue=2)
+        release, holder = self._hold_slot(controller)
+        ran = []
+        waiters = [threading.Thread(target=controller.run, args=(lambda i=i: ran.append(f'bg{i}'),),
+                                    kwargs={'priority': 'background', 'shed': False}) for i in range(4)]
+        for t in waiters:
+            t.start()
+        time.sleep(0.05)
+        self.assertEqual(controller.depth(), 4)
+        with self.assertRaises(QueueFull):
+            controller.run(lambda: ran.append('late-bg'), priority='background')
+        interactive = threading.Thread(target=controller.run, args=(lambda: ran.append('interactive'),))
+        interactive.start()
+        time.sleep(0.02)
+        release.set()
+        for t in [holder, interactive] + waiters:
+            t.join()
+        self.assertEqual(ran[0], 'interactive')
+        self.assertEqual(len(ran), 5)
+
+class TestJobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'jobs.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_expired_claims_are_resumed_after_restart(self):
+        """Items leased by a dead worker are picked up by the next one"""
+        store = JobStore(self.db_path, lease_seconds=0.05)
+        job_id = store.create_job([('a.png', b'1'), ('b.png', b'2')])
+        self.assertEqual(len(store.claim_items(job_id, 'dead-worker', 10)), 2)
+        time.sleep(0.1)
+
+        restarted = JobStore(self.db_path, lease_seconds=0.05)
+        self.assertEqual(restarted.get_job(job_id)['status'], 'running')
+        items = restarted.claim_items(job_id, 'new-worker', 10)
+        self.assertEqual([seq for seq, _, _ in items], [0, 1])
+        restarted.save_results(job_id, [(seq, {'prediction': 'x'}) for seq, _, _ in items])
+        self.assertEqual(restarted.get_job(job_id)['status'], 'completed')
+
+    def test_stale_claim_cannot_count_results_twice(self):
+        """A batch that outlived its lease does not store results for re-claimed items"""
+        store = JobStore(self.db_path, lease_seconds=0.05)
+        job_id = store.create_job([('a.png', b'1'), ('b.png', b'2')])
+        store.claim_items(job_id, 'slow', 10)
+        time.sleep(0.1)
+        store.claim_items(job_id, 'fast', 10)
+        self.assertEqual(store.save_results(job_id, [(0, {'prediction': 'x'}), (1, {'prediction': 'x'})], 'fast'), 2)
+        self.assertEqual(store.save_results(job_id, [(0, {'error': 'x'}), (1, {'error': 'x'})], 'slow'), 0)
+        job = store.get_job(job_id)
+        self.assertEqual((job['done'], job['failed'], job['status']), (2, 0, 'completed'))
+
+    def test_failing_batch_gives_up_after_max_attempts(self):
+        """Items whose batch keeps raising are marked failed instead of retried forever"""
+        store = JobStore(self.db_path, max_attempts=2)
+        job_id = store.create_job([('a.png', b'1')])
+        calls = []
+        def broken(items):
+            calls.append(1)
+            raise RuntimeError('model crashed')
+        executor = JobExecutor(store, broken)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                executor.run_once()
+        self.assertFalse(executor.run_once())
+        self.assertEqual(len(calls), 2)
+        job = store.get_job(job_id)
+        self.assertEqual((job['done'], job['failed'], job['status']), (1, 1, 'completed'))
+        self.assertIn('2 attempts', next(store.iter_results(job_id))['error'])
+
+    def test_purge_finished_keeps_open_and_recent_jobs(self):
+        """Only completed jobs past the retention period are deleted, with their items"""
+        store = JobStore(self.db_path)
+        finished = store.create_job([('a.png', b'1')])
+        store.save_results(finished, [(0, {'prediction': 'x'})])
+        still_open = store.create_job([('b.png', b'2')])
+        self.assertEqual(store.purge_finished(older_than=3600), 0)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE jobs SET updated = '2000-01-01 00:00:00'")
+        conn.commit()
+        self.assertEqual(store.purge_finished(older_than=3600), 1)
+        self.assertIsNone(store.get_job(finished))
+        self.assertEqual(list(store.iter_results(finished)), [])
+        self.assertEqual(store.get_job(still_open)['status'], 'queued')
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM job_items').fetchone()[0], 1)
+
+        # The executor sweeps at most once per purge_every
+        for _ in range(2):
+            job_id = store.create_job([('c.png', b'3')])
+            store.save_results(job_id, [(0, {'prediction': 'x'})])
+            conn.execute("UPDATE jobs SET updated = '2000-01-01 00:00:00' WHERE id = ?", (job_id,))
+            conn.commit()
+        conn.close()
+        executor = JobExecutor(store, lambda items: [], retention=3600, purge_every=3600)
+        self.assertEqual(executor.purge_if_due(), 2)
+        job_id = store.create_job([('d.png', b'4')])
+        store.save_results(job_id, [(0, {'prediction': 'x'})])
+        self.assertEqual(executor.purge_if_due(), 0)
+
+class TestMemoryTools(unittest.TestCase):
+    def test_recycler_limits(self):
+        """Recycling triggers once, at the request or RSS limit"""
+        recycler = WorkerRecycler(max_requests=3)
+        reasons = [recycler.request_finished() for _ in range(5)]
+        self.assertEqual(reasons[:2], [None, None])
+        self.assertIn('3 requests', reasons[2])
+        self.assertEqual(reasons[3:], [None, None])
+
+        recycler = WorkerRecycler(max_rss_mb=1, check_every=1)
+        self.assertIn('RSS', recycler.request_finished())
+
+    def test_tracemalloc_growth_report(self):
+        """Allocation growth since the baseline points at the leaking line"""
+        import tracemalloc
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(1)
+        monitor = MemoryMonitor()
+        try:
+            monitor.sample()
+            leak = [bytearray(1024) for _ in range(2000)]
+            report = monitor.report(top=3)
+            self.assertTrue(report['tracemalloc'])
+            self.assertIn('test_app.py', report['growth_since_start'][0]['site'])
+            del leak
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+class TestLatencyRollup(unittest.TestCase):
+    def test_percentiles_from_histogram(self):
+        """Rollup percentiles stay within one bucket (10%) of the exact value"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            rollup = LatencyRollup(os.path.join(tmpdir, 'p.db'), flush_every=50)
+            latencies = np.linspace(1, 100, 1000)
+            for ms in latencies:
+                rollup.add('2024-01-01 10:15:00', {'total_ms': ms, 'format': 'png'})
+            group, = rollup.percentiles('format', 'total', percentiles=(50, 99))
+            self.assertEqual(group['count'], 1000)
+            self.assertAlmostEqual(group['p50_ms'], np.percentile(latencies, 50), delta=5.1)
+            self.assertAlmostEqual(group['p99_ms'], np.percentile(latencies, 99), delta=10)
+            self.assertEqual(rollup.percentiles('format', 'total', since='2024-01-02'), [])
+
+class TestCascade(unittest.TestCase):
+    def test_only_uncertain_rows_reach_full_model(self):
+        """Confident stage-1 rows exit early; the rest are replaced by the full model"""
+        small = np.array([[0.9, 0.1], [0.55, 0.45], [0.2, 0.8]], dtype=np.float32)
+        seen = []
+        def full_fn(batch):
+            seen.append(batch.copy())
+            return np.array([[0.0, 1.0]] * len(batch))
+        batch = np.arange(3).reshape(3, 1)
+        predictions, escalated = cascade_predict(batch, lambda b: small, full_fn, threshold=0.7)
+        self.assertEqual(escalated.tolist(), [False, True, False])
+        np.testing.assert_array_equal(seen[0], [[1]])
+        np.testing.assert_allclose(predictions, [[0.9, 0.1], [0.0, 1.0], [0.2, 0.8]])
+
+    def test_tradeoff_table(self):
+        """Higher thresholds escalate more and cost more"""
+        small = np.array([[0.9, 0.1], [0.6, 0.4], [0.3, 0.7]])
+        full = np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]])
+        rows = cascade_tradeoff(small, full, np.array([0, 1, 1]), 1.0, 10.0, [0.0, 0.65, 1.01])
+        self.assertEqual([r['escalation_rate'] for r in rows], [0.0, 0.3333, 1.0])
+        self.assertEqual([r['accuracy'] for r in rows], [0.6667, 1.0, 1.0])
+        self.assertEqual(rows[-1]['avg_ms'], 11.0)
+
+class TestResolutionTiers(unittest.TestCase):
+    def test_requested_tier_is_a_ceiling(self):
+        self.assertEqual(choose_tier([224, 160, 128]), (224, False))
+        self.assertEqual(choose_tier([224, 160, 128], requested=200), (160, False))
+        self.assertEqual(choose_tier([224, 160, 128], requested=64), (128, False))
+
+    def test_load_moves_to_cheaper_tiers(self):
+        tiers = [128, 224, 160]
+        self.assertEqual(choose_tier(tiers, load=0.6), (160, True))
+        self.assertEqual(choose_tier(tiers, load=0.9), (128, True))
+        self.assertEqual(choose_tier(tiers, requested=128, load=0.9), (128, False))
+        self.assertEqual(choose_tier([224], load=1.0), (224, False))
+
+    def test_parse_tier(self):
+        self.assertIsNone(parse_tier('auto'))
+        self.assertIsNone(parse_tier(None))
+        self.assertEqual(parse_tier('160'), 160)
+        with self.assertRaises(ValueError):
+            parse_tier('-1')
+
+class TestModelReport(unittest.TestCase):
+    def test_pareto_front(self):
+        """A model beaten on every objective is not on the front"""
+        rows = [{'model': 'full', 'b1_ms': 30.0, 'accuracy': 0.97},
+                {'model': 'student', 'b1_ms': 12.0, 'accuracy': 0.95},
+                {'model': 'bad', 'b1_ms': 35.0, 'accuracy': 0.94},
+                {'model': 'student_copy', 'b1_ms': 12.0, 'accuracy': 0.95}]
+        pareto_front(rows, minimize=('b1_ms',), maximize=('accuracy',))
+        self.assertEqual([r['pareto'] for r in rows], [True, True, False, True])
+
+    def test_measure_latency_and_table(self):
+        calls = []
+        timings = measure_latency(calls.append, 'batch', warmup=2, runs=5)
+        self.assertEqual(len(calls), 7)
+        self.assertLessEqual(timings['p50_ms'], timings['p90_ms'])
+        table = format_table([{'model': 'a', 'ms': 1.23456}], [('model', 'model'), ('ms', 'ms')])
+        self.assertIn('1.235', table)
+
+class TestModelCache(unittest.TestCase):
+    def test_lru_eviction_within_budget(self):
+        """Least recently used models are evicted once the budget is exceeded"""
+        loads = []
+        cache = ModelCache(lambda key: loads.append(key) or key.upper(), max_bytes=2, size_of=lambda m: 1)
+        self.assertEqual(cache.get('a'), 'A')
+        cache.get('b')
+        cache.get('a')  # 'b' is now least recently used
+        cache.get('c')
+        snapshot = cache.snapshot()
+        self.assertEqual([m['key'] for m in snapshot['resident']], ['c', 'a'])
+        self.assertEqual([(e['event'], e['key']) for e in snapshot['events']],
+                         [('load', 'a'), ('load', 'b'), ('load', 'c'), ('evict', 'b')])
+        cache.get('b')
+        self.assertEqual(loads, ['a', 'b', 'c', 'b'])
+
+    def test_concurrent_first_requests_load_once(self):
+        loads = []
+        def loader(key):
+            loads.append(key)
+            time.sleep(0.1)
+            return object()
+        cache = ModelCache(loader, max_bytes=100, size_of=lambda m: 1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('tomato'))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(loads, ['tomato'])
+        self.assertEqual(len(set(map(id, results))), 1)
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def test_chunked_search_matches_brute_force(self):
+        """Top-k over several chunks equals an exact search, and appends are visible"""
+        path = tempfile.mkdtemp()
+        try:
+            rng = np.random.default_rng(0)
+            vectors = rng.normal(size=(1000, 16)).astype(np.float32)
+            index = EmbeddingIndex(path, dim=16, signature_dim=8, chunk_rows=128)
+            index.add(list(range(500)), vectors[:500])
+            self.assertEqual(len(index), 500)
+            index.search(vectors[0])  # maps the first 500 rows
+            # A second writer process appends to its own shard
+            EmbeddingIndex(path, dim=16, writer='other').add(list(range(500, 1000)), vectors[500:])
+            query = vectors[42] + 0.01
+            unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            expected = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:5].tolist()
+            self.assertEqual([i for i, _ in index.search(query, k=5)], expected)
+            self.assertEqual([i for i, _ in index.search(query, k=5, exclude=[42])][0], expected[1])
+            np.testing.assert_allclose(index.vector(999), unit[999], atol=1e-3)
+            self.assertIsNone(index.vector(5000))
+
+            # Signature search + re-rank finds the same neighbors here
+            index.exact_below = 0
+            self.assertEqual([i for i, _ in index.search(query, k=5, candidates=200)], expected)
+            self.assertNotIn(42, [i for i, _ in index.search(query, k=5, exclude=[42])])
+        finally:
+            shutil.rmtree(path)
+
+class TestExplain(unittest.TestCase):
+    def test_micro_batcher_groups_concurrent_items(self):
+        """Items submitted together are processed in one call, failures reach every caller"""
+        calls = []
+        batcher = MicroBatcher(lambda items: calls.append(list(items)) or [i * 2 for i in items],
+                               max_batch=4, max_wait=0.2)
+        futures = [batcher.submit(i) for i in range(6)]
+        self.assertEqual([f.result(timeout=5) for f in futures], [0, 2, 4, 6, 8, 10])
+        self.assertEqual([len(c) for c in calls], [4, 2])
+
+        failing = MicroBatcher(lambda items: 1 / 0, max_wait=0)
+        with self.assertRaises(ZeroDivisionError):
+            failing.submit(1).result(timeout=5)
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        """The cache stays under its budget and keeps recently read entries"""
+        path = tempfile.mkdtemp()
+        try:
+            cache = DiskCache(path, max_bytes=3000)
+            for name in 'abc':
+                cache.put(name, b'x' * 1000)
+                time.sleep(0.01)
+            self.assertIsNotNone(cache.get('a'))  # now the most recent
+            cache.put('d', b'x' * 1000)
+            self.assertLessEqual(cache.size(), 3000)
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNone(cache.get('b'))
+        finally:
+            shutil.rmtree(path)
+
+    def test_array_lru_and_overlay(self):
+        """Array cache is bounded by bytes; overlays keep the image size and carry text"""
+        cache = ArrayLRU(max_bytes=200)
+        cache.put('a', np.zeros(100, np.uint8))
+        cache.put('b', np.zeros(100, np.uint8))
+        cache.get('a')
+        cache.put('c', np.zeros(100, np.uint8))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+
+        png = overlay_png(np.zeros((32, 48, 3), np.uint8), np.eye(4), text={'class': 'Tomato'})
+        image = Image.open(io.BytesIO(png))
+        self.assertEqual(image.size, (48, 32))
+        self.assertEqual(image.text['class'], 'Tomato')
+
+class TestFrames(unittest.TestCase):
+    def test_multipart_parts_arrive_across_chunk_boundaries(self):
+        """Parts are split correctly whatever the read size, CRLFs in a body included"""
+        body = (b'preamble\r\n--B\r\nContent-Disposition: form-data; name="frame"\r\n\r\nfirst\r\n-B'
+                b'\r\n--B\r\nContent-Type: image/jpeg\r\n\r\nsecond\r\n--B--\r\n')
+        for chunk_size in (1, 3, 7, 1024):
+            parts = list(iter_multipart(io.BytesIO(body), 'B', 1024, chunk_size=chunk_size))
+            self.assertEqual([part for _, part in parts], [b'first\r\n-B', b'second'])
+            self.assertEqual(parts[1][0], {'content-type': 'image/jpeg'})
+        with self.assertRaises(ValueError):
+            list(iter_multipart(io.BytesIO(body), 'B', 4, chunk_size=3))
+
+    def test_dhash_ignores_noise_but_not_new_scenes(self):
+        """Small pixel noise moves a few bits; another image moves many"""
+        rng = np.random.default_rng(0)
+        scene = np.kron(rng.integers(0, 256, (8, 9, 3)), np.ones((16, 16, 1))).astype(np.uint8)
+        noisy = np.clip(scene + rng.integers(-4, 5, scene.shape), 0, 255).astype(np.uint8)
+        other = np.kron(rng.integers(0, 256, (8, 9, 3)), np.ones((16, 16, 1))).astype(np.uint8)
+        base = dhash(Image.fromarray(scene))
+        self.assertLessEqual(hamming(base, dhash(Image.fromarray(noisy))), 4)
+        self.assertGreater(hamming(base, dhash(Image.fromarray(other))), 16)
+
+        skipper = FrameSkipper(threshold=4)
+        self.assertFalse(skipper.is_duplicate(base))
+        skipper.keep(base)
+        self.assertTrue(skipper.is_duplicate(dhash(Image.fromarray(noisy))))
+
+class TestTrainingLog(unittest.TestCase):
+    def test_epoch_summary_flags_input_stalls(self):
+        """Steps are logged to CSV and an epoch waiting on input is flagged"""
+        path = tempfile.mkdtemp()
+        try:
+            log = TrainingLog(path, stall_threshold=0.2)
+            for step in range(4):
+                log.record_step(0, step, 0.001, 0.099, 32, 200 * 1024 * 1024)
+            summary = log.end_epoch(0, checkpoint_s=1.5, metrics={'loss': 0.5})
+            self.assertFalse(summary['input_bound'])
+            self.assertEqual(summary['images'], 128)
+            self.assertAlmostEqual(summary['images_per_s'], 320, delta=1)
+            self.assertEqual(summary['checkpoint_s'], 1.5)
+
+            log.record_step(1, 0, 0.06, 0.04, 32, 0)
+            log.record_step(1, 1, 0.0, 0.1, 32, 0)
+            summary = log.end_epoch(1)
+            self.assertTrue(summary['input_bound'])
+            self.assertEqual(summary['stalled_steps'], 1)
+            log.close()
+
+            with open(os.path.join(path, 'steps.csv')) as f:
+                self.assertEqual(len(f.read().splitlines()), 7)
+            with open(os.path.join(path, 'epochs.jsonl')) as f:
+                epochs = [json.loads(line) for line in f]
+            self.assertEqual([e['epoch'] for e in epochs], [0, 1])
+            self.assertEqual(epochs[0]['metrics'], {'loss': 0.5})
+        finally:
+            shutil.rmtree(path)
+
+class TestCluster(unittest.TestCase):
+    def test_local_cluster_roles(self):
+        """Local TF_CONFIGs describe one cluster with worker 0 as chief"""
+        ports = free_ports(3)
+        self.assertEqual(len(set(ports)), 3)
+        roles = [task_info(local_tf_config(ports, i)) for i in range(3)]
+        self.assertEqual([r['is_chief'] for r in roles], [True, False, False])
+        self.assertEqual({r['num_workers'] for r in roles}, {3})
+        self.assertTrue(task_info('')['is_chief'])
+        with_chief = json.dumps({'cluster': {'chief': ['a:1'], 'worker': ['b:1']},
+                                 'task': {'type': 'worker', 'index': 0}})
+        self.assertFalse(task_info(with_chief)['is_chief'])
+        self.assertEqual(task_info(with_chief)['num_workers'], 2)
+
+    def test_shards_are_disjoint_and_equal(self):
+        """Every worker gets the same number of items and no item twice"""
+        items = list(range(10))
+        shards = [shard_items(items, 3, i) for i in range(3)]
+        self.assertEqual([len(shard) for shard in shards], [3, 3, 3])
+        self.assertEqual(sorted(sum(shards, [])), list(range(9)))
+        self.assertAlmostEqual(scaled_learning_rate(0.001, 128, 32), 0.004)
+
+class TestTrafficCapture(unittest.TestCase):
+    def test_archive_budget(self):
+        """Identical uploads are stored once and capture stops at the size budget"""
+        path = tempfile.mkdtemp()
+        try:
+            capture = TrafficCapture(path, sample_rate=1.0, max_bytes=250)
+            self.assertIsNotNone(capture.record(b'a' * 100, {'time': 2.0}))
+            self.assertIsNotNone(capture.record(b'a' * 100, {'time': 1.0}))
+            self.assertIsNotNone(capture.record(b'b' * 100, {'time': 3.0}))
+            self.assertIsNone(capture.record(b'c' * 100, {'time': 4.0}))
+            self.assertTrue(capture.full)
+            self.assertFalse(capture.sample())
+            self.assertEqual([r['time'] for r in load_capture(path)], [1.0, 2.0, 3.0])
+        finally:
+            shutil.rmtree(path)
+
+class TestSyntheticBackend(unittest.TestCase):
+    def test_profile_controls_cost_and_outputs(self):
+        """Latency follows the profile and outputs depend only on the input"""
+        profile = load_profile()
+        profile['latency_ms'].update(base=20, per_image=5)
+        profile['class_weights'] = [0, 1, 0, 3]
+        profile['confidence'].update(low=0.6, high=0.7)
+        backend = SyntheticBackend(profile, 4)
+        batch = np.random.default_rng(0).random((4, 8, 8, 3), dtype=np.float32)
+        started = time.perf_counter()
+        first = backend.predict(batch)
+        self.assertGreaterEqual((time.perf_counter() - started) * 1000, 40 * 0.95)
+        np.testing.assert_array_equal(backend.predict(batch), first)
+        np.testing.assert_array_equal(backend.predict(batch[2:3]), first[2:3])
+        self.assertTrue(set(first.argmax(axis=1)) <= {1, 3})
+        self.assertTrue(np.all((first.max(axis=1) >= 0.6) & (first.max(axis=1) <= 0.7)))
+        np.testing.assert_allclose(first.sum(axis=1), 1, rtol=1e-5)
+        with self.assertRaises(ValueError):
+            SyntheticBackend(dict(profile, class_weights=[1, 1]), 4)
+
+    def test_fit_profile_from_measurements(self):
+        """A profile fitted to measurements reproduces the batch latency line"""
+        profile = fit_profile({1: [12.0, 12.0], 9: [28.0, 28.0]}, {1: 10.0, 9: 50.0}, resident_mb=80,
+                              confidences=np.linspace(0.5, 1.0, 101), predicted=[0, 0, 2], num_classes=3)
+        self.assertAlmostEqual(profile['latency_ms']['base'], 10, places=2)
+        self.assertAlmostEqual(profile['latency_ms']['per_image'], 2, places=2)
+        # CPU is capped at the wall time of the single burning thread
+        self.assertAlmostEqual(profile['cpu_ms']['per_image'], 2.25, places=2)
+        self.assertEqual(profile['class_weights'], [3, 1, 2])
+        self.assertLess(profile['confidence']['low'], profile['confidence']['high'])
+
+class TestEvaluationMetrics(unittest.TestCase):
+    def test_confusion_matrix_and_per_class_metrics(self):
+        """Per-class precision/recall match a hand count; absent classes are 0, not NaN"""
+        labels = [0, 0, 0, 1, 1, 2]
+        predicted = [0, 0, 1, 1, 0, 2]
+        matrix = confusion_matrix(labels, predicted, 4)
+        self.assertEqual(matrix.tolist(), [[2, 1, 0, 0], [1, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]])
+        metrics = per_class_metrics(matrix)
+        np.testing.assert_allclose(metrics['precision'], [2 / 3, 1 / 2, 1, 0])
+        np.testing.assert_allclose(metrics['recall'], [2 / 3, 1 / 2, 1, 0])
+        self.assertEqual(metrics['support'].tolist(), [3, 2, 1, 0])
+
+    def test_top_k_and_calibration(self):
+        """Top-k counts near misses; a perfectly calibrated bin has no error"""
+        probabilities = np.array([[0.5, 0.3, 0.2], [0.1, 0.6, 0.3], [0.2, 0.2, 0.6], [0.7, 0.2, 0.1]])
+        labels = np.array([1, 1, 2, 2])
+        self.assertEqual(top_k_accuracy(probabilities, labels, 1), 0.5)
+        self.assertEqual(top_k_accuracy(probabilities, labels, 2), 0.75)
+        self.assertEqual(top_k_accuracy(probabilities, labels, 3), 1.0)
+
+        confident = np.tile([0.8, 0.2], (10, 1))
+        ece, bins = expected_calibration_error(confident, np.array([0] * 8 + [1] * 2), bins=10)
+        self.assertAlmostEqual(ece, 0.0)
+        self.assertEqual(bins, [{'lower': 0.8, 'upper': 0.9, 'count': 10, 'accuracy': 0.8, 'confidence': 0.8}])
+        ece, _ = expected_calibration_error(confident, np.ones(10, dtype=int), bins=10)
+        self.assertAlmostEqual(ece, 0.8)
+
+class TestPrecision(unittest.TestCase):
+    def test_quantize_round_trip(self):
+        """Integer TFLite inputs are quantized and clipped; float inputs only change dtype"""
+        detail = {'dtype': np.int8, 'quantization': (1 / 255, -128)}
+        batch = np.array([[0.0, 0.6, 1.0, 2.0]], dtype=np.float32)
+        quantized = quantize(batch, detail)
+        self.assertEqual(quantized.dtype, np.int8)
+        self.assertEqual(quantized.tolist(), [[-128, 25, 127, 127]])
+        np.testing.assert_allclose(dequantize(quantized, detail)[0, :3], batch[0, :3], atol=1 / 255)
+        self.assertEqual(quantize(batch, {'dtype': np.float32, 'quantization': (0.0, 0)}).dtype, np.float32)
+
+    def test_agreement_with_float32(self):
+        """Top-1 agreement and confidence drift against the float32 probabilities"""
+        reference = np.array([[0.9, 0.1], [0.6, 0.4], [0.2, 0.8]])
+        candidate = np.array([[0.85, 0.15], [0.45, 0.55], [0.2, 0.8]])
+        report = agreement(reference, candidate)
+        self.assertAlmostEqual(report['top1_agreement'], 2 / 3, places=3)
+        self.assertAlmostEqual(report['confidence_delta_max'], 0.15)
+
+    def test_unknown_precision_is_rejected(self):
+        """A misspelt MODEL_PRECISION fails at load time instead of serving float32"""
+        app.config['MODEL_PRECISION'] = 'float8'
+        try:
+            with self.assertRaises(ValueError):
+                load_model()
+        finally:
+            app.config.pop('MODEL_PRECISION')
+
+class TestCpuTuning(unittest.TestCase):
+    def test_thread_plan_splits_cores(self):
+        """Workers share the cores instead of each taking all of them"""
+        plan = thread_plan(cores=8, workers=4)
+        self.assertEqual(plan['intra_op'], 2)
+        self.assertEqual(plan['inter_op'], 1)
+        self.assertEqual(thread_plan(cores=2, workers=4)['intra_op'], 1)
+        self.assertEqual(thread_plan(cores=16, workers=2)['inter_op'], 2)
+
+    def test_worker_cpus_disjoint(self):
+        """Pinned workers get non-overlapping core sets"""
+        cores = list(range(8))
+        sets = [worker_cpus(slot, cores, 4) for slot in range(4)]
+        self.assertEqual(set().union(*sets), set(cores))
+        self.assertEqual(sum(len(s) for s in sets), 8)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,250 @@
+# Multi-worker data-parallel training on CPU
+#
+# Every worker process runs `train_distributed.py worker` with TF_CONFIG
+# describing the cluster (the standard tf.distribute cluster spec, e.g. set
+# by the job scheduler on each training node). Gradients are all-reduced
+# with MultiWorkerMirroredStrategy's ring collectives; each worker reads its
+# own shard of the images, the learning rate is scaled with the global batch
+# size, and only the chief writes checkpoints and the final model.
+#
+# Usage:
+#   # one worker of a multi-host cluster (TF_CONFIG set per host)
+#   python train_distributed.py worker --train data/train --val data/val
+#   # N processes on this machine, on free localhost ports
+#   python train_distributed.py launch --workers 4 --train data/train --val data/val
+#   # throughput from 1 to N local workers on synthetic batches
+#   python train_distributed.py bench --workers 1,2,4,8
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from utils.cluster import free_ports, local_tf_config, scaled_learning_rate, shard_items, task_info
+from utils.cpu_tuning import available_cores, configure_thread_env
+from utils.model_report import format_table
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+SHUFFLE_SEED = 1337
+
+def list_image_folder(directory):
+    """Sorted (paths, labels, class names) of a labelled directory, one sub-folder per class"""
+    class_names = sorted(name for name in os.listdir(directory)
+                         if os.path.isdir(os.path.join(directory, name)))
+    paths, labels = [], []
+    for label, name in enumerate(class_names):
+        for root, _, files in sorted(os.walk(os.path.join(directory, name))):
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, filename))
+                    labels.append(label)
+    return paths, labels, class_names
+
+def folder_dataset_fn(tf, directory, global_batch, img_size, shuffle=False):
+    """
+    Dataset function for distribute_datasets_from_function
+
+    Files are split between input pipelines (one per worker) before they
+    are read, so every image is decoded by exactly one worker. Decoding and
+    scaling match train_model.load_image_folder.
+    """
+    paths, labels, class_names = list_image_folder(directory)
+
+    def dataset_fn(context):
+        shard = shard_items(list(zip(paths, labels)), context.num_input_pipelines, context.input_pipeline_id)
+        dataset = tf.data.Dataset.from_tensor_slices(([path for path, _ in shard],
+                                                      [label for _, label in shard]))
+        if shuffle:
+            dataset = dataset.shuffle(len(shard), seed=SHUFFLE_SEED + context.input_pipeline_id)
+
+        def load(path, label):
+            image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+            image = tf.image.resize(image, (img_size, img_size)) / 255.0
+            return image, tf.one_hot(label, len(class_names))
+
+        batch = context.get_per_replica_batch_size(global_batch)
+        return (dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+                .batch(batch, drop_remainder=shuffle)
+                .prefetch(tf.data.AUTOTUNE))
+
+    return dataset_fn, class_names
+
+def synthetic_dataset_fn(tf, global_batch, steps, img_size, num_classes):
+    """Dataset function repeating one random batch, for scaling benchmarks"""
+    def dataset_fn(context):
+        batch = context.get_per_replica_batch_size(global_batch)
+        images = tf.random.stateless_uniform([batch, img_size, img_size, 3], seed=[context.input_pipeline_id, 0])
+        labels = tf.one_hot(tf.range(batch) % num_classes, num_classes)
+        return tf.data.Dataset.from_tensors((images, labels)).repeat(steps)
+    return dataset_fn
+
+def run_worker(args):
+    """Train as one worker of the cluster in TF_CONFIG"""
+    # Thread pools and CPU pinning must be set up before TensorFlow starts
+    plan = configure_thread_env()
+    import tensorflow as tf
+    import train_model as training
+
+    info = task_info()
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING))
+    global_batch = args.batch_per_worker * strategy.num_replicas_in_sync
+    learning_rate = scaled_learning_rate(args.base_lr, global_batch, training.BATCH_SIZE)
+    print(f"Worker {info['index']}/{info['num_workers']} ({'chief' if info['is_chief'] else 'worker'}), "
+          f"{plan['intra_op']} threads, global batch {global_batch}, learning rate {learning_rate:g}")
+
+    if args.synthetic:
+        num_classes = training.NUM_CLASSES
+        train_fn = synthetic_dataset_fn(tf, global_batch, args.steps, args.img_size, num_classes)
+        val_fn = synthetic_dataset_fn(tf, global_batch, 2, args.img_size, num_classes)
+        class_names = None
+    else:
+        train_fn, class_names = folder_dataset_fn(tf, args.train, global_batch, args.img_size, shuffle=True)
+        val_fn, _ = folder_dataset_fn(tf, args.val, global_batch, args.img_size)
+        num_classes = len(class_names)
+
+    with strategy.scope():
+        model = training.compile_model(training.create_model(args.img_size, num_classes), learning_rate)
+
+    # Every worker logs its own step timings; only the chief checkpoints
+    training.train_model(
+        model, train_fn, val_fn,
+        checkpoint_path=os.path.join(args.output, 'best_model.h5') if info['is_chief'] else None,
+        log_dir=worker_log_dir(args.output, info['index']),
+        epochs=args.epochs, strategy=strategy)
+
+    if info['is_chief'] and not args.synthetic:
+        model.save(os.path.join(args.output, 'model.h5'))
+        with open(os.path.join(args.output, 'class_names.json'), 'w') as f:
+            json.dump(class_names, f)
+
+def worker_log_dir(output, index):
+    return os.path.join(output, 'training_logs', f'worker-{index}')
+
+def worker_arguments(args):
+    """Command line for the workers started by the launcher"""
+    arguments = ['--epochs', str(args.epochs), '--batch-per-worker', str(args.batch_per_worker),
+                 '--base-lr', str(args.base_lr), '--img-size', str(args.img_size), '--output', args.output]
+    if args.train:
+        arguments += ['--train', args.train, '--val', args.val]
+    return arguments
+
+def launch(workers, worker_args, threads=None):
+    """
+    Run `workers` worker processes on localhost and wait for all of them
+
+    Each worker gets its own TF_CONFIG, worker slot and an equal share of
+    the cores (pinned, so the workers do not compete for the same CPUs).
+
+    Returns:
+        0 if every worker succeeded, otherwise the first failing exit code
+    """
+    ports = free_ports(workers)
+    processes = []
+    for index in range(workers):
+        env = dict(os.environ, TF_CONFIG=local_tf_config(ports, index),
+                   AGRIVISION_WORKERS=str(workers), AGRIVISION_WORKER_SLOT=str(index),
+                   AGRIVISION_CPU_AFFINITY='1')
+        if threads:
+            env['TF_NUM_INTRAOP_THREADS'] = str(threads)
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', *worker_args],
+                                          env=env))
+    running = list(processes)
+    while running:
+        for process in list(running):
+            code = process.poll()
+            if code is None:
+                continue
+            running.remove(process)
+            if code:
+                # A dead worker leaves the others blocked in collectives
+                for other in running:
+                    other.terminate()
+                for other in running:
+                    other.wait()
+                return code
+        time.sleep(0.5)
+    return 0
+
+def bench(args):
+    """
+    Synthetic-data throughput for each local worker count
+
+    Two epochs per run; the second is measured from the chief's step log
+    (steps are synchronous, so cluster throughput is the chief's times the
+    number of workers).
+    """
+    rows = []
+    for workers in (int(w) for w in args.workers.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            status = launch(workers, ['--synthetic', '--epochs', '2', '--steps', str(args.steps),
+                                      '--batch-per-worker', str(args.batch_per_worker),
+                                      '--img-size', str(args.img_size), '--output', tmp])
+            if status:
+                print(f"{workers} workers failed (exit code {status})")
+                continue
+            with open(os.path.join(worker_log_dir(tmp, 0), 'epochs.jsonl')) as f:
+                epoch = [json.loads(line) for line in f][-1]
+        rows.append({'workers': workers, 'threads_per_worker': max(1, available_cores() // workers),
+                     'global_batch': args.batch_per_worker * workers,
+                     'images_per_s': round(epoch['images_per_s'] * workers, 1),
+                     'input_wait': epoch['input_wait_fraction']})
+    if not rows:
+        return 1
+    baseline = rows[0]['images_per_s'] / rows[0]['workers']
+    for row in rows:
+        row['speedup'] = round(row['images_per_s'] / baseline, 2) if baseline else 0
+        row['efficiency'] = round(row['speedup'] / row['workers'], 2)
+    print(f"Data-parallel scaling ({available_cores()} cores, {args.batch_per_worker} images per worker step)")
+    print(format_table(rows, [('workers', 'workers'), ('threads_per_worker', 'threads'),
+                              ('global_batch', 'global batch'), ('images_per_s', 'images/s'),
+                              ('speedup', 'speedup'), ('efficiency', 'efficiency'),
+                              ('input_wait', 'input wait')]))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-worker data-parallel training')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    worker = commands.add_parser('worker', help='run one worker (cluster from TF_CONFIG)')
+    launcher = commands.add_parser('launch', help='run N workers on localhost')
+    launcher.add_argument('--workers', type=int, default=2)
+    launcher.add_argument('--threads', type=int, help='intra-op threads per worker (default: cores / workers)')
+    for command in (worker, launcher):
+        command.add_argument('--train', help='labelled training directory')
+        command.add_argument('--val', help='labelled validation directory')
+        command.add_argument('--epochs', type=int, default=25)
+        command.add_argument('--batch-per-worker', type=int, default=32)
+        command.add_argument('--base-lr', type=float, default=0.001,
+                             help='learning rate at the single-process batch size')
+        command.add_argument('--img-size', type=int, default=224)
+        command.add_argument('--output', default='model/distributed')
+    worker.add_argument('--synthetic', action='store_true', help='train on random batches')
+    worker.add_argument('--steps', type=int, default=50, help='steps per epoch with --synthetic')
+
+    benchmark = commands.add_parser('bench', help='scaling benchmark over local worker counts')
+    benchmark.add_argument('--workers', default='1,2,4')
+    benchmark.add_argument('--steps', type=int, default=30)
+    benchmark.add_argument('--batch-per-worker', type=int, default=32)
+    benchmark.add_argument('--img-size', type=int, default=224)
+    benchmark.add_argument('--output', help='write the rows as JSON here')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        return bench(args)
+    if not getattr(args, 'synthetic', False) and not (args.train and args.val):
+        parser.error('--train and --val are required')
+    if args.command == 'worker':
+        run_worker(args)
+        return 0
+    return launch(args.workers, worker_arguments(args), args.threads)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,13 @@ import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 import numpy as np
+import json
 import os
+import re
+import time
+
+from utils.memprof import current_rss
+from utils.training_log import TrainingLog
 
 # Configuration
 IMG_SIZE = 224
@@ -13,13 +19,25 @@ BATCH_SIZE = 32
 EPOCHS = 25
 NUM_CLASSES = 38  # PlantVillage dataset has 38 classes
 
-def create_model():
+# Early-exit cascade: a small first-stage model at lower resolution
+CASCADE_IMG_SIZE = 128
+CASCADE_ALPHA = 0.35
+
+# Cheaper sibling models served as resolution tiers next to the IMG_SIZE model
+TIER_SIZES = (128, 160)
+
+# CPU-optimized student distilled from the serving model
+STUDENT_ALPHA = 0.5
+DISTILL_TEMPERATURE = 4.0
+DISTILL_ALPHA = 0.1  # weight of the hard-label loss; the rest is the teacher's soft labels
+
+def create_model(img_size=IMG_SIZE, num_classes=NUM_CLASSES):
     """
     Create a CNN model for crop disease classification
     Using transfer learning with MobileNetV2
     """
     base_model = tf.keras.applications.MobileNetV2(
-        input_shape=(IMG_SIZE, IMG_SIZE, 3),
+        input_shape=(img_size, img_size, 3),
         include_top=False,
         weights='imagenet'
     )
@@ -34,21 +52,421 @@ def create_model():
         layers.Dropout(0.3),
         layers.Dense(256, activation='relu'),
         layers.Dropout(0.2),
-        layers.Dense(NUM_CLASSES, activation='softmax')
+        layers.Dense(num_classes, activation='softmax')
     ])
     
     return model
 
-def compile_model(model):
+def create_cascade_model():
+    """
+    Create the cheap first-stage model of the early-exit cascade
+
+    A narrow MobileNetV2 (width multiplier CASCADE_ALPHA) at CASCADE_IMG_SIZE.
+    The resize happens inside the model, so it takes the same 224x224 input
+    as the full model and the server can feed both stages the same batch.
+    """
+    base_model = tf.keras.applications.MobileNetV2(
+        input_shape=(CASCADE_IMG_SIZE, CASCADE_IMG_SIZE, 3),
+        alpha=CASCADE_ALPHA,
+        include_top=False,
+        weights='imagenet'
+    )
+    base_model.trainable = False
+
+    model = keras.Sequential([
+        layers.InputLayer(input_shape=(IMG_SIZE, IMG_SIZE, 3)),
+        layers.Resizing(CASCADE_IMG_SIZE, CASCADE_IMG_SIZE),
+        base_model,
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.2),
+        layers.Dense(NUM_CLASSES, activation='softmax')
+    ])
+
+    return model
+
+def load_image_folder(directory, img_size=IMG_SIZE, batch_size=BATCH_SIZE, shuffle=False,
+                      class_names=None):
+    """
+    Load a labelled directory (one sub-folder per class) as a dataset
+
+    Pixels are scaled to [0, 1] the same way app.py preprocesses uploads.
+    With class_names, only those sub-folders are read, labelled in that order.
+    """
+    dataset = tf.keras.utils.image_dataset_from_directory(
+        directory,
+        image_size=(img_size, img_size),
+        batch_size=batch_size,
+        label_mode='categorical',
+        class_names=class_names,
+        shuffle=shuffle
+    )
+    return dataset.map(lambda x, y: (x / 255.0, y)).prefetch(tf.data.AUTOTUNE)
+
+def calibrate_cascade_threshold(small_model, val_data, target_accuracy=0.98):
+    """
+    Pick the lowest stage-1 confidence threshold that is still safe
+
+    Among validation images whose stage-1 confidence is at or above the
+    threshold, stage-1 accuracy must reach `target_accuracy`; everything
+    below the threshold is escalated to the full model.
+
+    Args:
+        small_model: Trained first-stage model
+        val_data: Validation dataset with one-hot labels
+        target_accuracy: Required accuracy of early exits
+
+    Returns:
+        Threshold in [0, 1]
+    """
+    probs, labels = [], []
+    for images, one_hot in val_data:
+        probs.append(small_model.predict(images, verbose=0))
+        labels.append(np.argmax(one_hot.numpy(), axis=1))
+    probs, labels = np.concatenate(probs), np.concatenate(labels)
+    confidence = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == labels
+
+    # Accuracy of the exits for each candidate threshold, from most to least confident
+    order = np.argsort(-confidence)
+    exit_accuracy = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    safe = np.nonzero(exit_accuracy >= target_accuracy)[0]
+    if len(safe) == 0:
+        return 1.0  # never exit early
+    return float(confidence[order][safe[-1]])
+
+def save_cascade(small_model, threshold, output_dir='model'):
+    """Save the first-stage model and its calibrated threshold for app.py"""
+    small_model.save(os.path.join(output_dir, 'cascade_small.h5'))
+    with open(os.path.join(output_dir, 'cascade.json'), 'w') as f:
+        json.dump({'threshold': threshold, 'input_size': CASCADE_IMG_SIZE, 'alpha': CASCADE_ALPHA}, f, indent=2)
+    print(f"Cascade stage 1 saved with threshold {threshold:.3f}")
+
+def train_resolution_tiers(train_dir, val_dir, sizes=TIER_SIZES, output_dir='model'):
+    """
+    Train one sibling model per input resolution
+
+    Each tier is saved as model_<size>.h5, which app.py loads next to
+    model.h5 and uses when a client asks for that tier or the queue is long.
+
+    Returns:
+        Dict of size -> validation accuracy, to compare against the full model
+    """
+    accuracies = {}
+    for size in sizes:
+        print(f"\nTraining {size}px tier")
+        train_data = load_image_folder(train_dir, img_size=size, shuffle=True)
+        val_data = load_image_folder(val_dir, img_size=size)
+        model = compile_model(create_model(size))
+        train_model(model, train_data, val_data,
+                    checkpoint_path=os.path.join(output_dir, f'best_model_{size}.h5'),
+                    log_dir=os.path.join(output_dir, 'training_logs', f'tier_{size}'))
+        model.save(os.path.join(output_dir, f'model_{size}.h5'))
+        accuracies[size] = model.evaluate(val_data, verbose=0)[1]
+        print(f"{size}px tier validation accuracy: {accuracies[size]:.4f}")
+    return accuracies
+
+def create_student_model(img_size=IMG_SIZE, alpha=STUDENT_ALPHA):
+    """
+    Create a smaller student for distillation
+
+    A MobileNetV2 with width multiplier `alpha` and a linear head straight
+    from the pooled features (no 256-unit hidden layer). The backbone is
+    trainable: the student learns from the teacher rather than from
+    ImageNet features alone.
+    """
+    base_model = tf.keras.applications.MobileNetV2(
+        input_shape=(img_size, img_size, 3),
+        alpha=alpha,
+        include_top=False,
+        weights='imagenet'
+    )
+
+    model = keras.Sequential([
+        base_model,
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.2),
+        layers.Dense(NUM_CLASSES, activation='softmax')
+    ])
+
+    return model
+
+class Distiller(keras.Model):
+    """
+    Train a student on a mix of hard labels and the teacher's soft labels
+
+    Both models end in softmax, so their log-probabilities are used as
+    logits and softened with the temperature before comparing them.
+    """
+
+    def __init__(self, student, teacher, temperature=DISTILL_TEMPERATURE, alpha=DISTILL_ALPHA):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.temperature = temperature
+        self.alpha = alpha
+        self.hard_loss = keras.losses.CategoricalCrossentropy()
+        self.soft_loss = keras.losses.KLDivergence()
+        self.loss_tracker = keras.metrics.Mean(name='loss')
+        self.accuracy = keras.metrics.CategoricalAccuracy(name='accuracy')
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy]
+
+    def call(self, images, training=False):
+        return self.student(images, training=training)
+
+    def _soften(self, probs):
+        return tf.nn.softmax(tf.math.log(probs + 1e-8) / self.temperature)
+
+    def train_step(self, data):
+        images, labels = data
+        teacher_probs = self.teacher(images, training=False)
+        with tf.GradientTape() as tape:
+            student_probs = self.student(images, training=True)
+            hard = self.hard_loss(labels, student_probs)
+            # Scaled by T^2 so gradients keep their size as the temperature changes
+            soft = self.soft_loss(self._soften(teacher_probs), self._soften(student_probs))
+            loss = self.alpha * hard + (1 - self.alpha) * soft * self.temperature ** 2
+        gradients = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(gradients, self.student.trainable_variables))
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(labels, student_probs)
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        images, labels = data
+        student_probs = self.student(images, training=False)
+        self.loss_tracker.update_state(self.hard_loss(labels, student_probs))
+        self.accuracy.update_state(labels, student_probs)
+        return {m.name: m.result() for m in self.metrics}
+
+def distill_model(teacher, student, train_data, val_data, epochs=EPOCHS, learning_rate=1e-4):
+    """
+    Distill `teacher` (e.g. the loaded model/model.h5) into `student`
+
+    Returns:
+        The trained student, compiled for evaluation and export
+    """
+    distiller = Distiller(student, teacher)
+    distiller.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate))
+    distiller.fit(
+        train_data,
+        validation_data=val_data,
+        epochs=epochs,
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=5,
+                                                 restore_best_weights=True)]
+    )
+    return compile_model(student)
+
+def prunable_weights(model):
+    """Kernels of the Conv2D/DepthwiseConv2D/Dense layers, including nested models"""
+    kernels = []
+    for layer in model.layers:
+        if isinstance(layer, keras.Model):
+            kernels.extend(prunable_weights(layer))
+        elif isinstance(layer, layers.DepthwiseConv2D):
+            kernels.append(layer.depthwise_kernel)
+        elif isinstance(layer, (layers.Conv2D, layers.Dense)):
+            kernels.append(layer.kernel)
+    return kernels
+
+class KeepPruned(keras.callbacks.Callback):
+    """Re-apply pruning masks after every batch so fine-tuning cannot regrow weights"""
+
+    def __init__(self, masks):
+        super().__init__()
+        self.masks = masks
+
+    def on_train_batch_end(self, batch, logs=None):
+        for kernel, mask in self.masks:
+            kernel.assign(kernel * mask)
+
+def prune_model(model, train_data, val_data, sparsity=0.5, steps=3, epochs_per_step=1):
+    """
+    Magnitude pruning with fine-tuning
+
+    Sparsity is raised to the target in `steps` equal increments; at each
+    step the smallest-magnitude weights of every kernel are zeroed and the
+    model is fine-tuned with those weights held at zero. The model must be
+    compiled. Zeroed weights make the exported file compress well; they do
+    not by themselves speed up dense CPU kernels, so compare latency in
+    pareto_report.py rather than assuming it.
+
+    Returns:
+        The pruned model and its final fraction of zero weights
+    """
+    kernels = prunable_weights(model)
+    for step in range(1, steps + 1):
+        target = sparsity * step / steps
+        masks = []
+        for kernel in kernels:
+            values = kernel.numpy()
+            threshold = np.quantile(np.abs(values), target)
+            mask = (np.abs(values) > threshold).astype(values.dtype)
+            kernel.assign(values * mask)
+            masks.append((kernel, mask))
+        print(f"Pruning step {step}/{steps}: sparsity {target:.0%}")
+        model.fit(train_data, validation_data=val_data, epochs=epochs_per_step,
+                  callbacks=[KeepPruned(masks)])
+    zeros = sum(int(np.sum(kernel.numpy() == 0)) for kernel in kernels)
+    total = sum(int(np.prod(kernel.shape)) for kernel in kernels)
+    return model, zeros / total
+
+def crop_class_names(directory, crop):
+    """
+    Class folders of one crop, in the order app.py's CROP_CLASSES expects
+
+    `crop` is the short name used by the API's crop hint ('corn' for
+    'Corn_(maize)___...'); folders are matched on that prefix and sorted
+    like CLASS_NAMES.
+    """
+    names = sorted(os.listdir(directory))
+    return [name for name in names
+            if re.split(r'[_,(]', name.split('___')[0])[0].lower() == crop]
+
+def train_crop_specialist(crop, train_dir, val_dir, output_dir='model/crops'):
+    """
+    Train a specialist on one crop's classes
+
+    Saved as <output_dir>/<crop>.h5, which app.py loads on the first request
+    with that crop hint.
+
+    Returns:
+        Validation accuracy of the specialist
+    """
+    class_names = crop_class_names(train_dir, crop)
+    if len(class_names) < 2:
+        raise ValueError(f'Need at least two class folders for {crop}, found {class_names}')
+    train_data = load_image_folder(train_dir, shuffle=True, class_names=class_names)
+    val_data = load_image_folder(val_dir, class_names=class_names)
+    model = compile_model(create_model(num_classes=len(class_names)))
+    os.makedirs(output_dir, exist_ok=True)
+    train_model(model, train_data, val_data,
+                checkpoint_path=os.path.join(output_dir, f'best_{crop}.h5'),
+                log_dir=os.path.join(output_dir, 'training_logs', crop))
+    model.save(os.path.join(output_dir, f'{crop}.h5'))
+    accuracy = model.evaluate(val_data, verbose=0)[1]
+    print(f"{crop} specialist ({len(class_names)} classes) validation accuracy: {accuracy:.4f}")
+    return accuracy
+
+class TimedCheckpoint(keras.callbacks.ModelCheckpoint):
+    """ModelCheckpoint that records how long its end-of-epoch save took"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_save_s = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        started = time.perf_counter()
+        super().on_epoch_end(epoch, logs)
+        self.last_save_s = time.perf_counter() - started
+
+class TrainingMonitor(keras.callbacks.Callback):
+    """
+    Per-step input wait / compute split, throughput and memory while training
+
+    instrument(dataset) appends a pass-through map that timestamps each
+    batch as the training step receives it; the gap between the step's
+    start and that timestamp is the input wait, the rest of the step is
+    compute. Assumes one step per execution (the Keras default). Steps and
+    epoch summaries are written through utils.training_log.TrainingLog; an
+    epoch waiting on input for more than `stall_threshold` of its step time
+    prints a warning. With profile_steps=(start, stop), steps [start, stop)
+    are captured with the TensorFlow profiler into `profile_dir`
+    (view with TensorBoard).
+    """
+
+    def __init__(self, log_dir='model/training_logs', stall_threshold=0.2, checkpoint=None,
+                 profile_steps=None, profile_dir=None):
+        super().__init__()
+        self.log = TrainingLog(log_dir, stall_threshold)
+        self.checkpoint = checkpoint
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir or os.path.join(log_dir, 'profile')
+        self._ready = []
+        self._epoch = 0
+        self._global_step = 0
+        self._profiling = False
+
+    def _batch_ready(self, images):
+        self._ready.append((time.perf_counter(), int(images)))
+        return 0.0
+
+    def instrument(self, dataset):
+        """
+        Dataset with batch arrival timestamps for this monitor
+
+        Also accepts a dataset function for distribute_datasets_from_function,
+        returning a function whose datasets are instrumented.
+        """
+        if callable(dataset):
+            return lambda context: self.instrument(dataset(context))
+        def stamp(images, labels):
+            ready = tf.py_function(self._batch_ready, [tf.shape(images)[0]], tf.float64)
+            with tf.control_dependencies([ready]):
+                return tf.identity(images), labels
+        return dataset.map(stamp)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch = epoch
+        self.log.start_epoch()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.profile_steps and self._global_step == self.profile_steps[0]:
+            tf.profiler.experimental.start(self.profile_dir)
+            self._profiling = True
+        self._ready.clear()
+        self._step_started = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        finished = time.perf_counter()
+        total = finished - self._step_started
+        if self._ready:
+            ready, images = self._ready[-1]
+            wait = min(max(ready - self._step_started, 0.0), total)
+        else:
+            wait, images = 0.0, 0  # dataset not instrumented
+        self.log.record_step(self._epoch, batch, wait, total - wait, images, current_rss())
+        self._global_step += 1
+        if self._profiling and self._global_step >= self.profile_steps[1]:
+            self._stop_profiler()
+
+    def on_epoch_end(self, epoch, logs=None):
+        checkpoint_s = self.checkpoint.last_save_s if self.checkpoint is not None else None
+        summary = self.log.end_epoch(epoch, checkpoint_s, logs)
+        print(f"Epoch {epoch + 1}: {summary['images_per_s']} images/s, "
+              f"step p50 {summary['step_ms_p50']} ms "
+              f"(input wait {summary['input_wait_ms_mean']} ms, compute {summary['compute_ms_mean']} ms), "
+              f"RSS max {summary['rss_mb_max']} MB"
+              + (f", checkpoint {summary['checkpoint_s']} s" if checkpoint_s is not None else ''))
+        if summary['input_bound']:
+            print(f"WARNING: input pipeline stall: {summary['input_wait_fraction']:.0%} of step time "
+                  f"spent waiting for data ({summary['stalled_steps']} of {summary['steps']} steps). "
+                  "Consider more parallel map calls, cache() or a larger prefetch.")
+
+    def _stop_profiler(self):
+        tf.profiler.experimental.stop()
+        self._profiling = False
+
+    def on_train_end(self, logs=None):
+        if self._profiling:
+            self._stop_profiler()
+        self.log.close()
+
+def compile_model(model, learning_rate=0.001):
     """Compile the model with optimizer and loss function"""
     model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=0.001),
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
         loss='categorical_crossentropy',
         metrics=['accuracy']
     )
     return model
 
-def train_model(model, train_data, val_data):
+def train_model(model, train_data, val_data, checkpoint_path='model/best_model.h5',
+                log_dir='model/training_logs', stall_threshold=0.2, profile_steps=None,
+                epochs=EPOCHS, strategy=None):
     """
     Train the model with callbacks
     
@@ -56,7 +474,21 @@ def train_model(model, train_data, val_data):
         model: Keras model
         train_data: Training dataset
         val_data: Validation dataset
+        checkpoint_path: Where the best weights are checkpointed
+        log_dir: Where TrainingMonitor writes step timings (None to disable)
+        stall_threshold: Input-wait fraction of step time that triggers a warning
+        profile_steps: Optional (start, stop) global steps to capture with the profiler
+        epochs: Maximum number of epochs
+        strategy: Optional tf.distribute strategy; train_data and val_data are
+            then dataset functions (input_context -> dataset), see
+            train_distributed.py. checkpoint_path=None skips checkpointing
+            (non-chief workers).
     """
+    checkpoint = TimedCheckpoint(
+        checkpoint_path,
+        monitor='val_accuracy',
+        save_best_only=True
+    ) if checkpoint_path else None
     callbacks = [
         keras.callbacks.EarlyStopping(
             monitor='val_loss',
@@ -68,33 +500,119 @@ def train_model(model, train_data, val_data):
             factor=0.5,
             patience=3,
             min_lr=1e-7
-        ),
-        keras.callbacks.ModelCheckpoint(
-            'model/best_model.h5',
-            monitor='val_accuracy',
-            save_best_only=True
         )
     ]
+    if checkpoint is not None:
+        callbacks.append(checkpoint)
+    if log_dir:
+        # Last, so the checkpoint's save time is known when the epoch is summarized
+        monitor = TrainingMonitor(log_dir, stall_threshold, checkpoint, profile_steps)
+        train_data = monitor.instrument(train_data)
+        callbacks.append(monitor)
+    if strategy is not None:
+        train_data = strategy.distribute_datasets_from_function(train_data)
+        val_data = strategy.distribute_datasets_from_function(val_data)
     
     history = model.fit(
         train_data,
         validation_data=val_data,
-        epochs=EPOCHS,
+        epochs=epochs,
         callbacks=callbacks
     )
     
     return history
 
-def convert_to_tflite(model, output_path='model/model.tflite'):
-    """Convert Keras model to TensorFlow Lite format"""
+def convert_to_tflite(model, output_path='model/model.tflite', precision='int8', representative_data=None):
+    """
+    Convert Keras model to TensorFlow Lite format
+
+    Args:
+        precision: Weight storage: 'float32', 'float16', 'int8' (weights
+            quantized, activations float and dequantized on the fly; the
+            default) or 'int8-full' (integer weights, activations and
+            inputs/outputs; needs representative_data)
+        representative_data: Dataset of (images, labels) batches used to
+            calibrate activation ranges for 'int8-full'
+    """
+    if precision not in ('float32', 'float16', 'int8', 'int8-full'):
+        raise ValueError(f'Unknown TFLite precision {precision!r}')
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == 'int8-full':
+        if representative_data is None:
+            raise ValueError("precision='int8-full' needs representative_data")
+
+        def representative_dataset():
+            for images, _ in representative_data.take(100):
+                for image in images:
+                    yield [image[tf.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
     tflite_model = converter.convert()
     
     with open(output_path, 'wb') as f:
         f.write(tflite_model)
     
-    print(f"Model converted to TFLite and saved to {output_path}")
+    print(f"Model converted to TFLite ({precision}) and saved to {output_path}")
+
+def export_precision_variants(model, output_dir='model', representative_data=None):
+    """
+    Write the reduced-precision TFLite files app.py loads with
+    AGRIVISION_MODEL_PRECISION=tflite-fp16 / tflite-int8
+
+    With representative_data the int8 file is fully integer, otherwise it
+    has int8 weights only.
+    """
+    convert_to_tflite(model, os.path.join(output_dir, 'model_fp16.tflite'), precision='float16')
+    convert_to_tflite(model, os.path.join(output_dir, 'model_int8.tflite'),
+                      precision='int8-full' if representative_data is not None else 'int8',
+                      representative_data=representative_data)
+
+def export_bytes_model(model, export_dir='model/serving_bytes', img_size=IMG_SIZE):
+    """
+    Export a SavedModel that takes encoded image bytes
+
+    The serving signature decodes (JPEG/PNG/BMP/GIF), resizes and
+    normalizes inside the graph with TensorFlow's native kernels, so
+    app.py can pass upload bytes straight through without PIL.
+
+    Signature:
+        serving_default(images: string[N]) -> {'probabilities': float32[N, NUM_CLASSES],
+                                               'embeddings': float32[N, dim]}
+
+    'embeddings' is the penultimate Dense layer, the vector app.py adds to
+    the /similar index; it is left out for models with a single Dense layer.
+    """
+    dense = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Dense)]
+    if len(dense) >= 2:
+        # One forward pass for both outputs
+        model = tf.keras.Model(model.inputs, [model.outputs[0], dense[-2].output])
+    def preprocess(data):
+        image = tf.io.decode_image(data, channels=3, expand_animations=False)
+        # Bicubic with antialiasing is the closest match to PIL's resize in app.py
+        image = tf.image.resize(image, (img_size, img_size), method='bicubic', antialias=True)
+        return tf.clip_by_value(image, 0.0, 255.0) / 255.0
+
+    @tf.function(input_signature=[tf.TensorSpec([None], tf.string, name='images')])
+    def serve(images):
+        batch = tf.map_fn(preprocess, images, parallel_iterations=16,
+                          fn_output_signature=tf.TensorSpec((img_size, img_size, 3), tf.float32))
+        outputs = model(batch, training=False)
+        if isinstance(outputs, (list, tuple)):
+            return {'probabilities': outputs[0], 'embeddings': outputs[1]}
+        return {'probabilities': outputs}
+
+    module = tf.Module()
+    module.model = model
+    module.serve = serve
+    tf.saved_model.save(module, export_dir, signatures={'serving_default': serve})
+    print(f"Bytes-input serving model exported to {export_dir}")
 
 if __name__ == '__main__':
     print("AgriVision Model Training Script")
@@ -113,5 +631,31 @@ if __name__ == '__main__':
     # model = create_model()
     # model = compile_model(model)
     # history = train_model(model, train_data, val_data)
+    # (step timings in model/training_logs; profile_steps=(100, 120) captures a profiler trace)
     # model.save('model/model.h5')
     # convert_to_tflite(model)
+    # export_bytes_model(model)  # in-graph decode/resize for app.py
+    #
+    # Reduced-precision TFLite files (AGRIVISION_MODEL_PRECISION, see precision_report.py):
+    # export_precision_variants(model, representative_data=val_data)
+    #
+    # Early-exit cascade (optional, see cascade_report.py):
+    # small_model = compile_model(create_cascade_model())
+    # train_model(small_model, train_data, val_data, checkpoint_path='model/best_cascade_small.h5')
+    # save_cascade(small_model, calibrate_cascade_threshold(small_model, val_data))
+    #
+    # Resolution tiers (model_128.h5, model_160.h5) for low-latency requests:
+    # train_resolution_tiers('data/train', 'data/val')
+    #
+    # CPU-optimized student, then compare candidates with pareto_report.py:
+    # teacher = tf.keras.models.load_model('model/model.h5')
+    # student = distill_model(teacher, create_student_model(), train_data, val_data)
+    # student.save('model/student.h5')
+    # convert_to_tflite(student, 'model/student.tflite')
+    # pruned, sparsity = prune_model(student, train_data, val_data, sparsity=0.5)
+    # pruned.save('model/student_pruned.h5')
+    # convert_to_tflite(pruned, 'model/student_pruned.tflite')
+    #
+    # Per-crop specialists (model/crops/<crop>.h5), used with the crop hint:
+    # for crop in ('tomato', 'potato', 'corn'):
+    #     train_crop_specialist(crop, 'data/train', 'data/val')
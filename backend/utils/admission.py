@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+# Lower value = served first
+PRIORITIES = {'interactive': 0, 'batch': 1, 'background': 2}
+
+class QueueFull(Exception):
+    """The inference queue is full; the caller should retry later"""
+
+    def __init__(self, retry_after):
+        super().__init__('Server busy, inference queue is full')
+        self.retry_after = retry_after
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before it reached the model"""
+
+    def __init__(self):
+        super().__init__('Request deadline exceeded before inference')
+
+class AdmissionController:
+    """
+    Bounded, priority-ordered queue in front of the model
+
+    At most `concurrency` calls run at once. Further calls wait, ordered by
+    priority class and then arrival; a call that would find `max_queue`
+    waiters of its own or a higher priority class ahead of it is rejected
+    immediately with QueueFull. Lower-priority waiters (e.g. unshed
+    background work) never count against a call. A waiting call whose deadline
+    passes is dropped without running, so the model never does work whose
+    answer nobody will receive.
+    """
+
+    def __init__(self, concurrency=1, max_queue=16, metrics=None):
+        """
+        Args:
+            concurrency: Model calls allowed to run at the same time
+            max_queue: Calls allowed to wait ahead of a new call
+            metrics: Optional Metrics registry for queue depth and shed counts
+        """
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._running = 0
+        # Moving average of service time, used for Retry-After
+        self._avg_service = 0.05
+
+    def depth(self):
+        """Calls currently waiting"""
+        with self._cond:
+            return len(self._heap)
+
+    def load(self):
+        """Waiting plus running calls relative to capacity (0 = idle, 1 = queue full)"""
+        with self._cond:
+            return (len(self._heap) + self._running) / (self.concurrency + self.max_queue)
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying"""
+        with self._cond:
+            backlog = len(self._heap) + self._running
+        return max(1, math.ceil(backlog * self._avg_service / self.concurrency))
+
+    def _publish(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge('inference_queue_depth', len(self._heap))
+            self.metrics.set_gauge('inference_in_flight', self._running)
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.inc(name)
+
+    def run(self, fn, priority='interactive', deadline=None, shed=True):
+        """
+        Run fn() once a slot is free
+
+        Args:
+            fn: Zero-argument model call
+            priority: Key of PRIORITIES
+            deadline: Absolute time.monotonic() after which the call is dropped
+            shed: Reject with QueueFull when the queue is full (False = always wait)
+
+        Returns:
+            Result of fn()
+        """
+        with self._cond:
+            if deadline is not None and time.monotonic() >= deadline:
+                self._count('inference_shed_deadline_total')
+                raise DeadlineExceeded()
+            rank = PRIORITIES[priority]
+            idle = self._running < self.concurrency and not self._heap
+            # Only waiters that would be served before this call count
+            if not idle and shed and sum(1 for p, _ in self._heap if p <= rank) >= self.max_queue:
+                self._count('inference_shed_queue_full_total')
+                raise QueueFull(self.retry_after())
+
+            entry = (rank, next(self._seq))
+            heapq.heappush(self._heap, entry)
+            self._publish()
+            try:
+                while not (self._heap[0] == entry and self._running < self.concurrency):
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        raise DeadlineExceeded()
+                    self._cond.wait(timeout)
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded()
+            except DeadlineExceeded:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                self._count('inference_shed_deadline_total')
+                self._publish()
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._heap)
+            self._running += 1
+            self._count('inference_admitted_total')
+            self._publish()
+            # Another waiter may be able to start too
+            self._cond.notify_all()
+
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._avg_service = 0.9 * self._avg_service + 0.1 * (time.monotonic() - start)
+                self._publish()
+                self._cond.notify_all()
@@ -0,0 +1,65 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Group concurrent requests into batches for one worker thread
+
+    submit() queues an item and returns a Future. A background thread takes
+    the first waiting item, collects more for up to `max_wait` seconds or
+    until `max_batch` items, and calls process_batch(items), which must
+    return one result per item. An exception fails every future of the batch.
+    """
+
+    def __init__(self, process_batch, max_batch=8, max_wait=0.02, name='micro-batcher'):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._name = name
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its result"""
+        future = Future()
+        self._queue.put((item, future))
+        self._ensure_started()
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self._name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            # Skip items whose caller gave up (future cancelled)
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,85 @@
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+
+class TrafficCapture:
+    """
+    Sampled recording of production requests for replay.py
+
+    Uploads are stored once per content hash under blobs/<2 hex>/<sha256>,
+    so repeated images cost nothing. Every sampled request appends one JSON
+    line (arrival time, form fields, relevant headers, status, latency and
+    the prediction) to index-<pid>.ndjson; each worker writes its own
+    index file. Capturing stops once the blobs exceed `max_bytes`.
+    """
+
+    def __init__(self, directory, sample_rate=0.01, max_bytes=1 << 30):
+        """
+        Args:
+            directory: Archive directory (created if needed)
+            sample_rate: Fraction of requests recorded
+            max_bytes: Blob storage budget; further requests are not recorded
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None
+        self.full = False
+
+    def sample(self):
+        """Whether to record the current request"""
+        return not self.full and random.random() < self.sample_rate
+
+    def _blob_bytes(self):
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.directory, 'blobs', '*', '*')))
+
+    def record(self, data, entry):
+        """
+        Store an upload and its index entry
+
+        Args:
+            data: Request body bytes (the uploaded image or tensor)
+            entry: JSON-serializable dict describing the request and response
+
+        Returns:
+            The content hash, or None if the archive is full
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, 'blobs', digest[:2], digest)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._blob_bytes() if os.path.isdir(self.directory) else 0
+            if not os.path.exists(path):
+                if self._bytes + len(data) > self.max_bytes:
+                    self.full = True
+                    return None
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f'{path}.{os.getpid()}.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._bytes += len(data)
+            line = json.dumps(dict(entry, sha256=digest, bytes=len(data)), separators=(',', ':'))
+            with open(os.path.join(self.directory, f'index-{os.getpid()}.ndjson'), 'a') as f:
+                f.write(line + '\n')
+        return digest
+
+def load_capture(directory):
+    """Recorded requests of all workers, in arrival order"""
+    records = []
+    for path in glob.glob(os.path.join(directory, 'index-*.ndjson')):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return sorted(records, key=lambda record: record['time'])
+
+def read_blob(directory, digest):
+    """Stored bytes for a content hash"""
+    with open(os.path.join(directory, 'blobs', digest[:2], digest), 'rb') as f:
+        return f.read()
@@ -0,0 +1,52 @@
+import numpy as np
+
+def cascade_predict(batch, small_fn, full_fn, threshold):
+    """
+    Two-stage early-exit inference
+
+    The cheap model sees the whole batch; only rows whose top-1 confidence
+    is below `threshold` are sent, as one smaller batch, to the full model.
+
+    Args:
+        batch: Model input (N, ...)
+        small_fn: Function mapping a batch to class probabilities (stage 1)
+        full_fn: Function mapping a batch to class probabilities (stage 2)
+        threshold: Stage-1 confidence in [0, 1] needed to exit early
+
+    Returns:
+        Tuple (probabilities (N, num_classes), boolean mask of escalated rows)
+    """
+    predictions = np.array(small_fn(batch), dtype=np.float32)
+    escalate = predictions.max(axis=1) < threshold
+    if escalate.any():
+        predictions[escalate] = full_fn(batch[escalate])
+    return predictions, escalate
+
+def cascade_tradeoff(small_probs, full_probs, labels, small_ms, full_ms, thresholds):
+    """
+    Accuracy and average latency of the cascade at each threshold
+
+    Args:
+        small_probs / full_probs: Probabilities of both stages on a labelled set
+        labels: True class indices
+        small_ms / full_ms: Measured per-image latency of each stage
+        thresholds: Thresholds to evaluate
+
+    Returns:
+        List of dicts with threshold, escalation rate, accuracy and average ms
+    """
+    small_pred = small_probs.argmax(axis=1)
+    full_pred = full_probs.argmax(axis=1)
+    confidence = small_probs.max(axis=1)
+    rows = []
+    for threshold in thresholds:
+        escalate = confidence < threshold
+        pred = np.where(escalate, full_pred, small_pred)
+        rate = float(escalate.mean())
+        rows.append({
+            'threshold': float(threshold),
+            'escalation_rate': round(rate, 4),
+            'accuracy': round(float((pred == labels).mean()), 4),
+            'avg_ms': round(small_ms + rate * full_ms, 2),
+        })
+    return rows
@@ -0,0 +1,60 @@
+import json
+import os
+import socket
+
+def free_ports(count, host='localhost'):
+    """Ports currently free on host (held open together so they are distinct)"""
+    sockets = []
+    try:
+        for _ in range(count):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind((host, 0))
+            sockets.append(s)
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+def local_tf_config(ports, index, host='localhost'):
+    """TF_CONFIG JSON for worker `index` of a cluster of local processes"""
+    return json.dumps({
+        'cluster': {'worker': [f'{host}:{port}' for port in ports]},
+        'task': {'type': 'worker', 'index': index},
+    })
+
+def task_info(tf_config=None):
+    """
+    This process's role in the cluster described by TF_CONFIG
+
+    Without TF_CONFIG the process is a single-worker cluster. The chief is
+    the 'chief' task if the cluster has one, otherwise worker 0.
+
+    Returns:
+        Dict with task_type, index, num_workers and is_chief
+    """
+    raw = tf_config if tf_config is not None else os.environ.get('TF_CONFIG', '')
+    if not raw:
+        return {'task_type': 'worker', 'index': 0, 'num_workers': 1, 'is_chief': True}
+    config = json.loads(raw)
+    cluster = config.get('cluster', {})
+    task = config.get('task', {})
+    task_type, index = task.get('type', 'worker'), int(task.get('index', 0))
+    num_workers = len(cluster.get('chief', [])) + len(cluster.get('worker', []))
+    if cluster.get('chief'):
+        is_chief = task_type == 'chief'
+    else:
+        is_chief = task_type == 'worker' and index == 0
+    return {'task_type': task_type, 'index': index, 'num_workers': max(1, num_workers), 'is_chief': is_chief}
+
+def scaled_learning_rate(base_rate, global_batch, base_batch):
+    """Linear scaling rule: the learning rate grows with the global batch size"""
+    return base_rate * global_batch / base_batch
+
+def shard_items(items, num_shards, index):
+    """
+    Every num_shards-th item starting at index, after trimming the list to a
+    multiple of num_shards so every shard has the same length (workers that
+    run out of data early would stall the others' collectives)
+    """
+    usable = len(items) - len(items) % num_shards
+    return items[index:usable:num_shards]
@@ -0,0 +1,107 @@
+import os
+
+# Environment variables read by the numeric libraries when they first start
+# their thread pools. They must be set before TensorFlow / NumPy are imported.
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'TF_NUM_INTRAOP_THREADS',
+)
+
+def available_cores():
+    """
+    Count the CPU cores this process is allowed to run on
+
+    Returns:
+        Number of usable cores (respects cgroup/taskset affinity masks)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def worker_count():
+    """
+    Number of server workers sharing this host
+
+    Read from AGRIVISION_WORKERS, falling back to gunicorn's WEB_CONCURRENCY.
+    """
+    for name in ('AGRIVISION_WORKERS', 'WEB_CONCURRENCY'):
+        value = os.environ.get(name)
+        if value:
+            try:
+                return max(1, int(value))
+            except ValueError:
+                pass
+    return 1
+
+def thread_plan(cores=None, workers=None):
+    """
+    Split the host's cores between workers
+
+    Args:
+        cores: Usable cores (defaults to available_cores())
+        workers: Worker processes on the host (defaults to worker_count())
+
+    Returns:
+        Dict with intra_op and inter_op thread counts for one worker
+    """
+    cores = cores or available_cores()
+    workers = workers or worker_count()
+    intra_op = max(1, cores // workers)
+    # A second inter-op thread only pays off when the worker has room for it
+    inter_op = 2 if intra_op >= 4 else 1
+    return {'cores': cores, 'workers': workers, 'intra_op': intra_op, 'inter_op': inter_op}
+
+def worker_cpus(slot, cores, workers):
+    """
+    CPU ids a worker should be pinned to
+
+    Args:
+        slot: Worker slot index (0 .. workers - 1)
+        cores: Sorted list of usable CPU ids
+        workers: Worker processes on the host
+
+    Returns:
+        Set of CPU ids for this worker
+    """
+    per_worker = max(1, len(cores) // workers)
+    start = (slot * per_worker) % len(cores)
+    return {cores[(start + i) % len(cores)] for i in range(per_worker)}
+
+def configure_thread_env(plan=None):
+    """
+    Size BLAS/OpenMP/TensorFlow thread pools for this worker
+
+    Must run before TensorFlow is imported. Explicitly set environment
+    variables are left untouched so operators can always override.
+    If AGRIVISION_CPU_AFFINITY=1 and a worker slot is known (set by
+    gunicorn.conf.py), the process is also pinned to its share of cores.
+
+    Returns:
+        The thread plan that was applied
+    """
+    plan = plan or thread_plan()
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(plan['intra_op']))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', str(plan['inter_op']))
+
+    slot = os.environ.get('AGRIVISION_WORKER_SLOT')
+    if (os.environ.get('AGRIVISION_CPU_AFFINITY') == '1' and slot is not None
+            and hasattr(os, 'sched_setaffinity')):
+        cores = sorted(os.sched_getaffinity(0))
+        cpus = worker_cpus(int(slot), cores, plan['workers'])
+        os.sched_setaffinity(0, cpus)
+        plan['affinity'] = sorted(cpus)
+    return plan
+
+def apply_tf_threading(tf, plan):
+    """Apply the thread plan to an already imported TensorFlow runtime"""
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(
+            int(os.environ.get('TF_NUM_INTRAOP_THREADS', plan['intra_op'])))
+        tf.config.threading.set_inter_op_parallelism_threads(
+            int(os.environ.get('TF_NUM_INTEROP_THREADS', plan['inter_op'])))
+    except RuntimeError:
+        # The runtime was already initialised (e.g. imported earlier by a test)
+        pass
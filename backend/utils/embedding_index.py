@@ -0,0 +1,173 @@
+import glob
+import os
+import threading
+
+import numpy as np
+
+class EmbeddingIndex:
+    """
+    Append-only, memory-mapped index for cosine nearest neighbors
+
+    Vectors are normalized and stored as float16. Next to each vector a
+    short int8 signature (a fixed random orthonormal projection of the
+    vector) is kept in its own contiguous file; a search scans only the
+    signatures, then re-ranks the best candidates with the float16
+    vectors. At 10M x 256 that reads ~1.3 GB of int8 signatures instead of
+    ~5 GB of vectors per query. Indexes below `exact_below` vectors are
+    searched exactly.
+
+    Every writer (one per worker process) appends to its own shard of
+    three column files (.ids last, so a shard's row count only covers
+    complete rows); readers memory-map all shards and remap them as they
+    grow.
+    """
+
+    def __init__(self, directory, dim, writer=None, signature_dim=128, exact_below=200000,
+                 chunk_rows=16384):
+        """
+        Args:
+            directory: Index directory (created if needed)
+            dim: Vector dimension
+            writer: Shard name for this process's appends (default: pid)
+            signature_dim: Dimension of the int8 search signatures
+            exact_below: Total size under which search scans the vectors directly
+            chunk_rows: Rows scored per step, bounding temporary memory
+        """
+        self.directory = directory
+        self.dim = dim
+        self.writer = writer or str(os.getpid())
+        self.signature_dim = min(signature_dim, dim)
+        self.exact_below = exact_below
+        self.chunk_rows = chunk_rows
+        # Projected unit-vector components are ~N(0, 1/signature_dim): clip at 4 sigma
+        self.signature_scale = 127 / 4 * np.sqrt(self.signature_dim)
+        self._lock = threading.Lock()
+        self._maps = {}
+        os.makedirs(directory, exist_ok=True)
+        self.projection = self._load_projection()
+
+    def _load_projection(self):
+        """Projection shared by all processes, created once per index"""
+        path = os.path.join(self.directory, 'projection.npy')
+        if not os.path.exists(path):
+            rng = np.random.default_rng()
+            q, _ = np.linalg.qr(rng.normal(size=(self.dim, self.signature_dim)))
+            tmp = f'{path}.{os.getpid()}.tmp.npy'
+            np.save(tmp, q.astype(np.float32))
+            # Losing the race to another process is fine: everyone loads the winner
+            if not os.path.exists(path):
+                os.replace(tmp, path)
+            elif os.path.exists(tmp):
+                os.unlink(tmp)
+        return np.load(path)
+
+    def _shards(self):
+        return sorted(os.path.basename(p)[:-len('.ids')]
+                      for p in glob.glob(os.path.join(self.directory, '*.ids')))
+
+    def _path(self, shard, column):
+        return os.path.join(self.directory, f'{shard}.{column}')
+
+    def __len__(self):
+        return sum(os.path.getsize(self._path(shard, 'ids')) // 8 for shard in self._shards())
+
+    def _signatures(self, unit_vectors):
+        projected = unit_vectors @ self.projection * self.signature_scale
+        return np.clip(np.rint(projected), -127, 127).astype(np.int8)
+
+    def add(self, ids, vectors):
+        """
+        Append vectors (normalized here) under the given ids
+
+        Args:
+            ids: Sequence of integer ids (e.g. prediction ids)
+            vectors: Array-like of shape (len(ids), dim)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        columns = (('vec', unit.astype(np.float16)), ('sig', self._signatures(unit)),
+                   ('ids', np.asarray(ids, dtype=np.int64)))
+        with self._lock:
+            for column, values in columns:
+                with open(self._path(self.writer, column), 'ab') as f:
+                    f.write(values.tobytes())
+
+    def _shard_arrays(self, shard):
+        """(ids, signatures, vectors) memory maps for a shard's complete rows"""
+        rows = os.path.getsize(self._path(shard, 'ids')) // 8
+        with self._lock:
+            cached = self._maps.get(shard)
+            if cached is None or len(cached[0]) != rows:
+                if rows == 0:
+                    return (np.empty(0, np.int64), np.empty((0, self.signature_dim), np.int8),
+                            np.empty((0, self.dim), np.float16))
+                cached = (
+                    np.memmap(self._path(shard, 'ids'), dtype=np.int64, mode='r', shape=(rows,)),
+                    np.memmap(self._path(shard, 'sig'), dtype=np.int8, mode='r',
+                              shape=(rows, self.signature_dim)),
+                    np.memmap(self._path(shard, 'vec'), dtype=np.float16, mode='r', shape=(rows, self.dim)),
+                )
+                self._maps[shard] = cached
+            return cached
+
+    def vector(self, item_id):
+        """Stored unit vector for an id (the latest one if added twice), or None"""
+        for shard in self._shards():
+            ids, _, vectors = self._shard_arrays(shard)
+            matches = np.nonzero(ids == item_id)[0]
+            if len(matches):
+                return np.array(vectors[matches[-1]], dtype=np.float32)
+        return None
+
+    def _top(self, ids, scores, k):
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+            return ids[top], scores[top]
+        return ids, scores
+
+    def _scan(self, values, query, ids, k, exclude):
+        """Top-k (row, score) of values @ query, in chunks"""
+        best_rows, best_scores = np.empty(0, np.int64), np.empty(0, np.float32)
+        for start in range(0, len(values), self.chunk_rows):
+            scores = values[start:start + self.chunk_rows].astype(np.float32) @ query
+            if len(exclude):
+                scores[np.isin(ids[start:start + self.chunk_rows], exclude)] = -np.inf
+            rows, scores = self._top(np.arange(start, start + len(scores)), scores, k)
+            best_rows, best_scores = self._top(np.concatenate([best_rows, rows]),
+                                               np.concatenate([best_scores, scores]), k)
+        return best_rows, best_scores
+
+    def search(self, query, k=10, exclude=(), candidates=None):
+        """
+        Top-k ids by cosine similarity
+
+        Args:
+            query: Vector of length dim
+            k: Number of neighbors
+            exclude: Ids to leave out (e.g. the query's own id)
+            candidates: Signature matches re-ranked per shard (default max(64k, 8000))
+
+        Returns:
+            List of (id, similarity), most similar first
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        exact = len(self) < self.exact_below
+        signature_query = query @ self.projection
+        candidates = candidates or max(64 * k, 8000)
+        exclude = np.asarray(list(exclude), dtype=np.int64)
+
+        found_ids, found_scores = np.empty(0, np.int64), np.empty(0, np.float32)
+        for shard in self._shards():
+            ids, signatures, vectors = self._shard_arrays(shard)
+            if exact:
+                rows, scores = self._scan(vectors, query, ids, k, exclude)
+            else:
+                rows, signature_scores = self._scan(signatures, signature_query, ids, candidates, exclude)
+                rows = np.sort(rows[np.isfinite(signature_scores)])
+                scores = vectors[rows].astype(np.float32) @ query
+                rows, scores = self._top(rows, scores, k)
+            found_ids, found_scores = self._top(np.concatenate([found_ids, np.array(ids[rows])]),
+                                                np.concatenate([found_scores, scores]), k)
+        order = np.argsort(-found_scores)
+        return [(int(found_ids[i]), float(found_scores[i])) for i in order if np.isfinite(found_scores[i])]
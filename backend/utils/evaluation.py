@@ -0,0 +1,64 @@
+import numpy as np
+
+def confusion_matrix(labels, predicted, num_classes):
+    """Counts with true classes as rows and predicted classes as columns"""
+    labels, predicted = np.asarray(labels, dtype=np.int64), np.asarray(predicted, dtype=np.int64)
+    counts = np.bincount(labels * num_classes + predicted, minlength=num_classes * num_classes)
+    return counts.reshape(num_classes, num_classes)
+
+def per_class_metrics(matrix):
+    """
+    Precision, recall, F1 and support per class from a confusion matrix
+
+    Classes never predicted (or never present) get 0 rather than NaN.
+
+    Returns:
+        Dict of arrays: precision, recall, f1, support
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    true_positives = np.diag(matrix)
+    predicted = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+    precision = np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0)
+    recall = np.divide(true_positives, support, out=np.zeros_like(true_positives), where=support > 0)
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros_like(total), where=total > 0)
+    return {'precision': precision, 'recall': recall, 'f1': f1, 'support': support.astype(np.int64)}
+
+def top_k_accuracy(probabilities, labels, k):
+    """Fraction of rows whose true class is among the k highest scores"""
+    probabilities = np.asarray(probabilities)
+    labels = np.asarray(labels)
+    k = min(k, probabilities.shape[1])
+    if k == probabilities.shape[1]:
+        return 1.0
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    return float(np.mean(np.any(top == labels[:, np.newaxis], axis=1)))
+
+def expected_calibration_error(probabilities, labels, bins=15):
+    """
+    Expected calibration error of the top-1 confidence
+
+    Predictions are grouped into equal-width confidence bins; the error is
+    the support-weighted mean gap between each bin's accuracy and its mean
+    confidence.
+
+    Returns:
+        Tuple (ece, list of per-bin dicts with lower/upper edge, count,
+        accuracy and confidence)
+    """
+    probabilities = np.asarray(probabilities)
+    confidence = probabilities.max(axis=1)
+    correct = (probabilities.argmax(axis=1) == np.asarray(labels)).astype(np.float64)
+    index = np.minimum((confidence * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(index, minlength=bins)
+    accuracy_sum = np.bincount(index, weights=correct, minlength=bins)
+    confidence_sum = np.bincount(index, weights=confidence, minlength=bins)
+    filled = counts > 0
+    accuracy = np.divide(accuracy_sum, counts, out=np.zeros(bins), where=filled)
+    mean_confidence = np.divide(confidence_sum, counts, out=np.zeros(bins), where=filled)
+    ece = float(np.sum(counts * np.abs(accuracy - mean_confidence)) / max(len(confidence), 1))
+    table = [{'lower': round(i / bins, 4), 'upper': round((i + 1) / bins, 4), 'count': int(counts[i]),
+              'accuracy': round(float(accuracy[i]), 4), 'confidence': round(float(mean_confidence[i]), 4)}
+             for i in range(bins) if filled[i]]
+    return ece, table
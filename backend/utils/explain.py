@@ -0,0 +1,200 @@
+import collections
+import io
+import os
+import threading
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+def split_feature_model(model, tf):
+    """
+    Split a classifier into (feature extractor, head layers) for Grad-CAM
+
+    The repo's models are Sequential with a convolutional backbone first
+    (MobileNetV2) followed by pooling and Dense layers.
+
+    Returns:
+        Tuple (backbone, list of head layers), or None if the model has no
+        convolutional backbone in front
+    """
+    layers = getattr(model, 'layers', [])
+    if not layers or not isinstance(layers[0], tf.keras.Model) or len(layers[0].output.shape) != 4:
+        return None
+    return layers[0], layers[1:]
+
+def gradcam(tf, backbone, head, batch, class_indices):
+    """
+    Grad-CAM heatmaps for a batch
+
+    Args:
+        tf: The tensorflow module
+        backbone / head: From split_feature_model()
+        batch: Model input (N, H, W, 3)
+        class_indices: Class to explain per image, or -1 for the predicted class
+
+    Returns:
+        Tuple (heatmaps (N, h, w) in [0, 1] at feature-map resolution,
+        explained class indices, their probabilities)
+
+    The gradient is taken of the pre-softmax class logit: the final Dense
+    layer is applied without its activation, which is used only for the
+    reported probability. Softmax gradients vanish as confidence rises.
+    """
+    *hidden, last = head
+    with tf.GradientTape() as tape:
+        features = backbone(batch, training=False)
+        tape.watch(features)
+        x = features
+        for layer in hidden:
+            x = layer(x, training=False)
+        if isinstance(last, tf.keras.layers.Dense):
+            logits = tf.matmul(tf.cast(x, last.kernel.dtype), last.kernel)
+            if last.use_bias:
+                logits = logits + last.bias
+            probs = last.activation(logits)
+        else:
+            logits = probs = last(x, training=False)
+        predicted = tf.argmax(probs, axis=1, output_type=tf.int32)
+        targets = tf.where(tf.constant(class_indices, dtype=tf.int32) >= 0,
+                           tf.constant(class_indices, dtype=tf.int32), predicted)
+        scores = tf.gather(logits, targets, batch_dims=1)
+    gradients = tape.gradient(scores, features)
+    # Channel weights: gradients averaged over the feature map
+    weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+    cams = tf.nn.relu(tf.reduce_sum(weights * features, axis=-1)).numpy()
+    peaks = cams.reshape(len(cams), -1).max(axis=1).reshape(-1, 1, 1)
+    return cams / np.maximum(peaks, 1e-8), targets.numpy(), tf.gather(probs, targets, batch_dims=1).numpy()
+
+def jet(values):
+    """Map values in [0, 1] to RGB uint8 with a jet-like colormap"""
+    values = np.clip(values, 0, 1)[..., np.newaxis]
+    rgb = np.clip(np.concatenate([1.5 - np.abs(4 * values - 3),
+                                  1.5 - np.abs(4 * values - 2),
+                                  1.5 - np.abs(4 * values - 1)], axis=-1), 0, 1)
+    return (rgb * 255).astype(np.uint8)
+
+def overlay_png(pixels, heatmap, alpha=0.45, text=None):
+    """
+    Blend a heatmap over an image and encode it as PNG
+
+    Args:
+        pixels: uint8 image (H, W, 3)
+        heatmap: Values in [0, 1] at any resolution (resized to the image)
+        alpha: Heatmap opacity
+        text: Optional dict stored as PNG text chunks (readable without decoding)
+
+    Returns:
+        PNG bytes
+    """
+    height, width = pixels.shape[:2]
+    resized = Image.fromarray((heatmap * 255).astype(np.uint8)).resize((width, height), Image.BILINEAR)
+    colors = jet(np.asarray(resized, dtype=np.float32) / 255)
+    blended = (pixels * (1 - alpha) + colors * alpha).astype(np.uint8)
+    info = PngImagePlugin.PngInfo()
+    for key, value in (text or {}).items():
+        info.add_text(key, str(value))
+    buffer = io.BytesIO()
+    Image.fromarray(blended).save(buffer, format='PNG', pnginfo=info)
+    return buffer.getvalue()
+
+class ArrayLRU:
+    """Thread-safe LRU of NumPy arrays bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = collections.OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key).nbytes
+            self._items[key] = value
+            self._bytes += value.nbytes
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+class DiskCache:
+    """
+    Size-bounded file cache shared by all workers
+
+    Entries are files named by key; reads refresh the modification time and
+    the least recently used files are deleted once the directory grows past
+    `max_bytes`. Writes go through a temporary file, so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Cached bytes, or None"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass  # evicted by another worker meanwhile
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self.size()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._bytes = self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(self._path(name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def size(self):
+        """Total bytes on disk"""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete least recently used entries until 90% of the budget; returns the new size"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.unlink(self._path(name))
+                total -= size
+            except OSError:
+                pass
+        return total
@@ -0,0 +1,158 @@
+import io
+import struct
+
+import numpy as np
+from PIL import Image
+
+from utils.tensor_format import decode_tensor, is_tensor_payload
+
+# Frame stream upload format: frames back to back, each an encoded image or
+# raw tensor payload preceded by its length (big-endian uint32). Suits a
+# chunked upload where the client appends frames as the camera produces them.
+FRAMES_MIMETYPE = 'application/x-agrivision-frames'
+FRAME_LENGTH = struct.Struct('>I')
+
+class FrameStreamError(ValueError):
+    """Raised for malformed or oversized frame streams"""
+
+def encode_frames(frames):
+    """Length-prefixed frame stream body from a list of frame payloads"""
+    return b''.join(FRAME_LENGTH.pack(len(frame)) + frame for frame in frames)
+
+def _read_exact(stream, size):
+    """Read exactly size bytes, or fewer only at the end of the stream"""
+    chunks, remaining = [], size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def iter_length_prefixed(stream, max_frame_bytes):
+    """Yield the frames of a length-prefixed body as they arrive"""
+    while True:
+        header = _read_exact(stream, FRAME_LENGTH.size)
+        if not header:
+            return
+        if len(header) < FRAME_LENGTH.size:
+            raise FrameStreamError('Frame stream ends inside a length prefix')
+        (length,) = FRAME_LENGTH.unpack(header)
+        if length > max_frame_bytes:
+            raise FrameStreamError(f'Frame of {length} bytes exceeds the {max_frame_bytes} byte limit')
+        frame = _read_exact(stream, length)
+        if len(frame) < length:
+            raise FrameStreamError(f'Frame stream ends {length - len(frame)} bytes into a frame')
+        yield frame
+
+def _part_headers(block):
+    headers = {}
+    for line in block.decode('latin-1').split('\r\n'):
+        name, _, value = line.partition(':')
+        if value:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+def iter_multipart(stream, boundary, max_part_bytes, chunk_size=64 * 1024):
+    """
+    Yield (headers, body) for each part of a multipart body as it arrives
+
+    Unlike the form parser, which buffers the whole request before the view
+    runs, this hands out each part as soon as its closing boundary has been
+    read, so a client can keep adding frames (multipart/form-data or a
+    camera's multipart/x-mixed-replace feed) while earlier ones are
+    processed. Header names are lower-cased.
+    """
+    # The leading CRLF lets the first boundary match like all the others
+    delimiter = b'\r\n--' + boundary.encode('latin-1')
+    buffer = bytearray(b'\r\n')
+    eof = False
+
+    def fill():
+        nonlocal eof
+        chunk = stream.read(chunk_size)
+        if chunk:
+            buffer.extend(chunk)
+        else:
+            eof = True
+
+    def find(marker, limit):
+        # Scan only what arrived since the last look
+        start = 0
+        while True:
+            index = buffer.find(marker, start)
+            if index >= 0:
+                return index
+            if len(buffer) > limit:
+                raise FrameStreamError(f'Frame exceeds the {max_part_bytes} byte limit')
+            if eof:
+                raise FrameStreamError('Multipart stream ends inside a part')
+            start = max(len(buffer) - len(marker) + 1, 0)
+            fill()
+
+    # Preamble, then one part per boundary until the closing '--'
+    del buffer[:find(delimiter, max_part_bytes) + len(delimiter)]
+    while True:
+        while len(buffer) < 4 and not eof:
+            fill()
+        # Closing boundary, or a feed that simply stopped after a part
+        if buffer[:2] == b'--' or not bytes(buffer).strip():
+            return
+        index = find(b'\r\n\r\n', 16 * 1024)
+        headers = _part_headers(bytes(buffer[:index]))
+        del buffer[:index + 4]
+        end = find(delimiter, max_part_bytes + len(delimiter))
+        body = bytes(buffer[:end])
+        del buffer[:end + len(delimiter)]
+        yield headers, body
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash of a PIL image: one bit per horizontally adjacent pair
+    of cells in a (hash_size + 1) x hash_size grayscale thumbnail
+
+    Near-identical frames (sensor noise, recompression, small shake) differ
+    in a few bits; a new scene flips about half of them.
+    """
+    thumbnail = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    cells = np.asarray(thumbnail, dtype=np.int16)
+    bits = (cells[:, 1:] > cells[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def frame_hash(data, hash_size=8):
+    """
+    dhash of an encoded frame or raw tensor payload
+
+    JPEG frames are decoded at reduced scale (DCT scaling), so hashing a
+    frame costs a small fraction of a full decode.
+    """
+    if is_tensor_payload(data):
+        return dhash(Image.fromarray(decode_tensor(data)), hash_size)
+    image = Image.open(io.BytesIO(data))
+    image.draft('L', (hash_size * 8, hash_size * 8))
+    return dhash(image, hash_size)
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+class FrameSkipper:
+    """
+    Decide which frames of a stream are worth running through the model
+
+    A frame is a duplicate when its hash is within `threshold` bits of the
+    last kept frame. Comparing with the last kept frame rather than the
+    previous one means slow drift (walking along a row) still adds up to a
+    new kept frame.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.last_kept = None
+
+    def is_duplicate(self, frame_hash):
+        return self.last_kept is not None and hamming(frame_hash, self.last_kept) <= self.threshold
+
+    def keep(self, frame_hash):
+        self.last_kept = frame_hash
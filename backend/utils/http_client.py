@@ -0,0 +1,69 @@
+import json
+import urllib.error
+import urllib.request
+import uuid
+
+def encode_multipart(fields, files):
+    """
+    Build a multipart/form-data body
+
+    Args:
+        fields: Dict of form field name -> string value
+        files: List of (field name, filename, bytes)
+
+    Returns:
+        Tuple (body bytes, content type header)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                     f'{value}\r\n'.encode())
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode())
+        parts.append(data)
+        parts.append(b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def post_image(url, filename, data, fields=None, headers=None, timeout=60, response_headers=None):
+    """
+    Upload one image the way the frontend does
+
+    Returns:
+        Tuple (HTTP status, parsed JSON body or None)
+    """
+    body, content_type = encode_multipart(fields or {}, [('image', filename, data)])
+    return post_body(url, body, content_type, headers, timeout, response_headers)
+
+def post_body(url, body, content_type, headers=None, timeout=60, response_headers=None):
+    """
+    POST a raw body (e.g. an application/x-agrivision-tensor upload)
+
+    Args:
+        response_headers: Optional dict that receives the response headers
+
+    Returns:
+        Tuple (HTTP status, parsed JSON body or None)
+    """
+    request = urllib.request.Request(url, data=body, method='POST',
+                                     headers=dict(headers or {}, **{'Content-Type': content_type}))
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            if response_headers is not None:
+                response_headers.update(response.headers.items())
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        if response_headers is not None:
+            response_headers.update(e.headers.items())
+        try:
+            return e.code, json.loads(e.read() or b'null')
+        except ValueError:
+            return e.code, None
+
+def get_json(url, headers=None, timeout=30):
+    """GET a JSON endpoint"""
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+class JobStore:
+    """
+    SQLite persistence for asynchronous prediction jobs
+
+    Items are claimed with a lease before they are processed, so several
+    worker processes can share one jobs database and items held by a worker
+    that died are picked up again once the lease expires. Only the current
+    holder of a claim can store its result, and an item claimed
+    `max_attempts` times without a result is recorded as failed.
+    """
+
+    def __init__(self, db_path, lease_seconds=300, max_attempts=3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            self._init_schema(conn)
+            self._initialized = True
+        return conn
+
+    def _init_schema(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS jobs
+                        (id TEXT PRIMARY KEY,
+                         status TEXT NOT NULL,
+                         total INTEGER NOT NULL,
+                         done INTEGER NOT NULL DEFAULT 0,
+                         failed INTEGER NOT NULL DEFAULT 0,
+                         created TEXT NOT NULL,
+                         updated TEXT NOT NULL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS job_items
+                        (job_id TEXT NOT NULL,
+                         seq INTEGER NOT NULL,
+                         filename TEXT,
+                         data BLOB,
+                         result TEXT,
+                         claimed_by TEXT,
+                         claimed_at REAL,
+                         attempts INTEGER NOT NULL DEFAULT 0,
+                         PRIMARY KEY (job_id, seq))''')
+        # Databases created before attempts were counted
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(job_items)')}
+        if 'attempts' not in columns:
+            conn.execute('ALTER TABLE job_items ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created)')
+        conn.commit()
+
+    def create_job(self, items):
+        """
+        Persist a new job
+
+        Args:
+            items: List of (filename, image bytes)
+
+        Returns:
+            New job id
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT INTO jobs (id, status, total, created, updated) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, 'queued', len(items), now, now))
+            conn.executemany('INSERT INTO job_items (job_id, seq, filename, data) VALUES (?, ?, ?, ?)',
+                             ((job_id, seq, filename, data) for seq, (filename, data) in enumerate(items)))
+        conn.close()
+        return job_id
+
+    def get_job(self, job_id):
+        """Job status and progress as a dict, or None if unknown"""
+        conn = self._connect()
+        row = conn.execute('SELECT id, status, total, done, failed, created, updated FROM jobs WHERE id = ?',
+                           (job_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        job = dict(zip(('job_id', 'status', 'total', 'done', 'failed', 'created', 'updated'), row))
+        job['progress'] = round(job['done'] / job['total'], 4) if job['total'] else 1.0
+        return job
+
+    def open_jobs(self, exclude=()):
+        """Ids of unfinished jobs, oldest first"""
+        conn = self._connect()
+        rows = conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created").fetchall()
+        conn.close()
+        return [row[0] for row in rows if row[0] not in exclude]
+
+    def claim_items(self, job_id, worker, limit):
+        """
+        Lease up to `limit` unprocessed items of a job
+
+        Items that used up their attempts are recorded as failed instead.
+
+        Args:
+            worker: Claim token, unique per batch; save_results needs the same one
+
+        Returns:
+            List of (seq, filename, data)
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            exhausted = conn.execute('''SELECT seq FROM job_items
+                                        WHERE job_id = ? AND result IS NULL AND attempts >= ?
+                                          AND (claimed_by IS NULL OR claimed_at < ?)''',
+                                     (job_id, self.max_attempts, now - self.lease_seconds)).fetchall()
+            if exhausted:
+                error = {'error': f'Gave up after {self.max_attempts} attempts'}
+                self._store(conn, job_id, [(seq, error) for seq, in exhausted])
+            conn.execute('''UPDATE job_items SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+                            WHERE job_id = ? AND seq IN (
+                                SELECT seq FROM job_items
+                                WHERE job_id = ? AND result IS NULL AND attempts < ?
+                                  AND (claimed_by IS NULL OR claimed_at < ?)
+                                ORDER BY seq LIMIT ?)''',
+                         (worker, now, job_id, job_id, self.max_attempts, now - self.lease_seconds, limit))
+            items = conn.execute('''SELECT seq, filename, data FROM job_items
+                                    WHERE job_id = ? AND claimed_by = ? AND claimed_at = ? AND result IS NULL
+                                    ORDER BY seq''', (job_id, worker, now)).fetchall()
+            if items:
+                conn.execute("UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'", (job_id,))
+        conn.close()
+        return items
+
+    def save_results(self, job_id, results, worker=None):
+        """
+        Store results for processed items and update progress
+
+        Args:
+            results: List of (seq, result dict); a dict with an 'error' key counts as failed
+            worker: Claim token the items were claimed with; results of items
+                whose lease expired and went to another claim are dropped
+
+        Returns:
+            Number of results stored
+        """
+        conn = self._connect()
+        with conn:
+            stored = self._store(conn, job_id, results, worker)
+        conn.close()
+        return stored
+
+    def release_items(self, job_id, worker):
+        """Give back the unfinished items of a claim so they can be retried right away"""
+        conn = self._connect()
+        with conn:
+            conn.execute('''UPDATE job_items SET claimed_by = NULL, claimed_at = NULL
+                            WHERE job_id = ? AND claimed_by = ? AND result IS NULL''', (job_id, worker))
+        conn.close()
+
+    def _store(self, conn, job_id, results, worker=None):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        done = failed = 0
+        for seq, result in results:
+            # Drop the image bytes once an item has its result; an item is counted once
+            updated = conn.execute('''UPDATE job_items SET result = ?, data = NULL
+                                      WHERE job_id = ? AND seq = ? AND result IS NULL
+                                        AND (? IS NULL OR claimed_by = ?)''',
+                                   (json.dumps(result), job_id, seq, worker, worker)).rowcount
+            done += updated
+            failed += updated if 'error' in result else 0
+        conn.execute('UPDATE jobs SET done = done + ?, failed = failed + ?, updated = ? WHERE id = ?',
+                     (done, failed, now, job_id))
+        conn.execute("UPDATE jobs SET status = 'completed' WHERE id = ? AND done >= total", (job_id,))
+        return done
+
+    def purge_finished(self, older_than):
+        """
+        Delete completed jobs and their item results
+
+        Args:
+            older_than: Seconds since a job's last update after which it is removed
+
+        Returns:
+            Number of jobs deleted
+        """
+        cutoff = datetime.fromtimestamp(time.time() - older_than).strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._connect()
+        with conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = 'completed' AND updated < ?", (cutoff,))]
+            conn.executemany('DELETE FROM job_items WHERE job_id = ?', ((job_id,) for job_id in expired))
+            conn.executemany('DELETE FROM jobs WHERE id = ?', ((job_id,) for job_id in expired))
+        conn.close()
+        return len(expired)
+
+    def iter_results(self, job_id, chunk_size=500):
+        """
+        Yield finished item results in submission order
+
+        Reads through a cursor in chunks so large jobs are never held in memory.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''SELECT seq, filename, result FROM job_items
+                                     WHERE job_id = ? AND result IS NOT NULL ORDER BY seq''', (job_id,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for seq, filename, result in rows:
+                    yield dict(json.loads(result), index=seq, filename=filename)
+        finally:
+            conn.close()
+
+class JobExecutor:
+    """
+    Background threads that process queued jobs with batched inference
+
+    At most `workers` batches run at once across all jobs, and a single job
+    may hold at most `per_job` of those slots, so one huge job cannot take
+    every worker and background work never competes with interactive
+    requests for more than its share of the CPU.
+    """
+
+    def __init__(self, store, process_batch, batch_size=32, workers=1, per_job=1, idle_wait=1.0,
+                 retention=None, purge_every=3600):
+        """
+        Args:
+            store: JobStore
+            process_batch: Function taking [(seq, filename, data)] and returning [(seq, result dict)]
+            batch_size: Items per inference batch
+            workers: Background threads
+            per_job: Maximum threads working on the same job
+            idle_wait: Seconds to sleep when there is nothing to do
+            retention: Seconds completed jobs are kept before they are
+                deleted (None = forever)
+            purge_every: Seconds between retention sweeps
+        """
+        self.store = store
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        self.workers = workers
+        self.per_job = per_job
+        self.idle_wait = idle_wait
+        self.retention = retention
+        self.purge_every = purge_every
+        self._last_purge = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._active = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the background threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._loop, name=f'job-executor-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Wake idle threads after a job was submitted"""
+        self._wakeup.set()
+
+    def _pick_job(self):
+        with self._lock:
+            busy = {job_id for job_id, count in self._active.items() if count >= self.per_job}
+        for job_id in self.store.open_jobs(exclude=busy):
+            with self._lock:
+                if self._active.get(job_id, 0) < self.per_job:
+                    self._active[job_id] = self._active.get(job_id, 0) + 1
+                    return job_id
+        return None
+
+    def _release(self, job_id):
+        with self._lock:
+            self._active[job_id] -= 1
+            if not self._active[job_id]:
+                del self._active[job_id]
+
+    def run_once(self):
+        """
+        Process one batch of the next eligible job
+
+        Returns:
+            True if a batch was processed
+        """
+        job_id = self._pick_job()
+        if job_id is None:
+            return False
+        # A claim token per batch, so a batch that outlived its lease cannot
+        # store results for items another batch has claimed since
+        claim = f'{self.worker_id}-{uuid.uuid4().hex[:8]}'
+        try:
+            items = self.store.claim_items(job_id, claim, self.batch_size)
+            if not items:
+                return False
+            try:
+                results = self.process_batch(items)
+            except Exception:
+                self.store.release_items(job_id, claim)
+                raise
+            self.store.save_results(job_id, results, claim)
+            return True
+        finally:
+            self._release(job_id)
+
+    def run_pending(self):
+        """Process batches until no work is left (used by tests and one-shot runs)"""
+        while self.run_once():
+            pass
+
+    def purge_if_due(self):
+        """
+        Run the retention sweep if `purge_every` seconds passed since the last one
+
+        Returns:
+            Number of jobs deleted
+        """
+        if not self.retention:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            if self._last_purge is not None and now - self._last_purge < self.purge_every:
+                return 0
+            self._last_purge = now
+        return self.store.purge_finished(self.retention)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.purge_if_due()
+                worked = self.run_once()
+            except Exception as e:
+                print(f"Job executor error: {e}")
+                worked = False
+            if not worked:
+                self._wakeup.wait(self.idle_wait)
+                self._wakeup.clear()
@@ -0,0 +1,115 @@
+import glob
+import os
+import re
+import sqlite3
+
+# Shard N hands out prediction ids in [(N + 1) * stride, (N + 2) * stride), so
+# ids stay unique across workers, in the embedding index and after merging
+SHARD_ID_STRIDE = 10 ** 12
+
+def shard_path(db_path, slot):
+    """Shard database of a worker slot, next to the main database"""
+    root, ext = os.path.splitext(db_path)
+    return f'{root}.shard-{slot}{ext}'
+
+def list_shards(db_path):
+    """(slot, path) of every existing shard of a database, by slot"""
+    root, ext = os.path.splitext(db_path)
+    pattern = re.compile(re.escape(os.path.basename(root)) + r'\.shard-(\d+)' + re.escape(ext) + '$')
+    shards = []
+    for path in glob.glob(f'{glob.escape(root)}.shard-*{glob.escape(ext)}'):
+        match = pattern.search(os.path.basename(path))
+        if match:
+            shards.append((int(match.group(1)), path))
+    return sorted(shards)
+
+def id_range(slot):
+    """First and last prediction id a shard may use"""
+    return (slot + 1) * SHARD_ID_STRIDE, (slot + 2) * SHARD_ID_STRIDE - 1
+
+def reserve_id_range(conn, slot, used_max=None):
+    """
+    Move a shard's AUTOINCREMENT counter into the shard's id range
+
+    Args:
+        conn: Connection to the shard, whose predictions table exists
+        slot: Worker slot of the shard
+        used_max: Highest id of this range already in the main database
+            (merged earlier), which must not be handed out again
+    """
+    low, _ = id_range(slot)
+    floor = max(low - 1, used_max or 0)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'predictions'").fetchone()
+    if row is None:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('predictions', ?)", (floor,))
+    elif row[0] < floor:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'predictions'", (floor,))
+    conn.commit()
+
+def has_predictions(conn, schema):
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master "
+                        f"WHERE type = 'table' AND name = 'predictions'").fetchone() is not None
+
+def attach_shards(conn, db_path, columns):
+    """
+    Make `predictions` on a main-database connection read all shards too
+
+    Every shard is attached and a temporary view named `predictions`, the
+    UNION ALL of the main table and the shards' tables, shadows the main
+    table for unqualified names, so existing queries read the merged log.
+    SQLite attaches at most 10 databases by default; merge the shards
+    (merge_shards) if workers use more slots than that.
+
+    Args:
+        conn: Connection to the main database
+        db_path: Path of the main database
+        columns: Columns the view exposes
+
+    Returns:
+        Number of shards attached
+    """
+    selects = [f"SELECT {', '.join(columns)} FROM main.predictions"]
+    for slot, path in list_shards(db_path):
+        schema = f'shard_{slot}'
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+        if has_predictions(conn, schema):
+            selects.append(f"SELECT {', '.join(columns)} FROM {schema}.predictions")
+    if len(selects) > 1:
+        conn.execute(f"CREATE TEMP VIEW predictions AS {' UNION ALL '.join(selects)}")
+    return len(selects) - 1
+
+def merge_shards(db_path, columns, timeout=30):
+    """
+    Move every shard's rows into the main database
+
+    Rows keep their ids. Each shard is copied and emptied in one
+    transaction, so readers never see a row twice or not at all, and
+    workers can keep appending while the merge runs. Ids the main table
+    hands out itself continue above the highest merged id, so while shards
+    are in use every writer should log through one.
+
+    Returns:
+        Dict shard path -> rows moved
+    """
+    moved = {}
+    # Implicit BEGIN IMMEDIATE: the copy and the delete commit together
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level='IMMEDIATE')
+    try:
+        for _, path in list_shards(db_path):
+            conn.execute('ATTACH DATABASE ? AS shard', (path,))
+            try:
+                with conn:
+                    if not has_predictions(conn, 'shard'):
+                        continue
+                    last = conn.execute('SELECT MAX(id) FROM shard.predictions').fetchone()[0]
+                    if last is None:
+                        moved[path] = 0
+                        continue
+                    conn.execute(f"INSERT INTO main.predictions ({', '.join(columns)}) "
+                                 f"SELECT {', '.join(columns)} FROM shard.predictions WHERE id <= ?", (last,))
+                    moved[path] = conn.execute('DELETE FROM shard.predictions WHERE id <= ?', (last,)).rowcount
+            finally:
+                conn.execute('DETACH DATABASE shard')
+    finally:
+        conn.close()
+    return moved
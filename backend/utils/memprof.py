@@ -0,0 +1,159 @@
+import collections
+import os
+import signal
+import threading
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def current_rss():
+    """
+    Resident set size of this process in bytes
+
+    Reads /proc/self/statm on Linux; elsewhere falls back to the peak RSS
+    reported by getrusage, which only ever grows.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        return peak if peak > 1 << 32 else peak * 1024
+
+def _format_stats(stats, limit):
+    return [{'site': str(stat.traceback[0]) if stat.traceback else '?',
+             'size_kb': round(getattr(stat, 'size_diff', stat.size) / 1024, 1),
+             'count': getattr(stat, 'count_diff', stat.count)}
+            for stat in stats[:limit]]
+
+class MemoryMonitor:
+    """
+    Periodic RSS (and optional tracemalloc) sampling for one worker
+
+    Samples are kept in a ring buffer. With tracemalloc enabled the first
+    snapshot is kept as a baseline, so the allocation sites that grew the
+    most since start-up can be listed -- the usual signature of a leak.
+    """
+
+    def __init__(self, interval=60, history=120, tracemalloc_frames=0):
+        """
+        Args:
+            interval: Seconds between samples
+            history: Samples kept in memory
+            tracemalloc_frames: Stack depth to record (0 = tracemalloc off)
+        """
+        self.interval = interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.samples = collections.deque(maxlen=history)
+        self._baseline = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start sampling in a background thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.tracemalloc_frames and not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+            self._thread = threading.Thread(target=self._loop, name='memory-monitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        """Record one sample now and return it"""
+        entry = {'time': round(time.time(), 1), 'rss_mb': round(current_rss() / 2**20, 1)}
+        if tracemalloc.is_tracing():
+            traced, peak = tracemalloc.get_traced_memory()
+            entry['traced_mb'] = round(traced / 2**20, 1)
+            entry['traced_peak_mb'] = round(peak / 2**20, 1)
+            with self._lock:
+                if self._baseline is None:
+                    self._baseline = tracemalloc.take_snapshot()
+        with self._lock:
+            self.samples.append(entry)
+        return entry
+
+    def report(self, top=15):
+        """
+        Current memory picture for the admin endpoint
+
+        Returns:
+            Dict with current RSS, sample history and (if tracing) the top
+            allocation sites and the sites that grew most since the baseline
+        """
+        report = {'pid': os.getpid(), 'rss_mb': round(current_rss() / 2**20, 1),
+                  'tracemalloc': tracemalloc.is_tracing()}
+        with self._lock:
+            report['samples'] = list(self.samples)
+            baseline = self._baseline
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)])
+            report['top_allocations'] = _format_stats(snapshot.statistics('lineno'), top)
+            if baseline is not None:
+                report['growth_since_start'] = _format_stats(
+                    snapshot.compare_to(baseline, 'lineno'), top)
+        return report
+
+class WorkerRecycler:
+    """
+    Ask the worker to exit gracefully once it has used too much memory or
+    served too many requests
+
+    Under gunicorn, SIGTERM makes a worker stop accepting connections, finish
+    its in-flight requests and exit; the master then starts a fresh one.
+    """
+
+    def __init__(self, max_rss_mb=0, max_requests=0, check_every=50):
+        """
+        Args:
+            max_rss_mb: RSS limit in MB (0 = no limit)
+            max_requests: Requests before recycling (0 = no limit)
+            check_every: Read RSS every this many requests
+        """
+        self.max_rss_mb = max_rss_mb
+        self.max_requests = max_requests
+        self.check_every = check_every
+        self.requests = 0
+        self.reason = None
+        self._lock = threading.Lock()
+
+    def request_finished(self):
+        """
+        Count a finished request and decide whether to recycle
+
+        Returns:
+            The recycle reason the first time a limit is crossed, else None
+        """
+        with self._lock:
+            self.requests += 1
+            if self.reason is not None:
+                return None
+            if self.max_requests and self.requests >= self.max_requests:
+                self.reason = f'served {self.requests} requests'
+            elif self.max_rss_mb and self.requests % self.check_every == 0:
+                rss_mb = current_rss() / 2**20
+                if rss_mb > self.max_rss_mb:
+                    self.reason = f'RSS {rss_mb:.0f} MB above {self.max_rss_mb} MB'
+            return self.reason
+
+    def recycle(self):
+        """Send this worker the graceful-shutdown signal"""
+        os.kill(os.getpid(), signal.SIGTERM)
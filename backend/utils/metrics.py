@@ -0,0 +1,57 @@
+import threading
+
+class Metrics:
+    """
+    Minimal thread-safe counter/gauge registry
+
+    Values are per worker process and exported in Prometheus text format
+    by the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    def inc(self, name, value=1):
+        """Increase a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name, default=0):
+        """Read a counter or gauge"""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+
+    def snapshot(self):
+        """Copy of all values as {'counters': {...}, 'gauges': {...}}"""
+        with self._lock:
+            return {'counters': dict(self._counters), 'gauges': dict(self._gauges)}
+
+    def render(self, prefix='agrivision_'):
+        """
+        Format all values in Prometheus text exposition format
+
+        Args:
+            prefix: Prefix added to every metric name
+
+        Returns:
+            Text body for the /metrics endpoint
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for kind, values in (('counter', snapshot['counters']), ('gauge', snapshot['gauges'])):
+            for name in sorted(values):
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+                lines.append(f"{prefix}{name} {values[name]}")
+        return '\n'.join(lines) + '\n'
+
+# Shared registry for the whole process
+metrics = Metrics()
@@ -0,0 +1,99 @@
+import collections
+import threading
+import time
+
+from utils.singleflight import SingleFlight
+
+class ModelCache:
+    """
+    Memory-bounded LRU of lazily loaded models
+
+    Models are loaded on first use; concurrent first requests for the same
+    key share one load. When the estimated size of the resident models
+    exceeds `max_bytes`, the least recently used ones are dropped (the model
+    just loaded is always kept). Requests already holding an evicted model
+    finish with it; the memory is freed once they let go.
+    """
+
+    def __init__(self, loader, max_bytes, size_of, metrics=None, prefix='model_cache',
+                 history=50, load_timeout=300):
+        """
+        Args:
+            loader: Function key -> model
+            max_bytes: Budget for the resident models
+            size_of: Function model -> estimated bytes
+            metrics: Optional Metrics registry for load/evict counts and residency
+            prefix: Metric name prefix
+            history: Number of load/evict events kept for inspection
+            load_timeout: Seconds a concurrent request waits for a running load
+        """
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.metrics = metrics
+        self.prefix = prefix
+        self.load_timeout = load_timeout
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._events = collections.deque(maxlen=history)
+        self._loads = SingleFlight()
+
+    def get(self, key):
+        """Model for key, loading it (once) if it is not resident"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry['hits'] += 1
+                entry['last_used'] = time.time()
+                self._count('hits_total')
+                return entry['model']
+        model, _ = self._loads.do(key, lambda: self._load(key), timeout=self.load_timeout)
+        return model
+
+    def _load(self, key):
+        started = time.perf_counter()
+        model = self.loader(key)
+        load_ms = (time.perf_counter() - started) * 1000
+        size = self.size_of(model)
+        with self._lock:
+            self._entries[key] = {'model': model, 'bytes': size, 'hits': 0,
+                                  'loaded_at': time.time(), 'last_used': time.time()}
+            self._record('load', key, size, load_ms=round(load_ms, 1))
+            self._count('loads_total')
+            # Evict least recently used models until the budget holds
+            while len(self._entries) > 1 and self.resident_bytes() > self.max_bytes:
+                evicted, entry = self._entries.popitem(last=False)
+                self._record('evict', evicted, entry['bytes'])
+                self._count('evictions_total')
+            self._publish()
+        return model
+
+    def resident_bytes(self):
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+    def _record(self, event, key, size, **extra):
+        self._events.append(dict({'time': time.time(), 'event': event, 'key': key, 'bytes': size}, **extra))
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.inc(f'{self.prefix}_{name}')
+
+    def _publish(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge(f'{self.prefix}_resident_models', len(self._entries))
+            self.metrics.set_gauge(f'{self.prefix}_resident_bytes', self.resident_bytes())
+
+    def snapshot(self):
+        """Resident models (most recently used first) and recent events"""
+        with self._lock:
+            return {
+                'max_mb': round(self.max_bytes / 1024 / 1024, 1),
+                'resident_mb': round(self.resident_bytes() / 1024 / 1024, 1),
+                'resident': [
+                    {'key': key, 'mb': round(entry['bytes'] / 1024 / 1024, 1), 'hits': entry['hits'],
+                     'loaded_at': entry['loaded_at'], 'last_used': entry['last_used']}
+                    for key, entry in reversed(self._entries.items())
+                ],
+                'events': list(self._events),
+            }
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+
+def measure_latency(predict, batch, warmup=3, runs=20):
+    """
+    Wall-clock latency of one forward pass
+
+    Args:
+        predict: Function running the model on a batch
+        batch: Input batch
+        warmup: Untimed calls first (graph tracing, allocation)
+        runs: Timed calls
+
+    Returns:
+        Dict with median and p90 milliseconds per batch
+    """
+    for _ in range(warmup):
+        predict(batch)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': round(float(np.percentile(timings, 50)), 2),
+            'p90_ms': round(float(np.percentile(timings, 90)), 2)}
+
+def pareto_front(rows, minimize=(), maximize=()):
+    """
+    Mark rows no other row beats on every objective
+
+    A row is dominated when another row is at least as good on all the
+    given keys and strictly better on one. Each row gets a boolean
+    'pareto' entry.
+
+    Returns:
+        The same rows
+    """
+    def at_least_as_good(a, b):
+        return (all(a[k] <= b[k] for k in minimize) and
+                all(a[k] >= b[k] for k in maximize))
+
+    for row in rows:
+        row['pareto'] = not any(
+            other is not row and at_least_as_good(other, row) and not at_least_as_good(row, other)
+            for other in rows)
+    return rows
+
+def format_table(rows, columns):
+    """
+    Plain-text table
+
+    Args:
+        rows: List of dicts
+        columns: List of (key, header) pairs
+    """
+    cells = [[header for _, header in columns]]
+    for row in rows:
+        cells.append([
+            f'{row[key]:.4g}' if isinstance(row.get(key), float) else str(row.get(key, ''))
+            for key, _ in columns])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    lines = ['  '.join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells]
+    lines.insert(1, '=' * len(lines[0]))
+    return '\n'.join(lines)
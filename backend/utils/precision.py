@@ -0,0 +1,73 @@
+import numpy as np
+
+# Served model variants by weight precision (AGRIVISION_MODEL_PRECISION)
+#   float32      model.h5 as trained
+#   float16      model.h5 with weights stored and computed in float16
+#   tflite-fp16  TFLite file with float16 weights (train_model.convert_to_tflite)
+#   tflite-int8  TFLite file with int8 weights, dequantized on the fly by the
+#                hybrid kernels; fully integer int8 files work too
+PRECISIONS = ('float32', 'float16', 'tflite-fp16', 'tflite-int8')
+
+def float16_model(model, tf):
+    """
+    Copy of a Keras model whose layers store weights and compute in float16
+
+    Nested models (the MobileNetV2 backbone) are converted too. The last
+    layer stays float32 so the softmax and the returned probabilities keep
+    full precision; its weights are a small part of the model. The float32
+    model can be dropped afterwards, halving the resident weights.
+    """
+    last = model.layers[-1]
+
+    def convert(layer):
+        config = layer.get_config()
+        if 'dtype' in config and layer is not last:
+            config['dtype'] = 'float16'
+        return layer.__class__.from_config(config)
+
+    clone = tf.keras.models.clone_model(model, clone_function=convert, recursive=True)
+    # Same structure, so the weights line up; set_weights casts to each variable's dtype
+    clone.set_weights(model.get_weights())
+    return clone
+
+def weight_bytes(model):
+    """Bytes held by a Keras model's weights"""
+    # Keras 3 variables report their dtype as a string, tf.Variables as a DType
+    return int(sum(np.prod(w.shape) * np.dtype(getattr(w.dtype, 'name', w.dtype)).itemsize
+                   for w in model.weights))
+
+def quantize(batch, detail):
+    """Float batch in the dtype of a TFLite input (integer inputs of fully quantized models)"""
+    dtype = detail['dtype']
+    scale, zero_point = detail['quantization']
+    if np.issubdtype(dtype, np.integer) and scale:
+        limits = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), limits.min, limits.max).astype(dtype)
+    return batch.astype(dtype)
+
+def dequantize(values, detail):
+    """TFLite output back to float probabilities"""
+    scale, zero_point = detail['quantization']
+    if np.issubdtype(values.dtype, np.integer) and scale:
+        return (values.astype(np.float32) - zero_point) * scale
+    return values
+
+def agreement(reference, candidate):
+    """
+    How closely a reduced-precision model follows the float32 one
+
+    Args:
+        reference: float32 model probabilities (N, classes)
+        candidate: Probabilities of the same inputs from another variant
+
+    Returns:
+        Dict with top1_agreement (fraction of equal argmax) and mean / max
+        absolute difference of the top-1 reference probability
+    """
+    reference, candidate = np.asarray(reference, np.float64), np.asarray(candidate, np.float64)
+    top = reference.argmax(axis=1)
+    rows = np.arange(len(top))
+    delta = np.abs(reference[rows, top] - candidate[rows, top])
+    return {'top1_agreement': round(float(np.mean(candidate.argmax(axis=1) == top)), 4) if len(top) else None,
+            'confidence_delta_mean': round(float(delta.mean()), 4) if len(top) else None,
+            'confidence_delta_max': round(float(delta.max()), 4) if len(top) else None}
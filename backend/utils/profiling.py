@@ -0,0 +1,211 @@
+import cProfile
+import collections
+import io
+import os
+import pstats
+import random
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+class StackSampler:
+    """
+    Low-overhead wall-clock profiler for one thread
+
+    A background thread records the target thread's Python stack every
+    `interval` seconds. The result is written in collapsed-stack format
+    ("frame;frame;frame count"), which flame graph tools read directly.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Samples in collapsed-stack format"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+class ProfileSession:
+    """Profiling state for one request"""
+
+    def __init__(self, reason, mode):
+        self.reason = reason
+        self.mode = mode
+        self.started = time.perf_counter()
+        self._profiler = None
+        self._sampler = None
+        self.tf_trace = False
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+
+    def stop(self):
+        """Stop collecting; returns elapsed milliseconds"""
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        return (time.perf_counter() - self.started) * 1000
+
+    def write(self, path):
+        """Write the collected profile into directory `path`"""
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.join(path, 'profile.prof'))
+            text = io.StringIO()
+            pstats.Stats(self._profiler, stream=text).sort_stats('cumulative').print_stats(60)
+            with open(os.path.join(path, 'profile.txt'), 'w') as f:
+                f.write(text.getvalue())
+        if self._sampler is not None:
+            with open(os.path.join(path, 'stacks.txt'), 'w') as f:
+                f.write(self._sampler.collapsed())
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and keeps their dumps on disk
+
+    A request is profiled with cProfile when it is sampled (sample_rate) or
+    asks for it with the X-Profile header; with slow_ms set, every other
+    request runs under the cheap StackSampler and its dump is kept only if
+    the request turned out slower than the threshold. Dumps live in one
+    directory per request, and only the newest `max_dumps` are kept.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, slow_ms=0, allow_header=True, max_dumps=50):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.allow_header = allow_header
+        self.max_dumps = max_dumps
+        self._tf_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.sample_rate or self.slow_ms or self.allow_header)
+
+    def begin(self, header_requested=False):
+        """
+        Start profiling the current request if it is selected
+
+        Returns:
+            A started ProfileSession, or None
+        """
+        if header_requested and self.allow_header:
+            session = ProfileSession('header', 'cprofile')
+        elif self.sample_rate and random.random() < self.sample_rate:
+            session = ProfileSession('sampled', 'cprofile')
+        elif self.slow_ms:
+            session = ProfileSession('slow', 'sampler')
+        else:
+            return None
+        session.start()
+        return session
+
+    def finish(self, session, endpoint):
+        """
+        Stop a session and keep its dump if warranted
+
+        Returns:
+            Dump name, or None if the dump was discarded
+        """
+        elapsed_ms = session.stop()
+        if session.reason == 'slow' and elapsed_ms < self.slow_ms:
+            return None
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{endpoint}_{session.reason}_{elapsed_ms:.0f}ms"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+        session.write(path)
+        if session.tf_trace and os.path.isdir(self.tf_trace_dir(session)):
+            # The TF trace was written to a scratch directory during the request
+            os.replace(self.tf_trace_dir(session), os.path.join(path, 'tf_trace'))
+        self._rotate()
+        return name
+
+    def tf_trace_dir(self, session):
+        return os.path.join(self.directory, f'.tf_trace_{id(session)}')
+
+    def trace_tensorflow(self, session, tf, fn):
+        """
+        Run fn() under the TensorFlow profiler for a profiled request
+
+        The TF profiler is process-wide, so concurrent profiled requests
+        skip the trace rather than wait.
+        """
+        if session is None or session.reason == 'slow' or not self._tf_lock.acquire(blocking=False):
+            return fn()
+        try:
+            tf.profiler.experimental.start(self.tf_trace_dir(session))
+            try:
+                return fn()
+            finally:
+                tf.profiler.experimental.stop()
+                session.tf_trace = True
+        finally:
+            self._tf_lock.release()
+
+    def _rotate(self):
+        dumps = sorted(d for d in os.listdir(self.directory) if not d.startswith('.'))
+        for name in dumps[:-self.max_dumps]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def list_dumps(self):
+        """Dumps on disk, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        dumps = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            files = []
+            for root, _, filenames in os.walk(path):
+                files.extend(os.path.relpath(os.path.join(root, f), path) for f in filenames)
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in files)
+            dumps.append({'name': name, 'files': sorted(files), 'size_kb': round(size / 1024, 1)})
+        return dumps
+
+    def archive(self, name):
+        """
+        Zip one dump for download
+
+        Returns:
+            Zip bytes, or None if no such dump exists
+        """
+        path = os.path.join(self.directory, name)
+        if os.path.basename(name) != name or name.startswith('.') or not os.path.isdir(path):
+            return None
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for root, _, filenames in os.walk(path):
+                for filename in filenames:
+                    full = os.path.join(root, filename)
+                    zf.write(full, os.path.join(name, os.path.relpath(full, path)))
+        return buffer.getvalue()
@@ -0,0 +1,177 @@
+import atexit
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+STAGES = ('decode', 'preprocess', 'inference', 'total')
+DIMENSIONS = ('all', 'format', 'model_version', 'batch_size', 'size', 'bytes')
+
+# Log-scale latency histogram: bucket i covers (BASE_MS * GROWTH**(i-1), BASE_MS * GROWTH**i]
+BASE_MS = 0.1
+GROWTH = 1.1
+MAX_BUCKET = 200
+
+def latency_bucket(ms):
+    """Histogram bucket for a latency in milliseconds"""
+    if ms <= BASE_MS:
+        return 0
+    return min(MAX_BUCKET, math.ceil(math.log(ms / BASE_MS) / math.log(GROWTH)))
+
+def bucket_upper_ms(bucket):
+    """Upper edge of a histogram bucket in milliseconds"""
+    return BASE_MS * GROWTH ** bucket
+
+def size_class(width, height):
+    """Coarse megapixel class for grouping"""
+    if not width or not height:
+        return 'unknown'
+    megapixels = width * height / 1e6
+    for limit, label in ((0.06, '<=0.06MP'), (0.5, '0.06-0.5MP'), (2, '0.5-2MP'), (8, '2-8MP')):
+        if megapixels <= limit:
+            return label
+    return '>8MP'
+
+def bytes_class(size):
+    """Coarse upload size class for grouping"""
+    if not size:
+        return 'unknown'
+    for limit, label in ((100_000, '<100KB'), (1_000_000, '100KB-1MB'), (5_000_000, '1-5MB')):
+        if size < limit:
+            return label
+    return '>=5MB'
+
+class LatencyRollup:
+    """
+    Hourly latency histograms per dimension value, kept next to the raw log
+
+    Each logged prediction adds one count per (dimension, stage) to an
+    in-memory buffer that is flushed as a batch of upserts, so percentile
+    queries read a few thousand histogram rows instead of scanning every
+    prediction. Several workers can share one table: their flushes add up.
+    """
+
+    def __init__(self, db_path, flush_every=200, flush_seconds=5.0):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._records = 0
+        self._last_flush = time.monotonic()
+        self._init_schema()
+        atexit.register(self._flush_at_exit)
+
+    def _init_schema(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''CREATE TABLE IF NOT EXISTS latency_rollup
+                        (hour TEXT NOT NULL,
+                         dimension TEXT NOT NULL,
+                         value TEXT NOT NULL,
+                         stage TEXT NOT NULL,
+                         bucket INTEGER NOT NULL,
+                         count INTEGER NOT NULL,
+                         PRIMARY KEY (dimension, stage, hour, value, bucket))''')
+        conn.commit()
+        conn.close()
+
+    def add(self, timestamp, record):
+        """
+        Count one prediction
+
+        Args:
+            timestamp: 'YYYY-MM-DD HH:MM:SS' string of the prediction
+            record: Dict with <stage>_ms timings and format, model_version,
+                batch_size, width, height, bytes
+        """
+        hour = timestamp[:13] + ':00'
+        values = {
+            'all': 'all',
+            'format': record.get('format') or 'unknown',
+            'model_version': record.get('model_version') or 'unknown',
+            'batch_size': str(record.get('batch_size') or 1),
+            'size': size_class(record.get('width'), record.get('height')),
+            'bytes': bytes_class(record.get('bytes')),
+        }
+        with self._lock:
+            for stage in STAGES:
+                ms = record.get(f'{stage}_ms')
+                if ms is None:
+                    continue
+                bucket = latency_bucket(ms)
+                for dimension in DIMENSIONS:
+                    key = (hour, dimension, values[dimension], stage, bucket)
+                    self._pending[key] = self._pending.get(key, 0) + 1
+            self._records += 1
+            due = (self._records >= self.flush_every or
+                   time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def _flush_at_exit(self):
+        # Skip databases that were removed meanwhile (e.g. temporary test files)
+        if os.path.exists(self.db_path):
+            self.flush()
+
+    def flush(self):
+        """Write buffered counts to the database"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._records = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        with conn:
+            conn.executemany('''INSERT INTO latency_rollup (hour, dimension, value, stage, bucket, count)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (dimension, stage, hour, value, bucket)
+                                DO UPDATE SET count = count + excluded.count''',
+                             [key + (count,) for key, count in pending.items()])
+        conn.close()
+
+    def percentiles(self, group_by='all', stage='total', since=None, until=None,
+                    percentiles=(50, 90, 99)):
+        """
+        Latency percentiles per value of one dimension
+
+        Args:
+            group_by: One of DIMENSIONS
+            stage: One of STAGES
+            since / until: Optional 'YYYY-MM-DD[ HH...]' bounds (hour resolution)
+            percentiles: Percentiles to report
+
+        Returns:
+            List of dicts {value, count, p50_ms, ...}, busiest value first
+        """
+        self.flush()
+        clauses, params = ['dimension = ?', 'stage = ?'], [group_by, stage]
+        if since:
+            clauses.append('hour >= ?')
+            params.append(since[:13])
+        if until:
+            clauses.append('hour < ?')
+            params.append(until[:13])
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(f'''SELECT value, bucket, SUM(count) FROM latency_rollup
+                                WHERE {' AND '.join(clauses)}
+                                GROUP BY value, bucket ORDER BY value, bucket''', params).fetchall()
+        conn.close()
+
+        histograms = {}
+        for value, bucket, count in rows:
+            histograms.setdefault(value, np.zeros(MAX_BUCKET + 1, dtype=np.int64))[bucket] += count
+        results = []
+        for value, histogram in histograms.items():
+            cumulative = np.cumsum(histogram)
+            total = int(cumulative[-1])
+            entry = {'value': value, 'count': total}
+            for p in percentiles:
+                bucket = int(np.searchsorted(cumulative, total * p / 100))
+                entry[f'p{p:g}_ms'] = round(bucket_upper_ms(bucket), 2)
+            results.append(entry)
+        results.sort(key=lambda entry: entry['count'], reverse=True)
+        return results
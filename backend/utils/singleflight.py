@@ -0,0 +1,98 @@
+import threading
+import time
+
+from utils.admission import DeadlineExceeded
+
+class _Call:
+    """One in-flight computation and the result its followers wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one computation
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running (followers) wait for the leader's result.
+    A failing or slow leader never poisons its followers: if the leader
+    raises, the followers elect a new leader among themselves and retry once;
+    if the leader is still running after `timeout` seconds, a follower
+    computes the result on its own. A follower with a deadline never waits
+    past it: it raises DeadlineExceeded instead of starting a late
+    computation of its own.
+    """
+
+    def __init__(self, on_duplicate=None, on_fallback=None):
+        """
+        Args:
+            on_duplicate: Called each time a follower joins an in-flight call
+            on_fallback: Called each time a follower has to compute on its own
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._on_duplicate = on_duplicate
+        self._on_fallback = on_fallback
+
+    def in_flight(self):
+        """Number of keys currently being computed"""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, fn, timeout=None, deadline=None):
+        """
+        Run fn() once for all concurrent callers with the same key
+
+        Args:
+            key: Hashable content key
+            fn: Zero-argument function producing the result
+            timeout: Seconds a follower waits for the leader (None = forever)
+            deadline: time.monotonic() value after which a follower gives up
+                with DeadlineExceeded (None = no deadline)
+
+        Returns:
+            Tuple (result, shared) where shared is True if the result came
+            from another caller's computation
+        """
+        return self._do(key, fn, timeout, deadline, rejoin=True)
+
+    def _do(self, key, fn, timeout, deadline, rejoin):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                # Remove the key before waking followers so a retry starts a new call
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result, False
+
+        if self._on_duplicate:
+            self._on_duplicate()
+        wait = timeout
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0)
+            wait = remaining if wait is None else min(wait, remaining)
+        finished = call.done.wait(wait)
+        if finished and call.error is None:
+            return call.result, True
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded()
+        if finished and rejoin:
+            # The leader failed: retry, collapsing with the other followers
+            return self._do(key, fn, timeout, deadline, rejoin=False)
+        if self._on_fallback:
+            self._on_fallback()
+        return fn(), False
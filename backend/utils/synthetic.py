@@ -0,0 +1,163 @@
+import hashlib
+import json
+import time
+
+import numpy as np
+
+DEFAULT_PROFILE = {
+    # Wall time per batch: (base + per_image * N) * lognormal(0, sigma)
+    'latency_ms': {'base': 0.0, 'per_image': 0.0, 'sigma': 0.0},
+    # Part of that time spent burning CPU (NumPy kernels, GIL released like TF's)
+    'cpu_ms': {'base': 0.0, 'per_image': 0.0},
+    # Resident weights held for the process lifetime, and activations per image
+    'memory_mb': {'resident': 0, 'per_image': 0.0},
+    # Top-1 confidence: low + (high - low) * Beta(alpha, beta)
+    'confidence': {'low': 0.75, 'high': 0.95, 'alpha': 1.0, 'beta': 1.0},
+    # Relative frequency of each predicted class (None = uniform)
+    'class_weights': None,
+}
+
+def load_profile(path=None):
+    """
+    Synthetic backend profile from a JSON file, on top of DEFAULT_PROFILE
+
+    Every section is optional; missing keys keep their defaults, so the
+    default profile answers instantly.
+    """
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    if path:
+        with open(path) as f:
+            for key, value in json.load(f).items():
+                if isinstance(profile.get(key), dict) and isinstance(value, dict):
+                    profile[key].update(value)
+                else:
+                    profile[key] = value
+    return profile
+
+def input_seed(item):
+    """64-bit seed from an image's bytes (a preprocessed array or an encoded upload)"""
+    data = item if isinstance(item, (bytes, bytearray)) else np.ascontiguousarray(item).tobytes()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+class SyntheticBackend:
+    """
+    Stand-in for the model with configurable cost and outputs
+
+    Each batch takes the profile's wall time, of which `cpu_ms` is real CPU
+    work, allocates its activation memory, and returns probabilities drawn
+    from the profile's class and confidence distributions. Outputs (and the
+    latency jitter) depend only on the input bytes, so the same image always
+    gets the same answer. Used when no model can be loaded, for capacity
+    planning of everything around inference and for fast tests.
+    """
+
+    def __init__(self, profile, num_classes):
+        self.profile = profile
+        self.num_classes = num_classes
+        weights = profile.get('class_weights')
+        weights = np.ones(num_classes) if weights is None else np.asarray(weights, dtype=np.float64)
+        if len(weights) != num_classes:
+            raise ValueError(f'class_weights has {len(weights)} entries, expected {num_classes}')
+        self.class_cdf = np.cumsum(weights / weights.sum())
+        resident = int(profile['memory_mb'].get('resident', 0) * 1024 * 1024)
+        # Touched, so the pages are really resident like loaded weights
+        self.weights = np.ones(resident, dtype=np.uint8) if resident else None
+        self._burn_matrix = np.random.default_rng(0).random((64, 64))
+
+    def _burn(self, seconds):
+        """Spend about `seconds` of this thread's CPU time in NumPy"""
+        deadline = time.thread_time() + seconds
+        matrix = self._burn_matrix
+        while time.thread_time() < deadline:
+            matrix = np.tanh(matrix @ self._burn_matrix)
+
+    def cost_ms(self, batch_size, seed=0):
+        """(wall ms, cpu ms) for a batch"""
+        latency, cpu = self.profile['latency_ms'], self.profile['cpu_ms']
+        wall = latency.get('base', 0) + latency.get('per_image', 0) * batch_size
+        sigma = latency.get('sigma', 0)
+        if sigma:
+            wall *= np.random.default_rng(seed).lognormal(0, sigma)
+        cpu_ms = cpu.get('base', 0) + cpu.get('per_image', 0) * batch_size
+        return max(wall, cpu_ms), cpu_ms
+
+    def outputs(self, seeds):
+        """Class probabilities for inputs with the given seeds"""
+        confidence = self.profile['confidence']
+        low, high = confidence.get('low', 0.75), confidence.get('high', 0.95)
+        predictions = np.empty((len(seeds), self.num_classes), dtype=np.float32)
+        for row, seed in zip(predictions, seeds):
+            rng = np.random.default_rng(seed)
+            top = min(int(np.searchsorted(self.class_cdf, rng.random(), side='right')), self.num_classes - 1)
+            score = low + (high - low) * rng.beta(confidence.get('alpha', 1.0), confidence.get('beta', 1.0))
+            row[:] = (1 - score) / (self.num_classes - 1)
+            row[top] = score
+        return predictions
+
+    def predict(self, batch):
+        """
+        Probabilities for a batch of preprocessed arrays or encoded images
+
+        Returns:
+            Array of shape (N, num_classes)
+        """
+        started = time.perf_counter()
+        seeds = [input_seed(item) for item in batch]
+        wall_ms, cpu_ms = self.cost_ms(len(seeds), seeds[0] if seeds else 0)
+        activations_mb = self.profile['memory_mb'].get('per_image', 0) * len(seeds)
+        activations = np.ones(int(activations_mb * 1024 * 1024), dtype=np.uint8) if activations_mb else None
+        if cpu_ms:
+            self._burn(cpu_ms / 1000)
+        predictions = self.outputs(seeds)
+        remaining = wall_ms / 1000 - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        del activations
+        return predictions
+
+def fit_profile(latency, cpu, resident_mb, activation_mb=0.0, confidences=None, predicted=None,
+                num_classes=None):
+    """
+    Build a profile from measurements of a real model
+
+    Args:
+        latency: Dict batch size -> list of wall ms per batch (two or more sizes)
+        cpu: Dict batch size -> mean CPU ms per batch
+        resident_mb: RSS added by loading the model
+        activation_mb: Extra RSS per image while predicting
+        confidences: Optional top-1 confidences on real images
+        predicted: Optional predicted class indices on real images
+        num_classes: Needed with `predicted`
+
+    Returns:
+        Profile dict for SyntheticBackend
+    """
+    sizes = sorted(latency)
+    medians = [float(np.median(latency[size])) for size in sizes]
+    per_image, base = np.polyfit(sizes, medians, 1) if len(sizes) > 1 else (0.0, medians[0])
+    # The backend burns CPU on the calling thread only: CPU time beyond the
+    # wall time (other cores of a multi-threaded runtime) is left out
+    cpu = {size: min(cpu[size], medians[sizes.index(size)] if size in sizes else cpu[size]) for size in cpu}
+    cpu_sizes = sorted(cpu)
+    cpu_per_image, cpu_base = (np.polyfit(cpu_sizes, [cpu[size] for size in cpu_sizes], 1)
+                               if len(cpu_sizes) > 1 else (0.0, cpu[cpu_sizes[0]]))
+    # Spread of log latency around the median at the smallest batch size
+    logs = np.log(np.maximum(latency[sizes[0]], 1e-3))
+    profile = {
+        'latency_ms': {'base': round(max(float(base), 0.0), 3), 'per_image': round(max(float(per_image), 0.0), 3),
+                       'sigma': round(float(np.std(logs)), 3)},
+        'cpu_ms': {'base': round(max(float(cpu_base), 0.0), 3), 'per_image': round(max(float(cpu_per_image), 0.0), 3)},
+        'memory_mb': {'resident': round(max(resident_mb, 0.0), 1), 'per_image': round(max(activation_mb, 0.0), 2)},
+    }
+    if confidences is not None and len(confidences):
+        low, high = (float(v) for v in np.percentile(confidences, [1, 99]))
+        scaled = np.clip((np.asarray(confidences) - low) / max(high - low, 1e-6), 1e-3, 1 - 1e-3)
+        # Beta(alpha, beta) by the method of moments
+        mean, var = float(scaled.mean()), float(max(scaled.var(), 1e-6))
+        common = max(mean * (1 - mean) / var - 1, 1e-3)
+        profile['confidence'] = {'low': round(low, 4), 'high': round(high, 4),
+                                 'alpha': round(mean * common, 3), 'beta': round((1 - mean) * common, 3)}
+    if predicted is not None and len(predicted):
+        counts = np.bincount(np.asarray(predicted), minlength=num_classes)
+        profile['class_weights'] = (counts + 1).tolist()  # +1 keeps unseen classes possible
+    return profile
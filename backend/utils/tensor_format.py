@@ -0,0 +1,89 @@
+import struct
+
+import numpy as np
+
+# Raw tensor upload format ("AGT1"):
+#
+#   offset  size  field
+#   0       4     magic b'AGT1'
+#   4       1     dtype code (1 = uint8)
+#   5       1     reserved (0)
+#   6       2     height   (little-endian uint16)
+#   8       2     width    (little-endian uint16)
+#   10      2     channels (little-endian uint16, must be 3)
+#   12      H*W*C pixel data, row-major HxWxC
+TENSOR_MAGIC = b'AGT1'
+TENSOR_MIMETYPE = 'application/x-agrivision-tensor'
+HEADER = struct.Struct('<4sBxHHH')
+DTYPES = {1: np.uint8}
+MAX_SIDE = 4096
+
+class TensorFormatError(ValueError):
+    """Raised for malformed tensor payloads"""
+
+def is_tensor_payload(data):
+    """Check whether uploaded bytes use the raw tensor format"""
+    return data[:len(TENSOR_MAGIC)] == TENSOR_MAGIC
+
+def encode_tensor(pixels):
+    """
+    Serialize an image array in the raw tensor format
+
+    Args:
+        pixels: uint8 array (H, W, 3)
+
+    Returns:
+        Payload bytes
+    """
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width, channels = pixels.shape
+    return HEADER.pack(TENSOR_MAGIC, 1, height, width, channels) + pixels.tobytes()
+
+def _read_header(data, offset=0):
+    if len(data) - offset < HEADER.size:
+        raise TensorFormatError('Tensor payload shorter than its header')
+    magic, dtype_code, height, width, channels = HEADER.unpack_from(data, offset)
+    if magic != TENSOR_MAGIC:
+        raise TensorFormatError('Not a tensor payload')
+    if dtype_code not in DTYPES:
+        raise TensorFormatError(f'Unsupported tensor dtype code {dtype_code}')
+    if channels != 3:
+        raise TensorFormatError(f'Expected 3 channels, got {channels}')
+    if not (0 < height <= MAX_SIDE and 0 < width <= MAX_SIDE):
+        raise TensorFormatError(f'Invalid tensor shape {height}x{width}')
+    return DTYPES[dtype_code], (height, width, channels)
+
+def decode_tensor(data, offset=0, exact=True):
+    """
+    Wrap a tensor payload as a NumPy array without copying the pixels
+
+    Args:
+        data: Payload bytes
+        offset: Where the payload starts inside data
+        exact: Require the payload to end exactly at the end of data
+
+    Returns:
+        Read-only uint8 array (H, W, 3) backed by data
+    """
+    dtype, shape = _read_header(data, offset)
+    size = shape[0] * shape[1] * shape[2] * np.dtype(dtype).itemsize
+    available = len(data) - offset - HEADER.size
+    if available < size or (exact and available != size):
+        raise TensorFormatError(f'Tensor payload has {available} data bytes, expected {size}')
+    pixels = np.frombuffer(data, dtype=dtype, count=size, offset=offset + HEADER.size)
+    return pixels.reshape(shape)
+
+def split_tensors(data):
+    """
+    Decode a body made of several tensor payloads back to back
+
+    Returns:
+        List of uint8 arrays (H, W, 3), each a zero-copy view of data
+    """
+    tensors = []
+    offset = 0
+    while offset < len(data):
+        pixels = decode_tensor(data, offset, exact=False)
+        tensors.append(pixels)
+        offset += HEADER.size + pixels.nbytes
+    return tensors
@@ -0,0 +1,42 @@
+def parse_tier(value):
+    """
+    Requested tier from a request parameter
+
+    Returns:
+        Input size in pixels, or None for automatic selection
+
+    Raises:
+        ValueError: If the value is neither 'auto' nor a positive size
+    """
+    if value is None or value == '' or value.lower() == 'auto':
+        return None
+    size = int(value)
+    if size <= 0:
+        raise ValueError(f'Invalid tier {value!r}')
+    return size
+
+def choose_tier(available, requested=None, load=0.0, load_steps=(0.5, 0.8)):
+    """
+    Pick the input resolution that serves a request
+
+    The requested size (or the largest available one) is a ceiling: an
+    unavailable size rounds down to the next available tier. Each load step
+    the admission queue has reached moves the request one tier cheaper.
+
+    Args:
+        available: Input sizes of the loaded models
+        requested: Requested size, or None for the most accurate tier
+        load: Current queue load from AdmissionController.load()
+        load_steps: Ascending load levels that each cost one tier
+
+    Returns:
+        Tuple (chosen size, whether load pushed it below the requested tier)
+    """
+    sizes = sorted(available, reverse=True)
+    start = 0
+    if requested is not None:
+        # Smallest tier if everything is larger than requested
+        start = next((i for i, size in enumerate(sizes) if size <= requested), len(sizes) - 1)
+    steps = sum(1 for step in load_steps if load >= step)
+    index = min(start + steps, len(sizes) - 1)
+    return sizes[index], index != start
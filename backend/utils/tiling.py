@@ -0,0 +1,121 @@
+import numpy as np
+
+def leaf_fraction(tile):
+    """
+    Estimate how much of a tile is leaf tissue with a cheap color heuristic
+
+    Green tissue is found with the excess-green index (2G - R - B); yellow and
+    brown tissue (chlorosis, lesions) with R and G both well above B.
+
+    Args:
+        tile: uint8 array (H, W, 3)
+
+    Returns:
+        Fraction of pixels classified as leaf, in [0, 1]
+    """
+    # Every 4th pixel is plenty for a coverage estimate
+    pixels = tile[::4, ::4].astype(np.int16)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    green = (2 * g - r - b) > 20
+    yellow_brown = (r - b > 30) & (g - b > 10)
+    return float(np.mean(green | yellow_brown))
+
+def _positions(length, tile_size, stride):
+    """Tile start offsets along one axis, always covering the far edge"""
+    if length <= tile_size:
+        return [0]
+    positions = list(range(0, length - tile_size + 1, stride))
+    if positions[-1] != length - tile_size:
+        positions.append(length - tile_size)
+    return positions
+
+def generate_tiles(image, tile_size=224, overlap=0.25, scales=(1.0,), min_leaf=0.3, max_tiles=64):
+    """
+    Split an image into overlapping tiles and drop background tiles
+
+    Args:
+        image: PIL RGB image
+        tile_size: Tile edge in pixels (the model input size)
+        overlap: Fraction of a tile shared with its neighbour
+        scales: Image scales to tile at (1.0 = native resolution)
+        min_leaf: Minimum leaf_fraction() for a tile to be kept
+        max_tiles: Upper bound on the number of tiles returned
+
+    Returns:
+        Tuple (tiles, info, skipped) where tiles is a uint8 array
+        (N, tile_size, tile_size, 3), info a list of dicts with the tile box
+        in original image coordinates, scale and leaf fraction, and skipped
+        the number of background tiles dropped
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    candidates = []
+    skipped = 0
+    for scale in scales:
+        width = max(1, int(round(image.width * scale)))
+        height = max(1, int(round(image.height * scale)))
+        scaled = image if scale == 1.0 else image.resize((width, height))
+        if width < tile_size or height < tile_size:
+            # Too small to tile at this scale
+            continue
+        pixels = np.asarray(scaled)
+        for y in _positions(height, tile_size, stride):
+            for x in _positions(width, tile_size, stride):
+                tile = pixels[y:y + tile_size, x:x + tile_size]
+                fraction = leaf_fraction(tile)
+                if fraction < min_leaf:
+                    skipped += 1
+                    continue
+                box = [int(x / scale), int(y / scale), int(tile_size / scale), int(tile_size / scale)]
+                candidates.append((fraction, tile, {'box': box, 'scale': scale,
+                                                    'leaf_fraction': round(fraction, 3)}))
+
+    if not candidates:
+        # Nothing leafy enough (or image smaller than a tile): use the whole image
+        whole = np.asarray(image.resize((tile_size, tile_size)))
+        info = {'box': [0, 0, image.width, image.height], 'scale': None,
+                'leaf_fraction': round(leaf_fraction(whole), 3)}
+        return whole[np.newaxis], [info], skipped
+
+    if len(candidates) > max_tiles:
+        # Keep the leafiest tiles
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        skipped += len(candidates) - max_tiles
+        candidates = candidates[:max_tiles]
+
+    tiles = np.stack([tile for _, tile, _ in candidates])
+    return tiles, [info for _, _, info in candidates], skipped
+
+def aggregate_tiles(predictions, info, class_names, disease_threshold=0.5):
+    """
+    Combine per-tile predictions into an image-level diagnosis
+
+    A disease seen confidently in any tile wins, so small lesions are not
+    averaged away by the healthy tissue around them; otherwise the
+    leaf-weighted mean over tiles decides.
+
+    Args:
+        predictions: Class probabilities (N, num_classes)
+        info: Tile info list from generate_tiles()
+        class_names: Class name for each output column
+        disease_threshold: Tile probability needed to report a disease
+
+    Returns:
+        Tuple (class index, confidence in [0, 1], per-tile scores)
+    """
+    weights = np.array([max(i['leaf_fraction'], 1e-3) for i in info])
+    mean_probs = (predictions * weights[:, np.newaxis]).sum(axis=0) / weights.sum()
+
+    disease = np.array(['healthy' not in name for name in class_names])
+    disease_scores = np.where(disease, predictions.max(axis=0), 0.0)
+    if disease_scores.max() >= disease_threshold:
+        class_idx = int(np.argmax(disease_scores))
+        confidence = float(disease_scores[class_idx])
+    else:
+        class_idx = int(np.argmax(mean_probs))
+        confidence = float(mean_probs[class_idx])
+
+    tile_scores = []
+    for tile_info, probs in zip(info, predictions):
+        top = int(np.argmax(probs))
+        tile_scores.append(dict(tile_info, class_index=top, confidence=float(probs[top])))
+    return class_idx, confidence, tile_scores
@@ -0,0 +1,92 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+STEP_FIELDS = ('epoch', 'step', 'input_wait_ms', 'compute_ms', 'images', 'images_per_s', 'rss_mb')
+
+class TrainingLog:
+    """
+    Per-step training timings with per-epoch summaries
+
+    Every step is split into the time spent waiting for the input pipeline
+    and the time spent computing. Steps go to steps.csv, epoch summaries to
+    epochs.jsonl in `log_dir`. An epoch is flagged as input-bound when
+    waiting takes more than `stall_threshold` of the step time.
+    """
+
+    def __init__(self, log_dir, stall_threshold=0.2):
+        """
+        Args:
+            log_dir: Directory for steps.csv and epochs.jsonl (created if needed)
+            stall_threshold: Fraction of step time spent on input that counts as a stall
+        """
+        self.log_dir = log_dir
+        self.stall_threshold = stall_threshold
+        os.makedirs(log_dir, exist_ok=True)
+        steps_path = os.path.join(log_dir, 'steps.csv')
+        new_file = not os.path.exists(steps_path) or os.path.getsize(steps_path) == 0
+        self._steps_file = open(steps_path, 'a', newline='')
+        self._steps = csv.writer(self._steps_file)
+        if new_file:
+            self._steps.writerow(STEP_FIELDS)
+        self._epochs_path = os.path.join(log_dir, 'epochs.jsonl')
+        self.start_epoch()
+
+    def start_epoch(self):
+        self._started = time.perf_counter()
+        self._waits, self._computes, self._images, self._rss = [], [], [], []
+
+    def record_step(self, epoch, step, input_wait_s, compute_s, images, rss_bytes):
+        """Log one step; images may be 0 when the batch size is unknown"""
+        self._waits.append(input_wait_s)
+        self._computes.append(compute_s)
+        self._images.append(images)
+        self._rss.append(rss_bytes)
+        step_s = input_wait_s + compute_s
+        self._steps.writerow([epoch, step, round(input_wait_s * 1000, 3), round(compute_s * 1000, 3), images,
+                              round(images / step_s, 1) if step_s > 0 else 0, round(rss_bytes / 1024 / 1024, 1)])
+
+    def end_epoch(self, epoch, checkpoint_s=None, metrics=None):
+        """
+        Summarize the epoch's steps and append the summary to epochs.jsonl
+
+        Args:
+            epoch: Epoch index
+            checkpoint_s: Seconds spent writing the checkpoint, if any
+            metrics: Optional dict of training metrics (loss, accuracy, ...)
+
+        Returns:
+            Summary dict; 'input_bound' is True when the epoch stalled on input
+        """
+        waits, computes = np.array(self._waits), np.array(self._computes)
+        step_s = waits + computes
+        busy = float(step_s.sum())
+        fractions = waits / np.maximum(step_s, 1e-9)
+        summary = {
+            'epoch': epoch,
+            'steps': len(waits),
+            'wall_s': round(time.perf_counter() - self._started, 2),
+            'images': int(sum(self._images)),
+            'images_per_s': round(sum(self._images) / busy, 1) if busy > 0 else 0,
+            'step_ms_p50': round(float(np.median(step_s)) * 1000, 2) if len(step_s) else 0,
+            'input_wait_ms_mean': round(float(waits.mean()) * 1000, 2) if len(waits) else 0,
+            'compute_ms_mean': round(float(computes.mean()) * 1000, 2) if len(computes) else 0,
+            'input_wait_fraction': round(float(waits.sum()) / busy, 3) if busy > 0 else 0,
+            'stalled_steps': int((fractions > self.stall_threshold).sum()),
+            'rss_mb_max': round(max(self._rss, default=0) / 1024 / 1024, 1),
+            'checkpoint_s': round(checkpoint_s, 3) if checkpoint_s is not None else None,
+        }
+        summary['input_bound'] = summary['input_wait_fraction'] > self.stall_threshold
+        if metrics:
+            summary['metrics'] = {key: float(value) for key, value in metrics.items()}
+        self._steps_file.flush()
+        with open(self._epochs_path, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+        self.start_epoch()
+        return summary
+
+    def close(self):
+        self._steps_file.close()